@@ -0,0 +1 @@
+"""Offline benchmarks for the pipeline, on synthetic data and stub providers."""
@@ -0,0 +1,111 @@
+"""Stand-ins for yfinance and FRED that serve synthetic data after a fixed delay."""
+import time
+from contextlib import ExitStack, contextmanager
+from unittest import mock
+
+import pandas as pd
+
+from benchmarks.synthetic import series_values, ticker_bars
+from data_pipeline.config import settings
+from data_pipeline.config.markets import MACRO_INDICATORS
+from data_pipeline.ingestion.engine import TokenBucket
+
+_FIELDS = {"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"}
+
+_SOURCE_TICKERS = {
+    meta["ticker"]: meta["frequency"]
+    for indicators in MACRO_INDICATORS.values()
+    for meta in indicators.values()
+}
+
+
+def _inclusive_end(end: str) -> str:
+    # yfinance's ``end`` is exclusive.
+    return str((pd.Timestamp(end) - pd.Timedelta(days=1)).date())
+
+
+class StubPriceProvider:
+    """``PriceProvider`` returning synthetic bars after ``latency`` seconds per call."""
+
+    def __init__(self, latency: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.seed = seed
+        self.calls = 0
+
+    def download(self, tickers: list[str], start: str, end: str) -> pd.DataFrame:
+        time.sleep(self.latency)
+        self.calls += 1
+        frames = {}
+        for ticker in tickers:
+            bars = ticker_bars(ticker, start, _inclusive_end(end), self.seed)
+            frames[ticker] = bars.set_index("date").rename(columns=_FIELDS)
+        df = pd.concat(frames, axis=1)
+        df.index.name = "Date"
+        return df
+
+
+class StubFred:
+    """Drop-in for a ``fredapi.Fred`` client serving synthetic series."""
+
+    def __init__(self, latency: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.seed = seed
+
+    def get_series(self, series_id: str, observation_start=None, observation_end=None) -> pd.Series:
+        time.sleep(self.latency)
+        frequency = _SOURCE_TICKERS.get(series_id, "D")
+        return series_values(
+            series_id, frequency, str(observation_start), str(observation_end), self.seed
+        )
+
+
+def stub_yf_download(latency: float = 0.0, seed: int = 0):
+    """Replacement for ``providers.yf_download`` used by the macro fetcher."""
+
+    def download(tickers, start, end, **kwargs) -> pd.DataFrame:
+        time.sleep(latency)
+        frequency = _SOURCE_TICKERS.get(tickers, "D")
+        series = series_values(tickers, frequency, start, _inclusive_end(end), seed)
+        return pd.DataFrame({"Close": series}).rename_axis("Date")
+
+    return download
+
+
+def stub_ticker_actions(latency: float = 0.0):
+    """Replacement for ``fetch_macro._ticker_actions``: no dividends or splits."""
+
+    def actions(ticker: str) -> pd.DataFrame:
+        time.sleep(latency)
+        return pd.DataFrame(columns=["date", "ticker", "action_type", "value"])
+
+    return actions
+
+
+@contextmanager
+def offline(universe: dict[str, list[str]], latency: float = 0.0, seed: int = 0):
+    """Point the pipeline at stub providers and ``universe`` for the duration.
+
+    Every network call sleeps ``latency`` seconds first. The universe is
+    swapped in place, so modules that imported ``EQUITY_UNIVERSE`` see it.
+    The FRED quota limiter is lifted so that ``latency`` alone models the
+    provider.
+    """
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.dict(settings.EQUITY_UNIVERSE, universe, clear=True))
+        stack.enter_context(mock.patch(
+            "data_pipeline.ingestion.fetch_prices.YFinancePriceProvider",
+            lambda: StubPriceProvider(latency, seed),
+        ))
+        stack.enter_context(mock.patch(
+            "data_pipeline.ingestion.fetch_macro._fred_client", lambda: StubFred(latency, seed)
+        ))
+        stack.enter_context(mock.patch(
+            "data_pipeline.ingestion.fetch_macro._FRED_LIMITER", TokenBucket(1e9, 10**9)
+        ))
+        stack.enter_context(mock.patch(
+            "data_pipeline.ingestion.fetch_macro.yf_download", stub_yf_download(latency, seed)
+        ))
+        stack.enter_context(mock.patch(
+            "data_pipeline.ingestion.fetch_macro._ticker_actions", stub_ticker_actions(latency)
+        ))
+        yield
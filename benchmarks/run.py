@@ -0,0 +1,269 @@
+"""Time the pipeline's hot paths on synthetic data and compare against a baseline.
+
+    python -m benchmarks.run --tickers 40 500 --years 1 10
+    python -m benchmarks.run --save-baseline
+
+Each case reports its median wall time over ``--repeats`` runs, throughput
+in input rows per second, and the largest growth in resident memory seen
+during any run. Any case slower, or using more memory, than its baseline
+entry by more than ``--tolerance`` is flagged and the exit status is 1.
+"""
+from __future__ import annotations
+
+import argparse
+import ctypes
+import gc
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections.abc import Callable
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from unittest import mock
+
+import pandas as pd
+
+from benchmarks.providers import offline
+from benchmarks.synthetic import date_range, synthetic_macro, synthetic_prices, synthetic_universe
+
+BASELINE_PATH = Path(__file__).with_name("baseline.json")
+# Differences this small are measurement noise whatever the tolerance.
+MIN_REGRESSION = {"seconds": 0.01, "peak_mb": 1.0}
+
+CASES = [
+    "validate_prices", "filter_to_trading_days", "insert_dataframe", "run_pipeline", "run_backfill",
+]
+
+
+@contextmanager
+def local_storage():
+    """A throwaway DuckDB file and raw lake for one run."""
+    from data_pipeline.storage import database, raw_lake
+
+    with tempfile.TemporaryDirectory() as tmp, \
+            mock.patch.object(database, "STORAGE_BACKEND", "duckdb"), \
+            mock.patch.object(database, "DB_PATH", Path(tmp) / "bench.duckdb"), \
+            mock.patch.object(raw_lake, "RAW_DATA_PATH", Path(tmp) / "raw"):
+        database.initialize_schema()
+        try:
+            yield
+        finally:
+            database.get_backend().close()
+
+
+def _rss_mb() -> float:
+    """Resident memory of this process in MB (Linux), or 0 when unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        return 0.0
+
+
+def _release_freed_memory() -> None:
+    """Hand memory freed by earlier runs back to the OS (glibc only).
+
+    Otherwise a run can reuse pages the allocator kept, and its resident
+    memory never grows however much it allocates.
+    """
+    gc.collect()
+    try:
+        ctypes.CDLL("libc.so.6").malloc_trim(0)
+    except (OSError, AttributeError):
+        pass
+
+
+class PeakMemory:
+    """Highest resident memory above the starting level while the block runs.
+
+    Sampled from a background thread, so allocations made by native code
+    (Arrow, DuckDB) are counted, unlike with tracemalloc. Freed memory is
+    released first, so the starting level is what is actually in use.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+
+    def _sample(self, start: float) -> None:
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, _rss_mb() - start)
+
+    def __enter__(self) -> "PeakMemory":
+        _release_freed_memory()
+        self._thread = threading.Thread(target=self._sample, args=(_rss_mb(),), daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def measure(
+    run: Callable[[], None],
+    repeats: int,
+    around: Callable[[], object] | None = None,
+) -> tuple[float, float]:
+    """Median wall time in seconds and highest memory growth in MB of ``run``.
+
+    The median, unlike the best time, is not set by one lucky run, so a
+    baseline recorded with it is stable from run to run. ``around`` returns
+    a context manager entered outside the timed region of every repetition,
+    for per-run setup such as a fresh database.
+    """
+    times, peak = [], 0.0
+    for _ in range(repeats):
+        with around() if around else nullcontext(), PeakMemory() as memory:
+            started = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - started)
+        peak = max(peak, memory.peak_mb)
+    return statistics.median(times), peak
+
+
+def run_cases(
+    n_tickers: int,
+    years: int,
+    cases: list[str],
+    repeats: int,
+    latency: float,
+) -> list[dict]:
+    from data_pipeline.cleaning.align_calendars import filter_to_trading_days
+    from data_pipeline.cleaning.validate import validate_prices
+    from data_pipeline.storage.database import insert_dataframe
+
+    universe = synthetic_universe(n_tickers)
+    start, end = date_range(years)
+    prices = synthetic_prices(universe, start, end)
+    by_market = {m: df.reset_index(drop=True) for m, df in prices.groupby("market")}
+    clean = pd.concat(
+        [filter_to_trading_days(validate_prices(df), m) for m, df in by_market.items()],
+        ignore_index=True,
+    )
+    macro_rows = len(synthetic_macro(start, end))
+
+    def run_pipeline() -> None:
+        from data_pipeline.pipeline.run_daily import run_pipeline as flow
+
+        with offline(universe, latency):
+            # yfinance's end is exclusive.
+            flow(start, str((pd.Timestamp(end) + pd.Timedelta(days=1)).date()))
+
+    def run_backfill() -> None:
+        from data_pipeline.pipeline.run_daily import run_backfill as flow
+
+        with offline(universe, latency):
+            flow(start, end)
+
+    benches = {
+        "validate_prices": (lambda: validate_prices(prices), None, len(prices)),
+        "filter_to_trading_days": (
+            lambda: [filter_to_trading_days(df, m) for m, df in by_market.items()],
+            None,
+            len(prices),
+        ),
+        "insert_dataframe": (
+            lambda: insert_dataframe(clean, "raw_prices"), local_storage, len(clean)
+        ),
+        "run_pipeline": (run_pipeline, local_storage, len(prices) + macro_rows),
+        "run_backfill": (run_backfill, local_storage, len(prices) + macro_rows),
+    }
+
+    results = []
+    for case in cases:
+        run, around, rows = benches[case]
+        seconds, peak_mb = measure(run, repeats, around)
+        results.append({
+            "case": case,
+            "key": f"{case}@{n_tickers}x{years}y",
+            "rows": rows,
+            "seconds": seconds,
+            "rows_per_second": rows / seconds if seconds else float("inf"),
+            "peak_mb": peak_mb,
+        })
+    return results
+
+
+def compare(results: list[dict], baseline: dict, tolerance: float) -> list[str]:
+    """Describe every result that regressed against ``baseline``."""
+    regressions = []
+    for result in results:
+        base = baseline.get(result["key"])
+        if base is None:
+            continue
+        for metric, floor in MIN_REGRESSION.items():
+            # A metric missing on either side was not measured.
+            if base.get(metric) is None or result.get(metric) is None:
+                continue
+            allowed = max(base[metric] * (1 + tolerance), base[metric] + floor)
+            if result[metric] > allowed:
+                growth = f"+{result[metric] / base[metric] - 1:.0%}" if base[metric] else "new"
+                regressions.append(
+                    f"{result['key']}: {metric} {result[metric]:.3f} vs baseline "
+                    f"{base[metric]:.3f} ({growth})"
+                )
+    return regressions
+
+
+def _report(results: list[dict], baseline: dict) -> None:
+    print(f"{'case':<40} {'rows':>10} {'seconds':>9} {'rows/s':>12} {'peak MB':>9} {'vs base':>8}")
+    for r in results:
+        base = baseline.get(r["key"])
+        delta = f"{r['seconds'] / base['seconds'] - 1:+.0%}" if base and base["seconds"] else "-"
+        print(
+            f"{r['key']:<40} {r['rows']:>10,} {r['seconds']:>9.3f} "
+            f"{r['rows_per_second']:>12,.0f} {r['peak_mb']:>9.1f} {delta:>8}"
+        )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline pipeline benchmarks")
+    parser.add_argument("--tickers", type=int, nargs="+", default=[40])
+    parser.add_argument("--years", type=int, nargs="+", default=[1])
+    parser.add_argument("--cases", nargs="+", choices=CASES, default=CASES)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument(
+        "--latency", type=float, default=0.0,
+        help="Seconds each stub provider call sleeps (default: %(default)s).",
+    )
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25,
+        help="Allowed slowdown or memory growth over the baseline (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--save-baseline", action="store_true",
+        help="Record these results as the new baseline.",
+    )
+    args = parser.parse_args(argv)
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    results = []
+    for n_tickers in args.tickers:
+        for years in args.years:
+            results += run_cases(n_tickers, years, args.cases, args.repeats, args.latency)
+
+    _report(results, baseline)
+    if args.save_baseline:
+        baseline.update({
+            r["key"]: {"seconds": round(r["seconds"], 4), "peak_mb": round(r["peak_mb"], 2)}
+            for r in results
+        })
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {args.baseline}.")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
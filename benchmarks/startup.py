@@ -0,0 +1,136 @@
+"""Startup cost of the ``run_daily`` entry point.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --save-baseline
+
+Every measurement runs in a fresh interpreter with the API credentials
+removed from the environment (a ``.env`` file still applies), which also
+checks that nothing resolves them at start-up:
+
+- ``import``: import time of ``data_pipeline.pipeline.run_daily`` as
+  reported by ``python -X importtime``, with the slowest packages listed;
+- ``first_task``: wall time from launching the interpreter until
+  ``run_pipeline`` starts its first step, including Prefect's flow start-up.
+
+Each also records the interpreter's peak resident memory (Linux).
+
+Results are compared against ``baseline.json`` like the other benchmarks.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from benchmarks.run import BASELINE_PATH, compare
+
+ENTRY_POINT = "data_pipeline.pipeline.run_daily"
+ROOT = Path(__file__).resolve().parents[1]
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+# Printed last by every measured interpreter.
+_PEAK_MB = "print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, flush=True)"
+
+# Started with the launch time as argv[1]; prints the seconds until the
+# flow's first step and the peak memory, and exits without running it.
+_FIRST_TASK = f"""
+import os, resource, sys, time
+launched = float(sys.argv[1])
+from data_pipeline.pipeline import run_daily
+
+def first_step():
+    print(time.time() - launched, flush=True)
+    {_PEAK_MB}
+    os._exit(0)
+
+run_daily._start_run = first_step
+run_daily.run_pipeline("2024-01-02", "2024-01-03")
+"""
+
+
+def _env() -> dict[str, str]:
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("FRED_API_KEY", "SUPABASE_URL", "SUPABASE_KEY", "DATABASE_URL")}
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(ROOT), env.get("PYTHONPATH")]))
+    return env
+
+
+def import_profile() -> tuple[float, list[tuple[str, float]], float]:
+    """Import time in seconds, the cumulative seconds of the slowest packages,
+    and the interpreter's peak memory in MB."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import resource, {ENTRY_POINT}; {_PEAK_MB}"],
+        capture_output=True, text=True, env=_env(), cwd=ROOT, check=True,
+    )
+    packages: dict[str, float] = {}
+    total = 0.0
+    for match in _IMPORTTIME.finditer(proc.stderr):
+        cumulative, name = int(match.group(2)) / 1e6, match.group(4)
+        if name == ENTRY_POINT:
+            total = cumulative
+        top = name.split(".")[0]
+        packages[top] = max(packages.get(top, 0.0), cumulative)
+    packages.pop("data_pipeline", None)
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:10]
+    return total, slowest, float(proc.stdout.split()[-1])
+
+
+def time_to_first_task() -> tuple[float, float]:
+    """Seconds until the flow's first step, and the interpreter's peak memory in MB."""
+    launched = time.time()
+    proc = subprocess.run(
+        [sys.executable, "-c", _FIRST_TASK, str(launched)],
+        capture_output=True, text=True, env=_env(), cwd=ROOT,
+    )
+    lines = proc.stdout.strip().splitlines()
+    if proc.returncode != 0 or not lines:
+        raise RuntimeError(f"Entry point failed to start:\n{proc.stderr[-2000:]}")
+    return float(lines[-2]), float(lines[-1])
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="run_daily startup benchmark")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--baseline", type=Path, default=BASELINE_PATH)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--save-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    profiles = [import_profile() for _ in range(args.repeats)]
+    import_seconds, slowest, import_mb = min(profiles, key=lambda p: p[0])
+    first_task, first_task_mb = min(time_to_first_task() for _ in range(args.repeats))
+
+    print(f"import {ENTRY_POINT}: {import_seconds:.3f}s, {import_mb:.0f} MB")
+    for package, seconds in slowest:
+        print(f"  {package:<24} {seconds:.3f}s")
+    print(f"time to first task: {first_task:.3f}s, {first_task_mb:.0f} MB")
+
+    results = [
+        {"key": "startup:import", "seconds": import_seconds, "peak_mb": import_mb},
+        {"key": "startup:first_task", "seconds": first_task, "peak_mb": first_task_mb},
+    ]
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    if args.save_baseline:
+        baseline.update({
+            r["key"]: {"seconds": round(r["seconds"], 4), "peak_mb": round(r["peak_mb"], 2)}
+            for r in results
+        })
+        args.baseline.write_text(json.dumps(baseline, indent=2, sort_keys=True) + "\n")
+        print(f"Baseline written to {args.baseline}.")
+        return 0
+
+    regressions = compare(results, baseline, args.tolerance)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
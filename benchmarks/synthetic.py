@@ -0,0 +1,132 @@
+"""Deterministic synthetic market data.
+
+Every ticker and series draws from its own generator, seeded from its name,
+so a ticker's history is the same whatever the size of the universe or the
+order it is generated in.
+"""
+import zlib
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline.config.markets import MACRO_INDICATORS, MARKET_METADATA
+
+# Synthetic histories end here so results do not drift from day to day.
+END_DATE = "2024-12-31"
+
+_SUFFIX = {"JP": "T", "HK": "HK", "KR": "KS", "TW": "TW"}
+
+# Share of bars corrupted in ways validate_prices rejects.
+BAD_ROW_RATE = 0.001
+
+
+def _rng(name: str, seed: int) -> np.random.Generator:
+    return np.random.default_rng([seed, zlib.crc32(name.encode())])
+
+
+# Histories are drawn from this date on, so overlapping ranges agree.
+_EPOCH = "1990-01-01"
+
+
+@lru_cache(maxsize=None)
+def _dates(end: str, frequency: str) -> pd.DatetimeIndex:
+    if frequency == "M":
+        return pd.date_range(_EPOCH, end, freq="MS")
+    days = np.arange(np.datetime64(_EPOCH), np.datetime64(end) + 1)
+    # 1970-01-01 was a Thursday, so (day + 3) % 7 is 0 on Mondays.
+    weekdays = days[(days.astype(np.int64) + 3) % 7 < 5]
+    return pd.DatetimeIndex(weekdays.astype("datetime64[ns]"))
+
+
+def date_range(years: int, end_date: str = END_DATE) -> tuple[str, str]:
+    """``(start, end)`` covering ``years`` whole years up to ``end_date``."""
+    end = pd.Timestamp(end_date)
+    start = end - pd.DateOffset(years=years) + pd.Timedelta(days=1)
+    return str(start.date()), str(end.date())
+
+
+def synthetic_universe(n_tickers: int) -> dict[str, list[str]]:
+    """``n_tickers`` made-up tickers spread round-robin over the markets."""
+    markets = list(MARKET_METADATA)
+    universe: dict[str, list[str]] = {m: [] for m in markets}
+    for i in range(n_tickers):
+        market = markets[i % len(markets)]
+        universe[market].append(f"SYN{i:05d}.{_SUFFIX.get(market, market)}")
+    return universe
+
+
+def ticker_bars(ticker: str, start: str, end: str, seed: int = 0) -> pd.DataFrame:
+    """Daily OHLCV bars on every weekday in ``start``..``end`` inclusive.
+
+    Weekday bars include exchange holidays, which calendar filtering drops,
+    and about ``BAD_ROW_RATE`` of them are corrupted for validation to drop.
+    """
+    rng = _rng(ticker, seed)
+    dates = _dates(end, "D")
+    n = len(dates)
+    close = 50.0 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n)))
+    spread = np.abs(rng.normal(0.0, 0.01, n)) * close
+    open_ = close * (1 + rng.normal(0.0, 0.005, n))
+    volume = rng.integers(10_000, 5_000_000, n)
+    high = np.maximum(open_, close) + spread
+    low = np.minimum(open_, close) - spread
+    bad = rng.random(n) < BAD_ROW_RATE
+    kind = rng.integers(0, 3, n)
+    close[bad & (kind == 0)] = np.nan
+    low[bad & (kind == 1)] = high[bad & (kind == 1)] * 1.1
+    close[bad & (kind == 2)] = -1.0
+
+    keep = slice(dates.searchsorted(pd.Timestamp(start)), None)
+    return pd.DataFrame({
+        "date": dates[keep],
+        "open": open_[keep],
+        "high": high[keep],
+        "low": low[keep],
+        "close": close[keep],
+        "volume": volume[keep],
+    })
+
+
+def synthetic_prices(
+    universe: dict[str, list[str]],
+    start: str,
+    end: str,
+    seed: int = 0,
+) -> pd.DataFrame:
+    """Long-format prices for ``universe``, shaped like ``fetch_equity_prices``."""
+    frames = []
+    for market, tickers in universe.items():
+        for ticker in tickers:
+            df = ticker_bars(ticker, start, end, seed)
+            df["ticker"] = ticker
+            df["market"] = market
+            frames.append(df)
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+def series_values(name: str, frequency: str, start: str, end: str, seed: int = 0) -> pd.Series:
+    """One macro series: a daily (weekday) or month-start random walk."""
+    rng = _rng(name, seed)
+    dates = _dates(end, frequency)
+    values = 100.0 + np.cumsum(rng.normal(0.0, 0.5, len(dates)))
+    series = pd.Series(values, index=dates)
+    return series[series.index >= pd.Timestamp(start)]
+
+
+def synthetic_macro(start: str, end: str, seed: int = 0) -> pd.DataFrame:
+    """Long-format macro observations for every configured series."""
+    frames = []
+    for market, indicators in MACRO_INDICATORS.items():
+        for indicator, meta in indicators.items():
+            series = series_values(meta["ticker"], meta["frequency"], start, end, seed)
+            frames.append(pd.DataFrame({
+                "date": series.index,
+                "value": series.to_numpy(),
+                "market": market,
+                "indicator": indicator,
+                "source": meta["source"],
+            }))
+    return pd.concat(frames, ignore_index=True)
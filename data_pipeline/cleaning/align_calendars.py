@@ -1,28 +1,113 @@
-import exchange_calendars as ec
+import threading
+import time
+from datetime import date
+from functools import lru_cache
+from importlib.metadata import version
+
+import numpy as np
 import pandas as pd
 
 from data_pipeline.config.markets import MARKET_METADATA
+from data_pipeline.config.settings import CALENDAR_CACHE_PATH, CALENDAR_DISK_CACHE
+from data_pipeline.ingestion.frames import normalize_dates, take_rows, to_days
+from data_pipeline.pipeline import metrics
 from data_pipeline.pipeline.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Market codes are packed above the day number so that every market's
+# sessions fit in one sorted array and can be probed with one searchsorted.
+_DAY_BITS = 32
 
-def get_valid_trading_days(market: str, start_date: str, end_date: str) -> pd.DatetimeIndex:
-    cal = ec.get_calendar(MARKET_METADATA[market]["calendar"])
-    sessions = cal.sessions_in_range(start_date, end_date)
+_build_lock = threading.Lock()
+
+
+def _cache_file(calendar: str):
+    versioned = f"exchange_calendars-{version('exchange_calendars')}"
+    return CALENDAR_CACHE_PATH / versioned / f"{calendar}.npy"
+
+
+def _build_sessions(calendar: str) -> np.ndarray:
+    # exchange_calendars is slow to import and only needed on a cache miss.
+    import exchange_calendars as ec
+
+    cal = ec.get_calendar(calendar)
+    return cal.sessions.values.astype("datetime64[D]").astype(np.int64)
+
+
+@lru_cache(maxsize=None)
+def market_sessions(market: str) -> np.ndarray:
+    """Sorted session dates of ``market`` as int64 days since 1970-01-01.
+
+    Built once per process. With CALENDAR_DISK_CACHE the array is also kept
+    on disk per exchange-calendars version and rebuilt once it no longer
+    reaches at least 30 days past today.
+    """
+    calendar = MARKET_METADATA[market]["calendar"]
+    horizon = (np.datetime64(date.today(), "D") + 30).astype(np.int64)
+    path = _cache_file(calendar)
+    with _build_lock:
+        if CALENDAR_DISK_CACHE and path.exists():
+            sessions = np.load(path)
+            if len(sessions) and sessions[-1] >= horizon:
+                return sessions
+        sessions = _build_sessions(calendar)
+        if CALENDAR_DISK_CACHE:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            np.save(path, sessions)
     return sessions
 
 
+@lru_cache(maxsize=None)
+def _packed_sessions(markets: tuple[str, ...]) -> np.ndarray:
+    return np.concatenate([
+        (np.int64(code) << _DAY_BITS) + market_sessions(m) for code, m in enumerate(markets)
+    ])
+
+
+def _contains(sorted_values: np.ndarray, values: np.ndarray) -> np.ndarray:
+    idx = np.searchsorted(sorted_values, values)
+    idx[idx == len(sorted_values)] = 0
+    return sorted_values[idx] == values
+
+
+def is_trading_day(market: str, dates) -> np.ndarray:
+    return _contains(market_sessions(market), to_days(dates))
+
+
+def get_valid_trading_days(market: str, start_date: str, end_date: str) -> pd.DatetimeIndex:
+    sessions = market_sessions(market)
+    lo = np.searchsorted(sessions, to_days(start_date)[0], side="left")
+    hi = np.searchsorted(sessions, to_days(end_date)[0], side="right")
+    return pd.DatetimeIndex(sessions[lo:hi].astype("datetime64[D]").astype("datetime64[ns]"))
+
+
+def next_session(market: str, dates) -> pd.DatetimeIndex:
+    """First session strictly after each date."""
+    sessions = market_sessions(market)
+    idx = np.searchsorted(sessions, to_days(dates), side="right")
+    if (idx >= len(sessions)).any():
+        raise ValueError(f"Date beyond the {market} calendar's last session.")
+    return pd.DatetimeIndex(sessions[idx].astype("datetime64[D]").astype("datetime64[ns]"))
+
+
+def previous_session(market: str, dates) -> pd.DatetimeIndex:
+    """Last session strictly before each date."""
+    sessions = market_sessions(market)
+    idx = np.searchsorted(sessions, to_days(dates), side="left") - 1
+    if (idx < 0).any():
+        raise ValueError(f"Date before the {market} calendar's first session.")
+    return pd.DatetimeIndex(sessions[idx].astype("datetime64[D]").astype("datetime64[ns]"))
+
+
 def filter_to_trading_days(df: pd.DataFrame, market: str) -> pd.DataFrame:
+    started = time.perf_counter()
     initial = len(df)
-    df = df.copy()
-    df["date"] = pd.to_datetime(df["date"]).dt.normalize().dt.tz_localize(None)
-
-    start = df["date"].min().strftime("%Y-%m-%d")
-    end = df["date"].max().strftime("%Y-%m-%d")
-    valid_days = get_valid_trading_days(market, start, end).normalize().tz_localize(None)
+    dates = normalize_dates(df["date"])
+    mask = _contains(market_sessions(market), to_days(dates))
 
-    df = df[df["date"].isin(valid_days)]
+    df = take_rows(df, mask)
+    df["date"] = dates[mask].to_numpy()
     removed = initial - len(df)
     logger.info(
         "filter_to_trading_days[%s] removed %d rows (from %d).",
@@ -30,4 +115,37 @@ def filter_to_trading_days(df: pd.DataFrame, market: str) -> pd.DataFrame:
         removed,
         initial,
     )
-    return df.reset_index(drop=True)
+    metrics.record(
+        "filter_to_trading_days",
+        market,
+        seconds=time.perf_counter() - started,
+        rows_in=initial,
+        rows_out=len(df),
+        rows_dropped=removed,
+    )
+    return df
+
+
+@metrics.timed("filter_to_trading_days", "all")
+def filter_all_markets(df: pd.DataFrame) -> pd.DataFrame:
+    """Filter a frame spanning several markets against each row's ``market`` calendar."""
+    initial = len(df)
+    markets = tuple(MARKET_METADATA)
+    codes = pd.Categorical(df["market"], categories=markets).codes.astype(np.int64)
+    if (codes < 0).any():
+        unknown = sorted(set(df.loc[codes < 0, "market"]))
+        raise KeyError(f"Unknown markets: {unknown}")
+
+    dates = normalize_dates(df["date"])
+    keys = (codes << _DAY_BITS) + to_days(dates)
+    mask = _contains(_packed_sessions(markets), keys)
+
+    metrics.record_rows("filter_to_trading_days", df["market"], df["market"][mask])
+    df = take_rows(df, mask)
+    df["date"] = dates[mask].to_numpy()
+    logger.info(
+        "filter_all_markets removed %d rows (from %d).",
+        initial - len(df),
+        initial,
+    )
+    return df
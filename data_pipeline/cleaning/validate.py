@@ -1,38 +1,230 @@
+from collections.abc import Callable
+
 import numpy as np
 import pandas as pd
 
+from data_pipeline.ingestion.frames import series_labels, take_rows
+from data_pipeline.pipeline import metrics
 from data_pipeline.pipeline.logger import get_logger
 
 logger = get_logger(__name__)
 
+# Flag thresholds: a close-to-close move larger than MAX_DAILY_MOVE, a close
+# unchanged for STALE_SESSIONS sessions in a row, and a log volume more than
+# VOLUME_SPIKE_Z deviations above its exponentially weighted mean (half-life
+# VOLUME_HALFLIFE sessions, once VOLUME_MIN_SESSIONS sessions are known).
+MAX_DAILY_MOVE = 0.5
+STALE_SESSIONS = 5
+VOLUME_SPIKE_Z = 5.0
+VOLUME_HALFLIFE = 20
+VOLUME_MIN_SESSIONS = 20
+
+STATE_COLUMNS = [
+    "last_date", "last_close", "stale_run", "volume_mean", "volume_sq_mean", "observations",
+]
+REPORT_COLUMNS = ["date", "ticker", "market", "rule", "severity", "value"]
+
+# A rule is (name, measure, test): ``measure`` maps a frame to one value per
+# row, reported with the hit, and ``test`` maps those values to hits.
+Rule = tuple[str, Callable[[pd.DataFrame], np.ndarray], Callable[[np.ndarray], np.ndarray]]
+
+# Rows failing these are dropped. NaN fails every comparison, so a missing
+# high, low or close is caught by the range and close rules.
+REJECT_RULES: list[Rule] = [
+    ("missing_open", lambda df: df["open"].to_numpy(float), np.isnan),
+    ("high_below_low", lambda df: (df["high"] - df["low"]).to_numpy(float), lambda v: ~(v >= 0)),
+    ("bad_close", lambda df: df["close"].to_numpy(float), lambda v: ~(v > 0)),
+]
+
+# Rows hitting these are stored and reported.
+FLAG_RULES: list[Rule] = [
+    ("extreme_return", lambda c: c["daily_return"].to_numpy(), lambda v: abs(v) > MAX_DAILY_MOVE),
+    ("stale_price", lambda c: c["stale_run"].to_numpy(), lambda v: v >= STALE_SESSIONS),
+    ("volume_spike", lambda c: c["volume_z"].to_numpy(), lambda v: v > VOLUME_SPIKE_Z),
+]
+
+
+def empty_state() -> pd.DataFrame:
+    return pd.DataFrame(columns=STATE_COLUMNS, index=pd.Index([], name="ticker"))
+
+
+def apply_rules(
+    keys: pd.DataFrame, frame: pd.DataFrame, rules: list[Rule]
+) -> tuple[np.ndarray, pd.DataFrame]:
+    """Evaluate ``rules`` on ``frame``, whose rows are those of ``keys``.
+
+    Returns the rows that hit any rule and one report row per hit.
+    """
+    hit_any = np.zeros(len(frame), dtype=bool)
+    hits = []
+    for name, measure, test in rules:
+        values = np.asarray(measure(frame), dtype=float)
+        with np.errstate(invalid="ignore"):
+            hit = test(values)
+        if not hit.any():
+            continue
+        hit_any |= hit
+        idx = np.flatnonzero(hit)
+        hits.append(pd.DataFrame({
+            "date": pd.DatetimeIndex(keys["date"].take(idx)).to_numpy(),
+            "ticker": keys["ticker"].take(idx).astype(str).to_numpy(),
+            "market": keys["market"].take(idx).astype(str).to_numpy(),
+            "rule": name,
+            "value": values[idx],
+        }))
+    if not hits:
+        return hit_any, pd.DataFrame()
+    return hit_any, pd.concat(hits, ignore_index=True)
+
+
+def _ewm(values: np.ndarray, segments: np.ndarray) -> np.ndarray:
+    """Exponentially weighted means of the columns of ``values`` up to each
+    row, restarting at every new segment."""
+    return (
+        pd.DataFrame(values)
+        .groupby(segments, sort=False)
+        .ewm(halflife=VOLUME_HALFLIFE, adjust=False)
+        .mean()
+        .to_numpy()
+    )
+
+
+def _chain(df: pd.DataFrame, state: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Per-row inputs of the flag rules, and the tickers' state after ``df``.
 
-def validate_prices(df: pd.DataFrame) -> pd.DataFrame:
+    Each ticker's rows after its ``last_date`` in ``state`` continue from that
+    state. Its other rows, e.g. revisions of stored sessions or a backfill
+    window older than the state, are chained among themselves only and leave
+    the state as it is.
+    """
+    n = len(df)
+    if n == 0:
+        context = pd.DataFrame({"daily_return": [], "stale_run": [], "volume_z": []}, dtype=float)
+        return context, empty_state()
+
+    codes, tickers = pd.factorize(df["ticker"])
+    tickers = np.asarray(tickers, dtype=str)
+    dates = pd.DatetimeIndex(df["date"]).to_numpy()
+
+    # State is looked up once per ticker, then spread over its rows.
+    at_state = state.index.get_indexer(tickers)
+    known = at_state >= 0
+    stored = state.iloc[at_state[known]]
+    per_ticker = {}
+    for col in STATE_COLUMNS[1:]:
+        per_ticker[col] = np.full(len(tickers), np.nan)
+        per_ticker[col][known] = stored[col].to_numpy(float)
+    last_date = np.full(len(tickers), np.datetime64("NaT"), dtype="datetime64[ns]")
+    last_date[known] = pd.DatetimeIndex(stored["last_date"]).to_numpy()
+    has_state = known[codes]
+    seeded = dates > last_date[codes]
+
+    order = np.lexsort((dates, seeded, codes))
+    codes, dates, seeded, has_state = codes[order], dates[order], seeded[order], has_state[order]
+    seed = {col: values[codes] for col, values in per_ticker.items()}
+    close = df["close"].to_numpy(float)[order]
+    volume = np.log1p(df["volume"].to_numpy(float)[order])
+
+    idx = np.arange(n)
+    first = np.ones(n, dtype=bool)
+    first[1:] = (codes[1:] != codes[:-1]) | (seeded[1:] != seeded[:-1])
+    last = np.append(first[1:], True)
+    start = np.maximum.accumulate(np.where(first, idx, 0))
+    seed_first = first & seeded
+
+    prev_close = np.append(np.nan, close[:-1])
+    prev_close[first] = np.where(seeded[first], seed["last_close"][first], np.nan)
+    same = close == prev_close
+    run_start = np.maximum.accumulate(np.where(~same | first, idx, 0))
+    carry = np.where(seed_first & same, np.nan_to_num(seed["stale_run"]), 0)
+    stale_run = idx - run_start + 1 + carry[run_start]
+
+    # Seeded segments get their stored statistics as a leading pseudo-row, so
+    # the weighted means continue from them.
+    at = np.flatnonzero(seed_first)
+    segments = np.insert(np.cumsum(first), at, np.cumsum(first)[at])
+    real = np.insert(np.ones(n, dtype=bool), at, False)
+    moments = np.column_stack([volume, volume**2])
+    seeds = np.column_stack([seed["volume_mean"][at], seed["volume_sq_mean"][at]])
+    means = _ewm(np.insert(moments, at, seeds, axis=0), segments)
+    opens = np.append(True, segments[1:] != segments[:-1])
+    prior = np.vstack([np.full((1, 2), np.nan), means[:-1]])
+    prior[opens] = np.nan
+    (prior_mean, prior_sq), (mean, sq_mean) = prior[real].T, means[real].T
+    prior_obs = idx - start + np.where(seeded, np.nan_to_num(seed["observations"]), 0)[start]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        z = (volume - prior_mean) / np.sqrt(np.maximum(prior_sq - prior_mean**2, 0))
+    z[prior_obs < VOLUME_MIN_SESSIONS] = np.nan
+
+    context = np.empty((n, 3))
+    context[order] = np.column_stack([close / prev_close - 1, stale_run, z])
+    context = pd.DataFrame(context, columns=["daily_return", "stale_run", "volume_z"])
+
+    keep = last & (seeded | ~has_state)
+    new_state = pd.DataFrame(
+        {
+            "last_date": dates[keep],
+            "last_close": close[keep],
+            "stale_run": stale_run[keep],
+            "volume_mean": mean[keep],
+            "volume_sq_mean": sq_mean[keep],
+            "observations": prior_obs[keep] + 1,
+        },
+        index=pd.Index(tickers[codes[keep]], name="ticker"),
+    )
+    return context, new_state
+
+
+@metrics.timed("validate_prices", "all")
+def check_prices(
+    df: pd.DataFrame, state: pd.DataFrame | None = None
+) -> tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame]:
+    """Apply ``REJECT_RULES`` and ``FLAG_RULES`` to a batch of prices.
+
+    ``state`` holds each ticker's last stored session (``STATE_COLUMNS``,
+    indexed by ticker), which seeds the previous close, unchanged-close run
+    and volume statistics of the ticker's newer rows, so a one-day batch is
+    checked without reading stored history. Returns the rows passing the
+    reject rules, the report of every hit and the tickers' updated state.
+    """
     initial = len(df)
+    markets = df["market"]
 
-    df = df.dropna(subset=["open", "high", "low", "close"])
-    df = df[df["high"] >= df["low"]]
-    df = df[df["close"] > 0]
+    rejected, rejects = apply_rules(df, df, REJECT_RULES)
+    df = take_rows(df, ~rejected)
+    context, new_state = _chain(df, empty_state() if state is None else state)
+    _, flags = apply_rules(df, context, FLAG_RULES)
+    parts = [
+        hits.assign(severity=severity)
+        for hits, severity in ((rejects, "reject"), (flags, "flag"))
+        if len(hits)
+    ]
+    report = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=REPORT_COLUMNS)
+    report = report[REPORT_COLUMNS]
 
-    prev_close = df.groupby("ticker")["close"].shift(1)
-    daily_return = (df["close"] - prev_close) / prev_close
-    extreme = daily_return.abs() > 0.5
-    if extreme.any():
-        flagged = df.loc[extreme, ["date", "ticker", "close"]].head(10)
+    if len(flags):
         logger.warning(
-            "%d rows have daily return > 50%%. Sample:\n%s",
-            extreme.sum(),
-            flagged.to_string(index=False),
+            "validate_prices flagged %d rows: %s",
+            len(flags),
+            flags["rule"].value_counts().to_dict(),
         )
-
     removed = initial - len(df)
     logger.info("validate_prices removed %d rows (from %d).", removed, initial)
-    return df.reset_index(drop=True)
+    metrics.record_rows("validate_prices", markets, df["market"])
+    return df, report, new_state
+
+
+def validate_prices(df: pd.DataFrame, state: pd.DataFrame | None = None) -> pd.DataFrame:
+    """Rows of ``df`` that pass the reject rules; see :func:`check_prices`."""
+    return check_prices(df, state)[0]
 
 
+@metrics.timed("validate_macro", "all")
 def validate_macro(df: pd.DataFrame) -> pd.DataFrame:
     initial = len(df)
-    df = df.replace([float("inf"), float("-inf")], float("nan"))
-    df = df.dropna(subset=["value"])
+    before = series_labels(df)
+    df = take_rows(df, np.isfinite(df["value"].to_numpy(dtype=float)))
     removed = initial - len(df)
     logger.info("validate_macro removed %d rows (from %d).", removed, initial)
-    return df.reset_index(drop=True)
+    metrics.record_rows("validate_macro", before, series_labels(df))
+    return df
@@ -23,32 +23,32 @@ MARKET_METADATA: dict[str, dict] = {
 
 MACRO_INDICATORS: dict[str, dict[str, dict]] = {
     "JP": {
-        "FX_VS_USD":      {"ticker": "DEXJPUS", "source": "fred"},
-        "POLICY_RATE":    {"ticker": "IRSTCI01JPM156N", "source": "fred"},
-        "INFLATION_CPI":  {"ticker": "JPNCPIALLMINMEI", "source": "fred"},
-        "BOND_YIELD_10Y": {"ticker": "IRLTLT01JPM156N", "source": "fred"},
-        "EQUITY_INDEX":   {"ticker": "^N225", "source": "yfinance"},
+        "FX_VS_USD":      {"ticker": "DEXJPUS", "frequency": "D", "source": "fred"},
+        "POLICY_RATE":    {"ticker": "IRSTCI01JPM156N", "frequency": "M", "source": "fred"},
+        "INFLATION_CPI":  {"ticker": "JPNCPIALLMINMEI", "frequency": "M", "source": "fred"},
+        "BOND_YIELD_10Y": {"ticker": "IRLTLT01JPM156N", "frequency": "M", "source": "fred"},
+        "EQUITY_INDEX":   {"ticker": "^N225", "frequency": "D", "source": "yfinance"},
     },
     "HK": {
-        "FX_VS_USD":      {"ticker": "DEXHKUS", "source": "fred"},
-        "POLICY_RATE":    {"ticker": "HKONGBASE", "source": "fred"},
-        "INFLATION_CPI":  {"ticker": "HKGCPIALLMINMEI", "source": "fred"},
-        "BOND_YIELD_10Y": {"ticker": "IRLTLT01HKM156N", "source": "fred"},
-        "EQUITY_INDEX":   {"ticker": "^HSI", "source": "yfinance"},
+        "FX_VS_USD":      {"ticker": "DEXHKUS", "frequency": "D", "source": "fred"},
+        "POLICY_RATE":    {"ticker": "HKONGBASE", "frequency": "D", "source": "fred"},
+        "INFLATION_CPI":  {"ticker": "HKGCPIALLMINMEI", "frequency": "M", "source": "fred"},
+        "BOND_YIELD_10Y": {"ticker": "IRLTLT01HKM156N", "frequency": "M", "source": "fred"},
+        "EQUITY_INDEX":   {"ticker": "^HSI", "frequency": "D", "source": "yfinance"},
     },
     "KR": {
-        "FX_VS_USD":      {"ticker": "DEXKOUS", "source": "fred"},
-        "POLICY_RATE":    {"ticker": "IRSTCI01KRM156N", "source": "fred"},
-        "INFLATION_CPI":  {"ticker": "KORCPIALLMINMEI", "source": "fred"},
-        "BOND_YIELD_10Y": {"ticker": "IRLTLT01KRM156N", "source": "fred"},
-        "EQUITY_INDEX":   {"ticker": "^KS11", "source": "yfinance"},
+        "FX_VS_USD":      {"ticker": "DEXKOUS", "frequency": "D", "source": "fred"},
+        "POLICY_RATE":    {"ticker": "IRSTCI01KRM156N", "frequency": "M", "source": "fred"},
+        "INFLATION_CPI":  {"ticker": "KORCPIALLMINMEI", "frequency": "M", "source": "fred"},
+        "BOND_YIELD_10Y": {"ticker": "IRLTLT01KRM156N", "frequency": "M", "source": "fred"},
+        "EQUITY_INDEX":   {"ticker": "^KS11", "frequency": "D", "source": "yfinance"},
     },
     "TW": {
-        "FX_VS_USD":      {"ticker": "DEXTAUS", "source": "fred"},
-        "POLICY_RATE":    {"ticker": "IRSTCI01TWM156N", "source": "fred"},
-        "INFLATION_CPI":  {"ticker": "TWNCPIALLMINMEI", "source": "fred"},
-        "BOND_YIELD_10Y": {"ticker": "IRLTLT01TWM156N", "source": "fred"},
-        "EQUITY_INDEX":   {"ticker": "^TWII", "source": "yfinance"},
+        "FX_VS_USD":      {"ticker": "DEXTAUS", "frequency": "D", "source": "fred"},
+        "POLICY_RATE":    {"ticker": "IRSTCI01TWM156N", "frequency": "M", "source": "fred"},
+        "INFLATION_CPI":  {"ticker": "TWNCPIALLMINMEI", "frequency": "M", "source": "fred"},
+        "BOND_YIELD_10Y": {"ticker": "IRLTLT01TWM156N", "frequency": "M", "source": "fred"},
+        "EQUITY_INDEX":   {"ticker": "^TWII", "frequency": "D", "source": "yfinance"},
     },
 }
 
@@ -2,66 +2,140 @@ from pathlib import Path
 from dotenv import load_dotenv
 import os
 
+from data_pipeline.config.universe import load_universe
+
 load_dotenv()
 
-FRED_API_KEY: str = os.environ["FRED_API_KEY"]
-SUPABASE_URL: str = os.environ["SUPABASE_URL"]
-SUPABASE_KEY: str = os.environ["SUPABASE_KEY"]
-DATABASE_URL: str = os.environ["DATABASE_URL"]
+# Credentials are resolved on first access (see __getattr__ below), so code
+# that never calls FRED or Supabase runs without them. Import this module and
+# read e.g. ``settings.FRED_API_KEY`` at the point of use; a
+# ``from settings import FRED_API_KEY`` would resolve it at import time.
+FRED_API_KEY: str
+SUPABASE_URL: str
+SUPABASE_KEY: str
+DATABASE_URL: str
+_CREDENTIALS = ("FRED_API_KEY", "SUPABASE_URL", "SUPABASE_KEY", "DATABASE_URL")
+
+# STORAGE_BACKEND is "duckdb" (an embedded database file at DB_PATH) or
+# "postgres" (the Supabase database at DATABASE_URL).
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "duckdb")
+
+# "copy" bulk-loads through DATABASE_URL with COPY + ON CONFLICT merges in
+# chunks of COPY_CHUNK_SIZE rows; "rest" upserts through the Supabase API.
+INSERT_METHOD = os.environ.get("INSERT_METHOD", "copy")
+COPY_CHUNK_SIZE = int(os.environ.get("COPY_CHUNK_SIZE", "50000"))
+
+# One connection pool per process, shared by all Prefect tasks. Connections
+# idle for longer than PG_POOL_HEALTHCHECK_SECONDS are pinged on checkout.
+PG_POOL_MIN_SIZE = int(os.environ.get("PG_POOL_MIN_SIZE", "1"))
+PG_POOL_MAX_SIZE = int(os.environ.get("PG_POOL_MAX_SIZE", "8"))
+PG_POOL_HEALTHCHECK_SECONDS = float(os.environ.get("PG_POOL_HEALTHCHECK_SECONDS", "30"))
+
+# Streaming reads fetch this many rows per round trip from a server-side cursor.
+READ_CHUNK_SIZE = int(os.environ.get("READ_CHUNK_SIZE", "50000"))
+
+# query(..., cache=True) keeps results until a table they read is written
+# again: insert_dataframe records a new write version per table, which every
+# process sees. QUERY_CACHE_MB bounds the in-memory tier (0 disables the
+# cache); QUERY_CACHE_DIR adds an on-disk Parquet tier of up to
+# QUERY_CACHE_DISK_MB.
+QUERY_CACHE_MB = float(os.environ.get("QUERY_CACHE_MB", "256"))
+QUERY_CACHE_DIR = os.environ.get("QUERY_CACHE_DIR")
+QUERY_CACHE_DISK_MB = float(os.environ.get("QUERY_CACHE_DISK_MB", "1024"))
 
 BASE_DIR = Path(__file__).resolve().parents[2]
 RAW_DATA_PATH = BASE_DIR / "data" / "raw"
 CLEAN_DATA_PATH = BASE_DIR / "data" / "cleaned"
+DB_PATH = Path(os.environ.get("DB_PATH", BASE_DIR / "data" / "data_pipeline.duckdb"))
+
+# Raw fetches are appended to RAW_DATA_PATH/<source>/market=*/year=*;
+# partitions that accumulate this many files are compacted into one.
+RAW_COMPACT_MIN_FILES = int(os.environ.get("RAW_COMPACT_MIN_FILES", "20"))
+
+# Trading sessions are built once per process; with the disk cache enabled
+# they are also reused across processes until exchange-calendars changes.
+CALENDAR_CACHE_PATH = BASE_DIR / "data" / "cache" / "calendars"
+CALENDAR_DISK_CACHE = os.environ.get("CALENDAR_DISK_CACHE", "1") == "1"
+
+# Per-stage metrics are stored in stage_metrics after every run; set
+# METRICS_PROM_FILE to also write them in Prometheus text format.
+METRICS_PROM_FILE = os.environ.get("METRICS_PROM_FILE")
+
+# Logs go to the console and, as JSON lines, to LOG_FILE, which rotates at
+# LOG_MAX_MB keeping LOG_BACKUPS old files. LOG_STAGE_LEVELS overrides
+# LOG_LEVEL for records logged within a stage, e.g.
+# "fetch_prices=DEBUG,insert=WARNING".
+LOG_FILE = Path(os.environ.get("LOG_FILE", BASE_DIR / "logs" / "pipeline.log"))
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO")
+LOG_STAGE_LEVELS = os.environ.get("LOG_STAGE_LEVELS", "")
+LOG_MAX_MB = float(os.environ.get("LOG_MAX_MB", "50"))
+LOG_BACKUPS = int(os.environ.get("LOG_BACKUPS", "5"))
 
 START_DATE = "2015-01-01"
 
-EQUITY_UNIVERSE: dict[str, list[str]] = {
-    "JP": [
-        "7203.T",  # Toyota
-        "6758.T",  # Sony
-        "9984.T",  # SoftBank
-        "6861.T",  # Keyence
-        "8306.T",  # Mitsubishi UFJ
-        "9432.T",  # NTT
-        "6954.T",  # Fanuc
-        "4063.T",  # Shin-Etsu Chemical
-        "8035.T",  # Tokyo Electron
-        "7741.T",  # Hoya
-    ],
-    "HK": [
-        "0700.HK",  # Tencent
-        "0005.HK",  # HSBC
-        "0941.HK",  # China Mobile
-        "1299.HK",  # AIA
-        "2318.HK",  # Ping An
-        "0388.HK",  # HKEX
-        "1177.HK",  # Sino Biopharmaceutical
-        "2382.HK",  # Sunny Optical
-        "0883.HK",  # CNOOC
-        "1113.HK",  # CK Asset
-    ],
-    "KR": [
-        "005930.KS",  # Samsung Electronics
-        "000660.KS",  # SK Hynix
-        "005380.KS",  # Hyundai Motor
-        "035420.KS",  # NAVER
-        "051910.KS",  # LG Chem
-        "006400.KS",  # Samsung SDI
-        "035720.KS",  # Kakao
-        "028260.KS",  # Samsung C&T
-        "012330.KS",  # Hyundai Mobis
-        "096770.KS",  # SK Innovation
-    ],
-    "TW": [
-        "2330.TW",  # TSMC
-        "2317.TW",  # Foxconn
-        "2454.TW",  # MediaTek
-        "2412.TW",  # Chunghwa Telecom
-        "2308.TW",  # Delta Electronics
-        "1303.TW",  # Nan Ya Plastics
-        "2881.TW",  # Fubon Financial
-        "2882.TW",  # Cathay Financial
-        "3008.TW",  # Largan Precision
-        "2303.TW",  # United Microelectronics
-    ],
-}
+# Historical backfills run per market and BACKFILL_WINDOW ("year" or
+# "market"), with up to BACKFILL_MAX_WINDOWS windows in flight. Completed
+# windows are checkpointed so an interrupted backfill resumes.
+BACKFILL_WINDOW = os.environ.get("BACKFILL_WINDOW", "year")
+BACKFILL_MAX_WINDOWS = int(os.environ.get("BACKFILL_MAX_WINDOWS", "2"))
+
+# Equity prices are requested in batches of tickers from the same market,
+# with up to PRICE_FETCH_WORKERS batches in flight at once.
+PRICE_BATCH_SIZE = int(os.environ.get("PRICE_BATCH_SIZE", "10"))
+PRICE_FETCH_WORKERS = int(os.environ.get("PRICE_FETCH_WORKERS", "4"))
+
+# Fetched price batches are validated and stored while later batches are
+# still downloading. At most PRICE_QUEUE_SIZE fetched batches wait for
+# storage; beyond that the fetch workers pause.
+PRICE_QUEUE_SIZE = int(os.environ.get("PRICE_QUEUE_SIZE", "4"))
+
+# Hold open/high/low/close as float32 in memory, halving their footprint at
+# about seven significant digits. Stored values stay DOUBLE PRECISION.
+PRICES_FLOAT32 = os.environ.get("PRICES_FLOAT32", "0") == "1"
+
+# Macro series are fetched one job per series. FRED allows 120 requests per
+# minute per API key; each series gets its own exponential-backoff budget and
+# the flow refetches only the series that still failed, up to
+# MACRO_FLOW_RETRIES more rounds.
+FRED_REQUESTS_PER_MINUTE = int(os.environ.get("FRED_REQUESTS_PER_MINUTE", "120"))
+FRED_FETCH_WORKERS = int(os.environ.get("FRED_FETCH_WORKERS", "4"))
+FETCH_MAX_RETRIES = int(os.environ.get("FETCH_MAX_RETRIES", "3"))
+FETCH_BACKOFF_SECONDS = float(os.environ.get("FETCH_BACKOFF_SECONDS", "2.0"))
+MACRO_FLOW_RETRIES = int(os.environ.get("MACRO_FLOW_RETRIES", "2"))
+
+# Corporate action histories are fetched one ticker per job.
+ACTION_FETCH_WORKERS = int(os.environ.get("ACTION_FETCH_WORKERS", "8"))
+
+# Incremental runs start each series the day after its last stored date,
+# minus this many days of overlap so late revisions are picked up.
+PRICE_OVERLAP_DAYS = int(os.environ.get("PRICE_OVERLAP_DAYS", "3"))
+MACRO_OVERLAP_DAYS = int(os.environ.get("MACRO_OVERLAP_DAYS", "7"))
+
+# run_daily --schedule runs each market's update this many minutes after
+# its exchange closes, giving the data providers time to publish the session.
+MARKET_CLOSE_DELAY_MINUTES = int(os.environ.get("MARKET_CLOSE_DELAY_MINUTES", "30"))
+
+# Rolling volatility and cross-market correlations span this many sessions.
+FEATURE_WINDOW = int(os.environ.get("FEATURE_WINDOW", "20"))
+
+# The equity universe is read from UNIVERSE_FILE, a CSV with ``market`` and
+# ``ticker`` columns (others, such as ``name``, are ignored). The default
+# lists ten large caps per market; point it at full index constituents to
+# scale up, and see run_daily's --shard and --workers to spread the load.
+UNIVERSE_FILE = Path(os.environ.get("UNIVERSE_FILE", Path(__file__).with_name("universe.csv")))
+EQUITY_UNIVERSE: dict[str, list[str]] = load_universe(UNIVERSE_FILE)
+
+# run_daily fetches, validates and stores prices in this many worker
+# processes, each handling a fixed shard of the universe.
+PIPELINE_WORKERS = int(os.environ.get("PIPELINE_WORKERS", "1"))
+
+
+def __getattr__(name: str) -> str:
+    if name not in _CREDENTIALS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    try:
+        value = os.environ[name]
+    except KeyError:
+        raise RuntimeError(f"{name} is not set; add it to the environment or .env.") from None
+    globals()[name] = value
+    return value
@@ -0,0 +1,28 @@
+import csv
+from pathlib import Path
+
+from data_pipeline.config.markets import MARKET_METADATA
+
+
+def load_universe(path: Path) -> dict[str, list[str]]:
+    """Tickers per market from a CSV with ``market`` and ``ticker`` columns.
+
+    Other columns are ignored, as are blank and repeated tickers. Markets
+    come back in ``MARKET_METADATA`` order, and markets without tickers are
+    left out.
+    """
+    universe: dict[str, list[str]] = {market: [] for market in MARKET_METADATA}
+    seen = set()
+    with open(path, newline="") as f:
+        reader = csv.DictReader(f)
+        missing = {"market", "ticker"} - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"{path} is missing columns: {sorted(missing)}")
+        for line, row in enumerate(reader, start=2):
+            market, ticker = row["market"].strip(), row["ticker"].strip()
+            if market not in universe:
+                raise ValueError(f"{path}:{line}: unknown market {market!r}")
+            if ticker and ticker not in seen:
+                seen.add(ticker)
+                universe[market].append(ticker)
+    return {market: tickers for market, tickers in universe.items() if tickers}
@@ -0,0 +1,143 @@
+import queue
+import random
+import threading
+import time
+from collections.abc import Callable, Hashable, Iterator
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any
+
+
+class TokenBucket:
+    """Thread-safe token bucket: ``rate`` tokens per second, bursts up to ``capacity``."""
+
+    def __init__(
+        self,
+        rate: float,
+        capacity: int,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], None] = time.sleep,
+    ):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def per_minute(cls, requests: int) -> "TokenBucket":
+        return cls(rate=requests / 60.0, capacity=max(1, requests // 12))
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            self._sleep(wait)
+
+
+def call_with_backoff(
+    fn: Callable[[], Any],
+    retries: int,
+    base_delay: float,
+    max_delay: float = 60.0,
+    limiter: TokenBucket | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Any:
+    """Call ``fn``, retrying up to ``retries`` times with jittered exponential backoff."""
+    attempt = 0
+    while True:
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return fn()
+        except Exception:
+            if attempt >= retries:
+                raise
+            delay = min(max_delay, base_delay * 2 ** attempt) * random.uniform(0.5, 1.0)
+            attempt += 1
+            sleep(delay)
+
+
+def run_jobs(
+    jobs: dict[Hashable, Callable[[], Any]],
+    max_workers: int,
+    retries: int,
+    base_delay: float,
+    limiters: dict[Hashable, TokenBucket | None] | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> tuple[dict[Hashable, Any], dict[Hashable, Exception]]:
+    """Run independent jobs concurrently, each with its own retry budget.
+
+    Returns ``(results, failures)`` keyed like ``jobs`` so callers can
+    resubmit only the keys that failed.
+    """
+    limiters = limiters or {}
+    results: dict[Hashable, Any] = {}
+    failures: dict[Hashable, Exception] = {}
+    if not jobs:
+        return results, failures
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(
+                call_with_backoff, fn, retries, base_delay,
+                limiter=limiters.get(key), sleep=sleep,
+            ): key
+            for key, fn in jobs.items()
+        }
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                results[key] = future.result()
+            except Exception as exc:
+                failures[key] = exc
+    return results, failures
+
+
+def stream_jobs(
+    jobs: dict[Hashable, Callable[[], Any]],
+    max_workers: int,
+    queue_size: int,
+    retries: int = 0,
+    base_delay: float = 0.0,
+) -> Iterator[tuple[Hashable, Any, Exception | None]]:
+    """Run jobs concurrently and yield ``(key, result, error)`` as each finishes.
+
+    Finished results wait in a queue of at most ``queue_size`` entries. Once
+    it is full, workers block before taking their next job, so a slow
+    consumer throttles the producers instead of letting results pile up in
+    memory. Closing the generator early cancels the jobs not yet started.
+    """
+    results: queue.Queue = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+
+    def _run(key: Hashable, fn: Callable[[], Any]) -> None:
+        if stop.is_set():
+            return
+        try:
+            item = (key, call_with_backoff(fn, retries, base_delay), None)
+        except Exception as exc:
+            item = (key, None, exc)
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+
+    pool = ThreadPoolExecutor(max_workers=max_workers)
+    for key, fn in jobs.items():
+        pool.submit(_run, key, fn)
+    try:
+        for _ in range(len(jobs)):
+            yield results.get()
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
@@ -1,26 +1,50 @@
+import hashlib
 from datetime import date
-from pathlib import Path
+from functools import lru_cache, partial
 
 import pandas as pd
-import yfinance as yf
-from fredapi import Fred
 
+from data_pipeline.config import settings
 from data_pipeline.config.markets import MACRO_INDICATORS
-from data_pipeline.config.settings import EQUITY_UNIVERSE, FRED_API_KEY, RAW_DATA_PATH
+from data_pipeline.config.settings import (
+    ACTION_FETCH_WORKERS,
+    EQUITY_UNIVERSE,
+    FETCH_BACKOFF_SECONDS,
+    FETCH_MAX_RETRIES,
+    FRED_FETCH_WORKERS,
+    FRED_REQUESTS_PER_MINUTE,
+)
+from data_pipeline.ingestion.engine import TokenBucket, run_jobs
+from data_pipeline.ingestion.frames import compact, normalize_dates
+from data_pipeline.ingestion.providers import yf_download
+from data_pipeline.pipeline import metrics
 from data_pipeline.pipeline.logger import get_logger
+from data_pipeline.storage.raw_lake import write_raw
 
 logger = get_logger(__name__)
 
+SeriesKey = tuple[str, str]
 
-def _fred_series(fred: Fred, ticker: str, start: str, end: str) -> pd.DataFrame:
-    series = fred.get_series(ticker, observation_start=start, observation_end=end)
+# Shared by every fetch in the process so concurrent flows stay under FRED's quota.
+_FRED_LIMITER = TokenBucket.per_minute(FRED_REQUESTS_PER_MINUTE)
+
+
+@lru_cache(maxsize=1)
+def _fred_client():
+    from fredapi import Fred
+
+    return Fred(api_key=settings.FRED_API_KEY)
+
+
+def _fred_series(ticker: str, start: str, end: str) -> pd.DataFrame:
+    series = _fred_client().get_series(ticker, observation_start=start, observation_end=end)
     df = series.reset_index()
     df.columns = ["date", "value"]
     return df
 
 
 def _yf_series(ticker: str, start: str, end: str) -> pd.DataFrame:
-    raw = yf.download(ticker, start=start, end=end, progress=False)
+    raw = yf_download(ticker, start, end)
     if raw.empty:
         return pd.DataFrame()
     close = raw["Close"]
@@ -31,79 +55,168 @@ def _yf_series(ticker: str, start: str, end: str) -> pd.DataFrame:
     return df
 
 
-def fetch_macro_indicators(
+def all_series() -> list[SeriesKey]:
+    return [
+        (market, indicator)
+        for market, indicators in MACRO_INDICATORS.items()
+        for indicator in indicators
+    ]
+
+
+def fetch_macro_series(
     start_date: str,
     end_date: str | None = None,
-) -> pd.DataFrame:
+    series: list[SeriesKey] | None = None,
+    windows: dict[SeriesKey, tuple[str, str]] | None = None,
+) -> tuple[pd.DataFrame, list[SeriesKey]]:
+    """Fetch macro series concurrently with per-series retries.
+
+    ``windows`` gives a series its own ``(start, end)`` fetch window; series
+    missing from it are skipped. Returns the combined long-format frame and
+    the ``(market, indicator)`` keys that still failed after their retries,
+    so callers can refetch just those.
+    """
     if end_date is None:
         end_date = str(date.today())
+    keys = all_series() if series is None else list(series)
+    if windows is not None:
+        keys = [key for key in keys if key in windows]
+
+    jobs = {}
+    limiters = {}
+    for market, indicator in keys:
+        meta = MACRO_INDICATORS[market][indicator]
+        ticker, source = meta["ticker"], meta["source"]
+        start, end = (start_date, end_date) if windows is None else windows[(market, indicator)]
+        if source == "fred":
+            job = partial(_fred_series, ticker, start, end)
+            limiters[(market, indicator)] = _FRED_LIMITER
+        else:
+            job = partial(_yf_series, ticker, start, end)
+        jobs[(market, indicator)] = metrics.metered(job, "fetch_macro", f"{market}/{indicator}")
+
+    results, failures = run_jobs(
+        jobs,
+        max_workers=FRED_FETCH_WORKERS,
+        retries=FETCH_MAX_RETRIES,
+        base_delay=FETCH_BACKOFF_SECONDS,
+        limiters=limiters,
+    )
+    for (market, indicator), exc in failures.items():
+        logger.error("Failed to fetch %s/%s: %s", market, indicator, exc)
 
-    fred = Fred(api_key=FRED_API_KEY)
     frames: list[pd.DataFrame] = []
-
-    for market, indicators in MACRO_INDICATORS.items():
-        for indicator, meta in indicators.items():
-            ticker, source = meta["ticker"], meta["source"]
-            try:
-                if source == "fred":
-                    df = _fred_series(fred, ticker, start_date, end_date)
-                else:
-                    df = _yf_series(ticker, start_date, end_date)
-
-                if df.empty:
-                    logger.warning("Empty result for %s/%s.", market, indicator)
-                    continue
-
-                df = df.dropna(subset=["value"])
-                df["market"] = market
-                df["indicator"] = indicator
-                df["source"] = source
-                frames.append(df)
-            except Exception as exc:
-                logger.error("Failed to fetch %s/%s: %s", market, indicator, exc)
-
+    for market, indicator in keys:
+        df = results.get((market, indicator))
+        if df is None:
+            continue
+        metrics.record("fetch_macro", f"{market}/{indicator}", rows_out=len(df))
+        if df.empty:
+            logger.warning("Empty result for %s/%s.", market, indicator)
+            continue
+        df = df.dropna(subset=["value"])
+        df["market"] = market
+        df["indicator"] = indicator
+        df["source"] = MACRO_INDICATORS[market][indicator]["source"]
+        frames.append(df)
+
+    failed = [key for key in keys if key in failures]
     if not frames:
         logger.warning("No macro data fetched.")
-        return pd.DataFrame()
+        return pd.DataFrame(), failed
+
+    result = compact(pd.concat(frames, ignore_index=True))
+    write_raw(result, "macro")
+    return result, failed
+
 
-    result = pd.concat(frames, ignore_index=True)
-    out_path = Path(RAW_DATA_PATH) / f"raw_macro_{end_date}.parquet"
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    result.to_parquet(out_path, index=False)
-    logger.info("Saved %d macro rows to %s.", len(result), out_path)
+def fetch_macro_indicators(
+    start_date: str,
+    end_date: str | None = None,
+) -> pd.DataFrame:
+    result, _ = fetch_macro_series(start_date, end_date)
     return result
 
 
-def fetch_corporate_actions() -> pd.DataFrame:
-    frames: list[pd.DataFrame] = []
+def _ticker_actions(ticker: str) -> pd.DataFrame:
+    import yfinance as yf
 
-    for market, tickers in EQUITY_UNIVERSE.items():
-        for ticker in tickers:
-            try:
-                t = yf.Ticker(ticker)
-
-                divs = t.dividends
-                if not divs.empty:
-                    df = divs.reset_index()
-                    df.columns = ["date", "value"]
-                    df["ticker"] = ticker
-                    df["action_type"] = "dividend"
-                    frames.append(df[["date", "ticker", "action_type", "value"]])
-
-                splits = t.splits
-                if not splits.empty:
-                    df = splits.reset_index()
-                    df.columns = ["date", "value"]
-                    df["ticker"] = ticker
-                    df["action_type"] = "split"
-                    frames.append(df[["date", "ticker", "action_type", "value"]])
-            except Exception as exc:
-                logger.error("Failed to fetch corporate actions for %s: %s", ticker, exc)
+    t = yf.Ticker(ticker)
+    frames = []
+    for action_type, series in (("dividend", t.dividends), ("split", t.splits)):
+        if series.empty:
+            continue
+        df = series.reset_index()
+        df.columns = ["date", "value"]
+        df["ticker"] = ticker
+        df["action_type"] = action_type
+        frames.append(df[["date", "ticker", "action_type", "value"]])
+    if not frames:
+        return pd.DataFrame(columns=["date", "ticker", "action_type", "value"])
+    return pd.concat(frames, ignore_index=True)
+
+
+def action_hashes(df: pd.DataFrame) -> dict[str, str]:
+    """Content hash of each ticker's full action history in ``df``."""
+    if df.empty:
+        return {}
+    dates = normalize_dates(df["date"])
+    lines = (
+        df["ticker"].astype(str) + "|" + dates.dt.strftime("%Y-%m-%d") + "|"
+        + df["action_type"].astype(str) + "|" + df["value"].round(8).astype(str)
+    )
+    return {
+        ticker: hashlib.sha256("\n".join(sorted(group)).encode()).hexdigest()
+        for ticker, group in lines.groupby(df["ticker"], observed=True)
+    }
+
+
+def fetch_corporate_actions(
+    known_hashes: dict[str, str] | None = None,
+    universe: dict[str, list[str]] | None = None,
+) -> pd.DataFrame:
+    """Fetch dividends and splits for ``universe`` (default the equity universe).
+
+    yfinance only serves full histories, so every ticker is fetched, but a
+    ticker whose history hashes to its entry in ``known_hashes`` is dropped
+    from the result. Only tickers with something new or revised come back,
+    each with its full history.
+    """
+    known_hashes = known_hashes or {}
+    jobs = {
+        ticker: metrics.metered(partial(_ticker_actions, ticker), "fetch_actions", market)
+        for market, tickers in (EQUITY_UNIVERSE if universe is None else universe).items()
+        for ticker in tickers
+    }
+    results, failures = run_jobs(
+        jobs,
+        max_workers=ACTION_FETCH_WORKERS,
+        retries=FETCH_MAX_RETRIES,
+        base_delay=FETCH_BACKOFF_SECONDS,
+    )
+    for ticker, exc in failures.items():
+        logger.error("Failed to fetch corporate actions for %s: %s", ticker, exc)
 
+    frames: list[pd.DataFrame] = []
+    unchanged = 0
+    for ticker in jobs:
+        df = results.get(ticker)
+        if df is None or df.empty:
+            continue
+        if known_hashes.get(ticker) == action_hashes(df).get(ticker):
+            unchanged += 1
+            continue
+        frames.append(df)
+
+    logger.info(
+        "Corporate actions: %d tickers changed, %d unchanged, %d failed.",
+        len(frames),
+        unchanged,
+        len(failures),
+    )
     if not frames:
-        logger.warning("No corporate actions fetched.")
         return pd.DataFrame()
 
-    result = pd.concat(frames, ignore_index=True)
+    result = compact(pd.concat(frames, ignore_index=True))
     logger.info("Fetched %d corporate action rows.", len(result))
     return result
@@ -1,60 +1,171 @@
+from collections.abc import Iterator
 from datetime import date
-from pathlib import Path
+from functools import partial
 
 import pandas as pd
-import yfinance as yf
 
-from data_pipeline.config.settings import EQUITY_UNIVERSE, RAW_DATA_PATH
+from data_pipeline.config.settings import (
+    EQUITY_UNIVERSE,
+    PRICE_BATCH_SIZE,
+    PRICE_FETCH_WORKERS,
+    PRICE_QUEUE_SIZE,
+)
+from data_pipeline.ingestion.engine import stream_jobs
+from data_pipeline.ingestion.frames import compact, concat
+from data_pipeline.ingestion.providers import PriceProvider, YFinancePriceProvider
+from data_pipeline.pipeline import metrics
 from data_pipeline.pipeline.logger import get_logger
+from data_pipeline.storage.raw_lake import write_raw
 
 logger = get_logger(__name__)
 
+PRICE_FIELDS = ["open", "high", "low", "close", "volume"]
 
-def _flatten_columns(df: pd.DataFrame) -> pd.DataFrame:
-    df.columns = [c[0] if isinstance(c, tuple) else c for c in df.columns]
-    return df
 
+class PriceMisses:
+    """Tickers a price fetch returned nothing for, filled in as batches arrive.
 
-def fetch_equity_prices(
+    ``empty`` maps a ticker to its ``(start, end)`` window when other tickers
+    in the same batch returned rows, so the window is known to hold no
+    prices. ``failed`` lists the tickers of batches that raised or came back
+    entirely empty, which is how yfinance reports network and rate-limit
+    errors, so nothing is known about them.
+    """
+
+    def __init__(self) -> None:
+        self.empty: dict[str, tuple[str, str]] = {}
+        self.failed: list[str] = []
+
+
+def _batches(
+    batch_size: int,
+    start_date: str,
+    end_date: str,
+    windows: dict[str, tuple[str, str]] | None,
+) -> list[tuple[str, list[str], str, str]]:
+    """Group tickers into ``(market, tickers, start, end)`` batches.
+
+    Tickers only share a batch when they share a market and a fetch window.
+    """
+    batches = []
+    for market, tickers in EQUITY_UNIVERSE.items():
+        by_window: dict[tuple[str, str], list[str]] = {}
+        for ticker in tickers:
+            if windows is None:
+                by_window.setdefault((start_date, end_date), []).append(ticker)
+            elif ticker in windows:
+                by_window.setdefault(windows[ticker], []).append(ticker)
+        for (start, end), group in by_window.items():
+            for i in range(0, len(group), batch_size):
+                batches.append((market, group[i:i + batch_size], start, end))
+    return batches
+
+
+def _split_batch(raw: pd.DataFrame, tickers: list[str], market: str) -> list[pd.DataFrame]:
+    """Split a ``(ticker, field)`` multi-index download into long-format frames."""
+    if not isinstance(raw.columns, pd.MultiIndex):
+        # A single-ticker batch may come back with flat columns.
+        raw = pd.concat({tickers[0]: raw}, axis=1)
+
+    available = set(raw.columns.get_level_values(0))
+    frames = []
+    for ticker in tickers:
+        if ticker not in available:
+            logger.warning("Empty result for ticker %s.", ticker)
+            continue
+        sub = raw[ticker]
+        sub.columns = sub.columns.str.lower()
+        sub = sub.dropna(how="all", subset=[c for c in PRICE_FIELDS if c in sub.columns])
+        if sub.empty:
+            logger.warning("Empty result for ticker %s.", ticker)
+            continue
+        sub.index.name = "date"
+        df = sub.reset_index()[["date"] + PRICE_FIELDS]
+        df["ticker"] = ticker
+        df["market"] = market
+        frames.append(df)
+    return frames
+
+
+def _fetch_batch(
+    provider: PriceProvider,
+    market: str,
+    tickers: list[str],
+    start_date: str,
+    end_date: str,
+) -> list[pd.DataFrame]:
+    raw = provider.download(tickers, start_date, end_date)
+    if raw is None or raw.empty:
+        logger.warning("Empty result for batch %s.", ", ".join(tickers))
+        return []
+    return _split_batch(raw, tickers, market)
+
+
+def iter_equity_prices(
     start_date: str,
     end_date: str | None = None,
-) -> pd.DataFrame:
+    provider: PriceProvider | None = None,
+    batch_size: int = PRICE_BATCH_SIZE,
+    max_workers: int = PRICE_FETCH_WORKERS,
+    windows: dict[str, tuple[str, str]] | None = None,
+    queue_size: int = PRICE_QUEUE_SIZE,
+    misses: PriceMisses | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Yield each batch's long-format frame as soon as it is fetched.
+
+    Batches arrive in completion order and are appended to the raw lake
+    before being yielded. At most ``queue_size`` fetched batches are held
+    for a slow consumer; past that the fetch workers wait. ``windows``
+    behaves as in :func:`fetch_equity_prices`. Tickers that come back
+    empty are added to ``misses``.
+    """
     if end_date is None:
         end_date = str(date.today())
+    if provider is None:
+        provider = YFinancePriceProvider()
 
-    frames: list[pd.DataFrame] = []
+    jobs = {
+        (market, tuple(tickers), start, end): metrics.metered(
+            partial(_fetch_batch, provider, market, tickers, start, end), "fetch_prices", market
+        )
+        for market, tickers, start, end in _batches(batch_size, start_date, end_date, windows)
+    }
+    if misses is None:
+        misses = PriceMisses()
+    for (market, tickers, start, end), frames, exc in stream_jobs(jobs, max_workers, queue_size):
+        if exc is not None:
+            logger.error("Failed to fetch %s: %s", ", ".join(tickers), exc)
+            misses.failed.extend(tickers)
+            continue
+        if not frames:
+            misses.failed.extend(tickers)
+            continue
+        fetched = {df["ticker"].iat[0] for df in frames}
+        misses.empty.update((t, (start, end)) for t in tickers if t not in fetched)
+        batch = compact(pd.concat(frames, ignore_index=True))
+        metrics.record("fetch_prices", market, rows_out=len(batch))
+        write_raw(batch, "prices")
+        yield batch
 
-    for market, tickers in EQUITY_UNIVERSE.items():
-        for ticker in tickers:
-            try:
-                raw = yf.download(
-                    ticker,
-                    start=start_date,
-                    end=end_date,
-                    auto_adjust=False,
-                    progress=False,
-                )
-                if raw.empty:
-                    logger.warning("Empty result for ticker %s.", ticker)
-                    continue
-
-                raw = _flatten_columns(raw)
-                raw.index.name = "date"
-                df = raw.reset_index()[["date", "open", "high", "low", "close", "volume"]]
-                df.columns = df.columns.str.lower()
-                df["ticker"] = ticker
-                df["market"] = market
-                frames.append(df)
-            except Exception as exc:
-                logger.error("Failed to fetch %s: %s", ticker, exc)
 
+def fetch_equity_prices(
+    start_date: str,
+    end_date: str | None = None,
+    provider: PriceProvider | None = None,
+    batch_size: int = PRICE_BATCH_SIZE,
+    max_workers: int = PRICE_FETCH_WORKERS,
+    windows: dict[str, tuple[str, str]] | None = None,
+) -> pd.DataFrame:
+    """Fetch OHLCV bars for the equity universe.
+
+    ``windows`` maps ticker to its own ``(start, end)`` fetch window;
+    tickers missing from it are skipped. Without it every ticker uses
+    ``start_date``/``end_date``.
+    """
+    frames = list(iter_equity_prices(start_date, end_date, provider, batch_size, max_workers, windows))
     if not frames:
         logger.warning("No equity price data fetched.")
         return pd.DataFrame()
 
-    result = pd.concat(frames, ignore_index=True)
-    out_path = Path(RAW_DATA_PATH) / f"raw_prices_{end_date}.parquet"
-    out_path.parent.mkdir(parents=True, exist_ok=True)
-    result.to_parquet(out_path, index=False)
-    logger.info("Saved %d rows to %s.", len(result), out_path)
-    return result
+    result = concat(frames)
+    return result.sort_values(["market", "ticker", "date"], ignore_index=True)
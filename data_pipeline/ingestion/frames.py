@@ -0,0 +1,80 @@
+"""Compact dtypes for the frames passed between ingestion, cleaning and storage.
+
+Key columns are categorical, so a batch holds each ticker or market string
+once instead of once per row. Dates are tz-naive midnights, the day
+resolution every table stores; pandas has no day unit, so they stay
+``datetime64[ns]`` and mix freely with other timestamps. Price columns are
+float32 when ``PRICES_FLOAT32`` is set.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from data_pipeline.config.settings import PRICES_FLOAT32
+
+KEY_COLUMNS = ("ticker", "market", "indicator", "source", "action_type")
+PRICE_COLUMNS = ("open", "high", "low", "close")
+
+
+def normalize_dates(dates: pd.Series) -> pd.Series:
+    """``dates`` as tz-naive midnights, each on its calendar day in its own timezone."""
+    dates = pd.to_datetime(dates)
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates.dt.normalize()
+
+
+def to_days(dates) -> np.ndarray:
+    """Calendar day of each date as int64 days since epoch, in its local timezone."""
+    if np.ndim(dates) == 0:
+        dates = [dates]
+    dates = pd.DatetimeIndex(pd.to_datetime(dates))
+    if dates.tz is not None:
+        dates = dates.tz_localize(None)
+    return dates.values.astype("datetime64[D]").astype(np.int64)
+
+
+def compact(df: pd.DataFrame, float32_prices: bool = PRICES_FLOAT32) -> pd.DataFrame:
+    """``df`` with categorical keys, day dates and optionally float32 prices."""
+    out = {}
+    for col in df.columns:
+        values = df[col]
+        if col in KEY_COLUMNS and not isinstance(values.dtype, pd.CategoricalDtype):
+            values = values.astype("category")
+        elif col == "date":
+            values = normalize_dates(values)
+        elif float32_prices and col in PRICE_COLUMNS and values.dtype == np.float64:
+            values = values.astype(np.float32)
+        out[col] = values
+    return pd.DataFrame(out, index=df.index)
+
+
+def series_labels(df: pd.DataFrame) -> pd.Series:
+    """``market/indicator`` label of each macro row, e.g. for metrics."""
+    return df["market"].astype(str) + "/" + df["indicator"].astype(str)
+
+
+def take_rows(df: pd.DataFrame, mask: np.ndarray) -> pd.DataFrame:
+    """Rows of ``df`` where ``mask`` is true, renumbered from 0, in a single copy."""
+    out = df.take(np.flatnonzero(mask))
+    out.index = pd.RangeIndex(len(out))
+    return out
+
+
+def concat(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Concatenate compact frames, keeping keys categorical.
+
+    ``pd.concat`` falls back to object strings when the frames' categories
+    differ; here the categories are unioned instead.
+    """
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame()
+    columns = {}
+    for col in frames[0].columns:
+        parts = [df[col] for df in frames]
+        if isinstance(parts[0].dtype, pd.CategoricalDtype):
+            columns[col] = pd.Series(union_categoricals(parts, sort_categories=True))
+        else:
+            columns[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(columns)
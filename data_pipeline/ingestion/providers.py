@@ -0,0 +1,40 @@
+import threading
+from typing import Protocol
+
+import pandas as pd
+
+
+class PriceProvider(Protocol):
+    """Source of daily OHLCV bars for a batch of tickers.
+
+    Implementations return a frame indexed by date with ``(ticker, field)``
+    MultiIndex columns, matching ``yf.download(..., group_by="ticker")``.
+    """
+
+    def download(self, tickers: list[str], start: str, end: str) -> pd.DataFrame:
+        ...
+
+
+# yf.download keeps its per-call results in module-level state, so two
+# overlapping calls corrupt each other. Calls are serialised here and
+# yfinance's own thread pool parallelises the tickers within a call.
+_YF_LOCK = threading.Lock()
+
+
+def yf_download(tickers: str | list[str], start: str, end: str, **kwargs) -> pd.DataFrame:
+    import yfinance as yf
+
+    with _YF_LOCK:
+        return yf.download(tickers, start=start, end=end, progress=False, **kwargs)
+
+
+class YFinancePriceProvider:
+    def download(self, tickers: list[str], start: str, end: str) -> pd.DataFrame:
+        return yf_download(
+            tickers,
+            start,
+            end,
+            auto_adjust=False,
+            group_by="ticker",
+            threads=len(tickers),
+        )
@@ -0,0 +1,107 @@
+from datetime import date, timedelta
+
+import pandas as pd
+
+from data_pipeline.config.markets import MACRO_INDICATORS
+from data_pipeline.config.settings import EQUITY_UNIVERSE, START_DATE
+
+Window = tuple[str, str]
+
+
+def _next_period_end(last_date: date) -> date:
+    """Last day of the month after the one containing ``last_date``."""
+    return (pd.Period(last_date, freq="M") + 1).end_time.date()
+
+
+def plan_window(
+    last_date: date | None,
+    end_date: str,
+    overlap_days: int = 0,
+    frequency: str = "D",
+    end_exclusive: bool = False,
+) -> Window | None:
+    """Smallest window that covers everything after ``last_date``.
+
+    ``overlap_days`` re-requests the tail of what is already stored so that
+    revisions are picked up. Returns ``None`` when nothing new can exist yet:
+    the window is empty, or the series is monthly and the period after the
+    last stored observation has not finished.
+    """
+    if last_date is None:
+        return START_DATE, end_date
+
+    end = date.fromisoformat(end_date)
+    if frequency == "M" and _next_period_end(last_date) >= end:
+        return None
+
+    start = last_date + timedelta(days=1) - timedelta(days=overlap_days)
+    if start > end or (end_exclusive and start == end):
+        return None
+    return str(start), end_date
+
+
+def plan_price_windows(
+    watermarks: dict[str, date],
+    end_date: str,
+    overlap_days: int = 0,
+) -> dict[str, Window]:
+    windows = {}
+    for tickers in EQUITY_UNIVERSE.values():
+        for ticker in tickers:
+            # yfinance treats ``end`` as exclusive.
+            window = plan_window(
+                watermarks.get(ticker), end_date, overlap_days, end_exclusive=True
+            )
+            if window is not None:
+                windows[ticker] = window
+    return windows
+
+
+def plan_macro_windows(
+    watermarks: dict[tuple[str, str], date],
+    end_date: str,
+    overlap_days: int = 0,
+) -> dict[tuple[str, str], Window]:
+    windows = {}
+    for market, indicators in MACRO_INDICATORS.items():
+        for indicator, meta in indicators.items():
+            window = plan_window(
+                watermarks.get((market, indicator)),
+                end_date,
+                overlap_days,
+                frequency=meta["frequency"],
+                end_exclusive=meta["source"] == "yfinance",
+            )
+            if window is not None:
+                windows[(market, indicator)] = window
+    return windows
+
+
+# ``(market, start, end)`` with both bounds inclusive.
+BackfillWindow = tuple[str, str, str]
+
+
+def plan_backfill_windows(
+    start_date: str,
+    end_date: str,
+    by: str = "year",
+) -> list[BackfillWindow]:
+    """Split ``start_date``..``end_date`` into per-market backfill windows.
+
+    ``by="year"`` gives one window per market and calendar year, clipped to
+    the range; ``by="market"`` gives one window per market covering all of it.
+    """
+    if by not in ("year", "market"):
+        raise ValueError(f"Unknown backfill window: {by}")
+    start, end = date.fromisoformat(start_date), date.fromisoformat(end_date)
+    markets = list(dict.fromkeys([*EQUITY_UNIVERSE, *MACRO_INDICATORS]))
+    windows = []
+    for market in markets:
+        if by == "market":
+            windows.append((market, str(start), str(end)))
+            continue
+        for year in range(start.year, end.year + 1):
+            lo = max(start, date(year, 1, 1))
+            hi = min(end, date(year, 12, 31))
+            windows.append((market, str(lo), str(hi)))
+    return windows
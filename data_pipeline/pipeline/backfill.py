@@ -0,0 +1,99 @@
+"""Resumable historical backfill, one market and date window at a time."""
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+
+from data_pipeline.config.markets import MACRO_INDICATORS
+from data_pipeline.config.settings import BACKFILL_MAX_WINDOWS, EQUITY_UNIVERSE
+from data_pipeline.ingestion.fetch_macro import fetch_macro_series
+from data_pipeline.ingestion.fetch_prices import PriceMisses, iter_equity_prices
+from data_pipeline.ingestion.windows import BackfillWindow, plan_backfill_windows
+from data_pipeline.pipeline.logger import get_logger
+from data_pipeline.pipeline.stages import store_macro, store_price_batches
+from data_pipeline.storage.backfill_state import completed_windows, mark_window_complete
+
+logger = get_logger(__name__)
+
+
+def run_window(window: BackfillWindow) -> tuple[int, int]:
+    """Fetch, validate and store one window; returns ``(price_rows, macro_rows)``.
+
+    Raises if a price batch failed or came back entirely empty, or if any
+    macro series in the window still fails after its retries, so the window
+    is not checkpointed and is retried on the next backfill.
+    """
+    market, start, end = window
+    # Window bounds are inclusive; yfinance treats ``end`` as exclusive.
+    after = str(date.fromisoformat(end) + timedelta(days=1))
+
+    tickers = EQUITY_UNIVERSE.get(market, [])
+    price_rows = 0
+    if tickers:
+        misses = PriceMisses()
+        batches = iter_equity_prices(
+            start, after, windows={t: (start, after) for t in tickers}, misses=misses
+        )
+        price_rows = int(store_price_batches(batches, misses)["rows"].sum())
+        if misses.failed:
+            raise RuntimeError("Price tickers failed: " + ", ".join(sorted(misses.failed)))
+
+    series = {
+        (market, indicator): (start, after if meta["source"] == "yfinance" else end)
+        for indicator, meta in MACRO_INDICATORS.get(market, {}).items()
+    }
+    macro_rows = 0
+    if series:
+        macro, failed = fetch_macro_series(start, end, list(series), series)
+        if failed:
+            raise RuntimeError(
+                "Macro series failed: " + ", ".join(f"{m}/{i}" for m, i in failed)
+            )
+        macro_rows = len(store_macro(macro))
+    return price_rows, macro_rows
+
+
+def backfill(
+    start_date: str,
+    end_date: str,
+    by: str = "year",
+    max_windows: int = BACKFILL_MAX_WINDOWS,
+) -> tuple[dict[BackfillWindow, tuple[int, int]], list[BackfillWindow]]:
+    """Run every window not yet checkpointed in ``backfill_state``.
+
+    At most ``max_windows`` windows are in flight at once and each releases
+    its data once stored, so peak memory is bounded by that many windows.
+    Returns the row counts of the windows completed by this call and the
+    windows that failed.
+    """
+    windows = plan_backfill_windows(start_date, end_date, by)
+    done = completed_windows()
+    pending = [w for w in windows if w not in done]
+    logger.info(
+        "Backfill %s..%s by %s: %d windows, %d already complete.",
+        start_date,
+        end_date,
+        by,
+        len(windows),
+        len(windows) - len(pending),
+    )
+
+    completed: dict[BackfillWindow, tuple[int, int]] = {}
+    failed: list[BackfillWindow] = []
+    with ThreadPoolExecutor(max_workers=max_windows) as pool:
+        futures = {pool.submit(run_window, w): w for w in pending}
+        for future in as_completed(futures):
+            window = futures[future]
+            try:
+                price_rows, macro_rows = future.result()
+            except Exception as exc:
+                logger.error("Backfill window %s %s..%s failed: %s", *window, exc)
+                failed.append(window)
+                continue
+            mark_window_complete(window, price_rows, macro_rows)
+            completed[window] = (price_rows, macro_rows)
+            logger.info(
+                "Backfill window %s %s..%s complete: %d price rows, %d macro rows.",
+                *window,
+                price_rows,
+                macro_rows,
+            )
+    return completed, sorted(failed)
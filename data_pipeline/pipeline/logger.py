@@ -1,24 +1,197 @@
+"""Logging shared by every pipeline module.
+
+Module loggers put their records on one queue and return; a single
+background thread writes them to the console and, as JSON lines, to
+LOG_FILE, rotated by size. Each record carries the run id and the metrics
+stage it was logged in, and LOG_STAGE_LEVELS sets the level per stage.
+"""
+import atexit
+import contextvars
+import json
 import logging
+import queue
+import threading
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
 
-_LOG_DIR = Path(__file__).resolve().parents[2] / "logs"
-_LOG_FILE = _LOG_DIR / "pipeline.log"
+from data_pipeline.config import settings
+
+_ROOT = "data_pipeline"
 _FORMATTER = logging.Formatter(
     fmt="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 
+_lock = threading.Lock()
+_handler: QueueHandler | None = None
+_listener: QueueListener | None = None
+_run_id: str | None = None
+_stage: contextvars.ContextVar[str | None] = contextvars.ContextVar("log_stage", default=None)
+# Level per stage; the None entry applies outside the listed stages.
+_levels: dict[str | None, int] = {}
+
+
+class _JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        created = datetime.fromtimestamp(record.created, timezone.utc)
+        return json.dumps({
+            "time": created.isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "run_id": getattr(record, "run_id", None),
+            "stage": getattr(record, "stage", None),
+            "message": record.getMessage(),
+        }, default=str)
+
+
+def _level(level: str | int) -> int:
+    if isinstance(level, int):
+        return level
+    try:
+        return logging.getLevelNamesMapping()[level.strip().upper()]
+    except KeyError:
+        raise ValueError(f"Unknown log level: {level!r}") from None
+
+
+def _annotate(record: logging.LogRecord) -> bool:
+    # Runs in the thread that logs. Records forwarded from worker processes
+    # arrive annotated by the worker.
+    if not hasattr(record, "stage"):
+        record.run_id = _run_id
+        record.stage = _stage.get()
+    return record.levelno >= _levels.get(record.stage, _levels[None])
+
+
+def _attach(handler: QueueHandler) -> None:
+    global _handler
+    handler.addFilter(_annotate)
+    root = logging.getLogger(_ROOT)
+    if _handler is not None:
+        root.removeHandler(_handler)
+    root.addHandler(handler)
+    root.setLevel(min(_levels.values()))
+    _handler = handler
+
+
+def _file_handler(path: Path) -> RotatingFileHandler:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    handler = RotatingFileHandler(
+        path,
+        maxBytes=int(settings.LOG_MAX_MB * 2**20),
+        backupCount=settings.LOG_BACKUPS,
+        encoding="utf-8",
+        delay=True,
+    )
+    handler.setFormatter(_JsonFormatter())
+    return handler
+
+
+def _setup() -> QueueHandler:
+    global _listener
+    with _lock:
+        if _handler is None:
+            _levels[None] = _level(settings.LOG_LEVEL)
+            for item in filter(None, settings.LOG_STAGE_LEVELS.split(",")):
+                stage, _, level = item.partition("=")
+                _levels[stage.strip()] = _level(level)
+
+            console = logging.StreamHandler()
+            console.setFormatter(_FORMATTER)
+            records = queue.SimpleQueue()
+            _listener = QueueListener(records, console, _file_handler(settings.LOG_FILE))
+            _listener.start()
+            atexit.register(_stop)
+            _attach(QueueHandler(records))
+    return _handler
+
 
 def get_logger(name: str) -> logging.Logger:
-    _LOG_DIR.mkdir(parents=True, exist_ok=True)
-    logger = logging.getLogger(name)
-    if logger.handlers:
-        return logger
-    logger.setLevel(logging.DEBUG)
-    stream_handler = logging.StreamHandler()
-    stream_handler.setFormatter(_FORMATTER)
-    file_handler = logging.FileHandler(_LOG_FILE)
-    file_handler.setFormatter(_FORMATTER)
-    logger.addHandler(stream_handler)
-    logger.addHandler(file_handler)
-    return logger
+    """A logger under ``data_pipeline``, whose records go through the shared queue."""
+    _setup()
+    if name != _ROOT and not name.startswith(_ROOT + "."):
+        name = f"{_ROOT}.{name}"
+    return logging.getLogger(name)
+
+
+def set_run_id(run_id: str | None) -> None:
+    """Tag every record from now on with ``run_id``."""
+    global _run_id
+    _run_id = run_id
+
+
+def set_log_file(path: Path) -> None:
+    """Write the JSON lines to ``path`` from now on, once earlier records are written."""
+    global _listener
+    _setup()
+    with _lock:
+        if _listener is None:
+            return
+        _listener.stop()
+        console, file = _listener.handlers
+        file.close()
+        _listener = QueueListener(_listener.queue, console, _file_handler(Path(path)))
+        _listener.start()
+
+
+def set_level(level: str | int | None, stage: str | None = None) -> None:
+    """Log ``level`` and above within ``stage``, or outside the stages given a
+    level of their own. A level of None drops ``stage``'s own level."""
+    _setup()
+    if level is not None:
+        _levels[stage] = _level(level)
+    elif stage is not None:
+        _levels.pop(stage, None)
+    logging.getLogger(_ROOT).setLevel(min(_levels.values()))
+
+
+@contextmanager
+def log_stage(stage: str) -> Iterator[None]:
+    """Tag records logged in the block, in this thread, with ``stage``."""
+    token = _stage.set(stage)
+    try:
+        yield
+    finally:
+        _stage.reset(token)
+
+
+def flush() -> None:
+    """Wait until every record logged so far is written."""
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener.start()
+
+
+def _stop() -> None:
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+@contextmanager
+def forward_from_workers(context) -> Iterator[tuple]:
+    """An ``(initializer, initargs)`` pair for a process pool of the
+    multiprocessing ``context``, whose workers then log through this
+    process's writer, with this run's id and levels."""
+    records = context.Queue()
+    listener = QueueListener(records, _setup())
+    listener.start()
+    try:
+        yield _log_to_queue, (records, _run_id, dict(_levels))
+    finally:
+        listener.stop()
+
+
+def _log_to_queue(records, run_id: str | None, levels: dict[str | None, int]) -> None:
+    _setup()
+    # The worker's own writer, started on import, is never used.
+    _stop()
+    with _lock:
+        set_run_id(run_id)
+        _levels.update(levels)
+        _attach(QueueHandler(records))
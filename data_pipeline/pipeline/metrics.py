@@ -0,0 +1,125 @@
+"""Per-stage, per-source run metrics.
+
+Stages record into one process-wide registry, which the flow resets at the
+start of a run and persists to ``stage_metrics`` at the end. Counters add
+up across calls and threads, so ``seconds`` is the total time spent in a
+stage, which can exceed wall time when the stage runs concurrently. Stages
+that process several sources in one call record their time under the
+source ``"all"``.
+"""
+import os
+import threading
+import time
+from collections.abc import Callable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+
+from data_pipeline.pipeline.logger import log_stage
+
+FIELDS = ("seconds", "rows_in", "rows_out", "rows_dropped", "bytes_written", "api_calls", "retries")
+
+_lock = threading.Lock()
+_stages: dict[tuple[str, str], dict[str, float]] = {}
+
+
+def reset() -> None:
+    with _lock:
+        _stages.clear()
+
+
+def record(stage: str, source: str, **counts: float) -> None:
+    """Add ``counts`` (any of ``FIELDS``) to the ``(stage, source)`` totals."""
+    unknown = set(counts) - set(FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown metrics: {sorted(unknown)}")
+    with _lock:
+        totals = _stages.setdefault((stage, source), dict.fromkeys(FIELDS, 0))
+        for name, value in counts.items():
+            totals[name] += value
+
+
+@contextmanager
+def timed(stage: str, source: str) -> Iterator[None]:
+    """Add the time spent in the block, or in each call of a decorated function.
+
+    Records logged meanwhile are tagged with ``stage``.
+    """
+    started = time.perf_counter()
+    try:
+        with log_stage(stage):
+            yield
+    finally:
+        record(stage, source, seconds=time.perf_counter() - started)
+
+
+def record_rows(stage: str, before: pd.Series, after: pd.Series) -> None:
+    """Record rows in, out and dropped per source label.
+
+    ``before`` and ``after`` hold the source label of each input and output
+    row, e.g. the ``market`` column before and after a filter.
+    """
+    rows_in = before.value_counts()
+    rows_in = rows_in[rows_in > 0]
+    rows_out = after.value_counts().reindex(rows_in.index, fill_value=0)
+    for source, n_in in rows_in.items():
+        n_out = int(rows_out[source])
+        record(stage, str(source), rows_in=int(n_in), rows_out=n_out, rows_dropped=int(n_in) - n_out)
+
+
+def metered(fn: Callable[[], Any], stage: str, source: str) -> Callable[[], Any]:
+    """Wrap an API call so every attempt counts a call, and every repeat a retry."""
+    attempts = 0
+
+    def call() -> Any:
+        nonlocal attempts
+        attempts += 1
+        record(stage, source, api_calls=1, retries=int(attempts > 1))
+        with timed(stage, source):
+            return fn()
+
+    return call
+
+
+def merge(other: pd.DataFrame) -> None:
+    """Add a :func:`snapshot` taken elsewhere, e.g. in a worker process."""
+    for row in other.to_dict(orient="records"):
+        record(row.pop("stage"), row.pop("source"), **row)
+
+
+def snapshot() -> pd.DataFrame:
+    """Current totals, one row per ``(stage, source)``."""
+    with _lock:
+        rows = [{"stage": s, "source": src, **totals} for (s, src), totals in _stages.items()]
+    df = pd.DataFrame(rows, columns=["stage", "source", *FIELDS])
+    return df.sort_values(["stage", "source"], ignore_index=True)
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_prometheus(df: pd.DataFrame, path: Path, run_id: str) -> None:
+    """Write ``df`` in Prometheus text format for the node-exporter textfile collector.
+
+    The file is replaced atomically so a scrape never sees a partial file.
+    """
+    lines = []
+    for field in FIELDS:
+        name = f"pipeline_stage_{field}"
+        lines += [f"# HELP {name} Pipeline {field.replace('_', ' ')} per stage and source.",
+                  f"# TYPE {name} gauge"]
+        for row in df.itertuples(index=False):
+            labels = f'stage="{_label(row.stage)}",source="{_label(row.source)}"'
+            lines.append(f"{name}{{{labels}}} {getattr(row, field):g}")
+    lines += [
+        "# HELP pipeline_last_run_timestamp_seconds Unix time the last run finished.",
+        "# TYPE pipeline_last_run_timestamp_seconds gauge",
+        f'pipeline_last_run_timestamp_seconds{{run_id="{_label(run_id)}"}} {time.time():.0f}',
+    ]
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text("\n".join(lines) + "\n")
+    os.replace(tmp, path)
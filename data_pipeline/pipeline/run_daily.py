@@ -3,113 +3,349 @@ from __future__ import annotations
 
 import argparse
 import uuid
-from datetime import date, datetime
+from datetime import date, datetime, timedelta
+from pathlib import Path
 
 import pandas as pd
 from prefect import flow, task
 
-from data_pipeline.cleaning.align_calendars import filter_to_trading_days
-from data_pipeline.cleaning.validate import validate_macro, validate_prices
-from data_pipeline.config.markets import MARKET_METADATA
-from data_pipeline.config.settings import START_DATE
-from data_pipeline.ingestion.fetch_macro import fetch_corporate_actions, fetch_macro_indicators
-from data_pipeline.ingestion.fetch_prices import fetch_equity_prices
-from data_pipeline.pipeline.logger import get_logger
+from data_pipeline.config.markets import MACRO_INDICATORS
+from data_pipeline.config.settings import (
+    BACKFILL_MAX_WINDOWS,
+    BACKFILL_WINDOW,
+    EQUITY_UNIVERSE,
+    MACRO_FLOW_RETRIES,
+    MACRO_OVERLAP_DAYS,
+    METRICS_PROM_FILE,
+    PIPELINE_WORKERS,
+    PRICE_OVERLAP_DAYS,
+    START_DATE,
+)
+from data_pipeline.ingestion.fetch_macro import (
+    SeriesKey,
+    action_hashes,
+    fetch_corporate_actions,
+    fetch_macro_series,
+)
+from data_pipeline.ingestion.fetch_prices import PriceMisses, iter_equity_prices
+from data_pipeline.ingestion.frames import concat
+from data_pipeline.ingestion.windows import Window, plan_macro_windows, plan_price_windows
+from data_pipeline.pipeline import metrics
+from data_pipeline.pipeline.backfill import backfill
+from data_pipeline.pipeline.logger import get_logger, set_run_id
+from data_pipeline.pipeline.schedule import run_schedule
+from data_pipeline.pipeline.sharding import (
+    check_workers,
+    parse_shard,
+    run_price_shards,
+    shard_universe,
+)
+from data_pipeline.pipeline.stages import store_macro, store_price_batches
+from data_pipeline.storage.action_state import (
+    diff_actions,
+    save_action_hashes,
+    stored_action_hashes,
+)
 from data_pipeline.storage.database import initialize_schema, insert_dataframe, query
+from data_pipeline.storage.raw_lake import RAW_KEYS, compact_raw
+from data_pipeline.storage.stage_metrics import save_stage_metrics
+from data_pipeline.storage.watermarks import macro_watermarks, price_watermarks
+from data_pipeline.transform.adjust_prices import update_adjusted_prices
+from data_pipeline.transform.features import update_features
+from data_pipeline.transform.macro_panel import update_macro_panel
 
 logger = get_logger(__name__)
 
 
 @task(retries=3, retry_delay_seconds=60)
-def fetch_prices_task(start_date: str, end_date: str) -> pd.DataFrame:
-    return fetch_equity_prices(start_date, end_date)
+def fetch_and_store_prices_task(
+    start_date: str,
+    end_date: str,
+    windows: dict[str, Window] | None = None,
+    workers: int = 1,
+) -> pd.DataFrame:
+    """Validate, calendar-filter and store each price batch as soon as it is fetched.
+
+    Storage of one batch overlaps with the download of the next ones. With
+    ``workers`` above 1 the tickers in ``windows`` are split over that many
+    worker processes. Returns the :func:`stored_summary` of the stored rows;
+    each batch is released once stored.
+    """
+    if workers > 1:
+        stored = run_price_shards(start_date, end_date, windows, workers)
+    else:
+        misses = PriceMisses()
+        batches = iter_equity_prices(start_date, end_date, windows=windows, misses=misses)
+        stored = store_price_batches(batches, misses)
+    if stored.empty:
+        logger.warning("No equity price data fetched.")
+    return stored
+
+
+@task
+def fetch_macro_task(
+    start_date: str,
+    end_date: str,
+    series: list[SeriesKey] | None = None,
+    windows: dict[SeriesKey, Window] | None = None,
+) -> tuple[pd.DataFrame, list[SeriesKey]]:
+    # Retries happen per series inside fetch_macro_series; the flow refetches
+    # whatever is still failing instead of rerunning the whole task.
+    return fetch_macro_series(start_date, end_date, series, windows)
 
 
 @task(retries=3, retry_delay_seconds=60)
-def fetch_macro_task(start_date: str, end_date: str) -> pd.DataFrame:
-    return fetch_macro_indicators(start_date, end_date)
+def fetch_corporate_actions_task(universe: dict[str, list[str]] | None = None) -> pd.DataFrame:
+    return fetch_corporate_actions(stored_action_hashes(), universe)
 
 
 @task(retries=3, retry_delay_seconds=60)
-def fetch_corporate_actions_task() -> pd.DataFrame:
-    return fetch_corporate_actions()
+def validate_and_store_macro_task(df: pd.DataFrame) -> pd.DataFrame:
+    return store_macro(df)
 
 
 @task(retries=3, retry_delay_seconds=60)
-def validate_and_store_prices_task(df: pd.DataFrame) -> int:
+def store_corporate_actions_task(df: pd.DataFrame) -> set[str]:
+    """Store new or revised actions; returns the tickers they belong to."""
     if df.empty:
-        return 0
-    df = validate_prices(df)
-    rows = 0
-    for market in df["market"].unique():
-        market_df = df[df["market"] == market].copy()
-        market_df = filter_to_trading_days(market_df, market)
-        cols = ["date", "ticker", "market", "open", "high", "low", "close", "volume"]
-        rows += insert_dataframe(market_df[cols], "raw_prices")
-    return rows
+        return set()
+    new, revised = diff_actions(df)
+    changed = pd.concat([new, revised])
+    if not changed.empty:
+        insert_dataframe(changed, "corporate_actions")
+    # Hashes are saved last so a failed write is retried on the next run.
+    save_action_hashes(action_hashes(df))
+    logger.info(
+        "Corporate actions: %d new, %d revised, %d unchanged rows.",
+        len(new),
+        len(revised),
+        len(df) - len(changed),
+    )
+    return set(changed["ticker"])
 
 
 @task(retries=3, retry_delay_seconds=60)
-def validate_and_store_macro_task(df: pd.DataFrame) -> int:
-    if df.empty:
-        return 0
-    df = validate_macro(df)
-    cols = ["date", "market", "indicator", "source", "value"]
-    return insert_dataframe(df[cols], "macro_indicators")
+def adjust_prices_task(stored: pd.DataFrame, changed_tickers: set[str]) -> int:
+    with metrics.timed("adjust_prices", "prices"):
+        return update_adjusted_prices(stored, changed_tickers)
+
+
+@task(retries=3, retry_delay_seconds=60)
+def update_features_task(stored: pd.DataFrame, changed_tickers: set[str]) -> int:
+    with metrics.timed("features", "prices"):
+        return update_features(stored, changed_tickers)
+
+
+@task(retries=3, retry_delay_seconds=60)
+def update_macro_panel_task(changed: pd.DataFrame, end_date: str, rebuild: bool = False) -> int:
+    with metrics.timed("macro_panel", "all"):
+        return update_macro_panel(changed, end_date, rebuild)
+
+
+@task
+def compact_raw_task() -> int:
+    with metrics.timed("compact_raw", "raw_lake"):
+        return sum(compact_raw(source) for source in RAW_KEYS)
 
 
 @flow(name="Macro Data Daily Pipeline")
 def run_pipeline(
     start_date: str | None = None,
     end_date: str | None = None,
+    shard: str | None = None,
+    workers: int = PIPELINE_WORKERS,
+    markets: list[str] | None = None,
 ) -> None:
-    initialize_schema()
+    """Fetch, validate and store everything due up to ``end_date``.
+
+    ``shard`` ``"i/N"`` limits the run to shard ``i`` of the equity
+    universe, so N runs on separate machines cover it between them. Shard 0
+    also updates the macro data, and raw-lake compaction is left to
+    unsharded runs. ``workers`` splits price ingestion over that many
+    processes. ``markets`` limits the tickers and macro series to those
+    markets.
+    """
+    # Checked before any task runs, so retries are not spent on a config error.
+    check_workers(workers)
+    run_id = _start_run()
 
-    if start_date is None:
-        start_date = str(date.today())
     if end_date is None:
         end_date = str(date.today())
+    if shard is not None:
+        shard = parse_shard(shard)
+    universe = EQUITY_UNIVERSE if shard is None else shard_universe(EQUITY_UNIVERSE, shard)
+    macro_series = None
+    if markets is not None:
+        universe = {m: tickers for m, tickers in universe.items() if m in markets}
+        macro_series = [(m, i) for m in markets for i in MACRO_INDICATORS.get(m, {})]
+    with_macro = shard is None or shard[0] == 0
+
+    # Without an explicit start, each series fetches only the gap since its
+    # last stored date, so missed days are backfilled automatically.
+    price_windows = macro_windows = None
+    if start_date is None:
+        price_windows = plan_price_windows(price_watermarks(), end_date, PRICE_OVERLAP_DAYS)
+        macro_windows = plan_macro_windows(macro_watermarks(), end_date, MACRO_OVERLAP_DAYS)
+        start_date = end_date
+        logger.info(
+            "Incremental run: %d tickers and %d macro series have new data due.",
+            len(price_windows),
+            len(macro_windows),
+        )
+    if universe is not EQUITY_UNIVERSE or workers > 1:
+        # Partial runs and workers pick their tickers from explicit windows.
+        tickers = [t for ts in universe.values() for t in ts]
+        if price_windows is None:
+            price_windows = {t: (start_date, end_date) for t in tickers}
+        price_windows = {t: price_windows[t] for t in tickers if t in price_windows}
+
+    # Macro and corporate actions download in the background while price
+    # batches stream through validation and storage.
+    if with_macro:
+        macro_future = fetch_macro_task.submit(start_date, end_date, macro_series, macro_windows)
+    actions_future = fetch_corporate_actions_task.submit(universe)
 
-    # Submit price and macro fetches concurrently
-    prices_future = fetch_prices_task.submit(start_date, end_date)
-    macro_future = fetch_macro_task.submit(start_date, end_date)
-    actions_future = fetch_corporate_actions_task.submit()
+    stored_prices = fetch_and_store_prices_task(start_date, end_date, price_windows, workers)
+    price_rows = int(stored_prices["rows"].sum())
 
-    prices_df = prices_future.result()
-    macro_df = macro_future.result()
+    macro_df, failed_series = macro_future.result() if with_macro else (pd.DataFrame(), [])
     actions_df = actions_future.result()
 
-    price_rows = validate_and_store_prices_task(prices_df)
-    macro_rows = validate_and_store_macro_task(macro_df)
+    for _ in range(MACRO_FLOW_RETRIES):
+        if not failed_series:
+            break
+        logger.warning("Refetching %d failed macro series.", len(failed_series))
+        retry_df, failed_series = fetch_macro_task(
+            start_date, end_date, failed_series, macro_windows
+        )
+        macro_df = concat([macro_df, retry_df])
+    if failed_series:
+        logger.error(
+            "Macro series still failing: %s",
+            ", ".join(f"{m}/{i}" for m, i in failed_series),
+        )
+
+    stored_macro = validate_and_store_macro_task(macro_df)
+    macro_rows = len(stored_macro)
+    update_macro_panel_task(stored_macro, end_date)
 
-    if not actions_df.empty:
-        insert_dataframe(actions_df, "corporate_actions")
+    changed_tickers = store_corporate_actions_task(actions_df)
+    adjust_prices_task(stored_prices, changed_tickers)
+    update_features_task(stored_prices, changed_tickers)
+    if shard is None:
+        compact_raw_task()
 
     total_rows = price_rows + macro_rows
+    error_message = None
+    if failed_series:
+        error_message = "Failed macro series: " + ", ".join(f"{m}/{i}" for m, i in failed_series)
+    _log_run(run_id, total_rows, error_message)
+
+
+def run_market_close(market: str, session: date) -> None:
+    """Update ``market`` once its ``session`` has closed."""
+    # yfinance's end is exclusive.
+    run_pipeline(end_date=str(session + timedelta(days=1)), markets=[market])
+
+
+def _start_run() -> str:
+    initialize_schema()
+    metrics.reset()
     run_id = uuid.uuid4().hex[:8]
-    status = "SUCCESS" if total_rows > 0 else "PARTIAL"
+    set_run_id(run_id)
+    return run_id
+
 
+def _log_run(run_id: str, total_rows: int, error_message: str | None) -> None:
+    """Record the run in pipeline_log and its per-stage metrics in stage_metrics."""
+    stage_metrics = metrics.snapshot()
+    save_stage_metrics(run_id, stage_metrics)
+    if METRICS_PROM_FILE:
+        metrics.write_prometheus(stage_metrics, Path(METRICS_PROM_FILE), run_id)
+
+    status = "SUCCESS" if total_rows > 0 and error_message is None else "PARTIAL"
     log_df = pd.DataFrame([{
         "run_id": run_id,
         "run_date": datetime.utcnow(),
         "status": status,
         "rows_inserted": total_rows,
-        "error_message": None,
+        "error_message": error_message,
     }])
     insert_dataframe(log_df, "pipeline_log")
     logger.info("Pipeline complete. run_id=%s status=%s rows=%d", run_id, status, total_rows)
 
 
+@flow(name="Macro Data Historical Backfill")
+def run_backfill(
+    start_date: str = START_DATE,
+    end_date: str | None = None,
+    window_by: str = BACKFILL_WINDOW,
+    max_windows: int = BACKFILL_MAX_WINDOWS,
+) -> None:
+    """Backfill ``start_date``..``end_date`` window by window, resuming past checkpoints."""
+    run_id = _start_run()
+    if end_date is None:
+        end_date = str(date.today())
+
+    completed, failed = backfill(start_date, end_date, window_by, max_windows)
+
+    store_corporate_actions_task(fetch_corporate_actions_task())
+    # Adjusted history and its features are rebuilt from raw_prices once all
+    # windows are in, one market at a time to keep memory bounded.
+    for tickers in EQUITY_UNIVERSE.values():
+        adjust_prices_task(pd.DataFrame(), set(tickers))
+        update_features_task(pd.DataFrame(), set(tickers))
+    update_macro_panel_task(pd.DataFrame(), end_date, rebuild=True)
+    compact_raw_task()
+
+    total_rows = sum(p + m for p, m in completed.values())
+    error_message = None
+    if failed:
+        error_message = "Failed backfill windows: " + ", ".join(
+            f"{m} {s}..{e}" for m, s, e in failed
+        )
+    _log_run(run_id, total_rows, error_message)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Macro data pipeline")
     parser.add_argument(
         "--historical",
         action="store_true",
-        help="Run historical load from START_DATE.",
+        help="Backfill from START_DATE, resuming any interrupted backfill.",
+    )
+    parser.add_argument(
+        "--window-by",
+        choices=["year", "market"],
+        default=BACKFILL_WINDOW,
+        help="Backfill window size (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--max-windows",
+        type=int,
+        default=BACKFILL_MAX_WINDOWS,
+        help="Backfill windows processed concurrently (default: %(default)s).",
+    )
+    parser.add_argument(
+        "--schedule",
+        action="store_true",
+        help="Keep running, updating each market shortly after its exchange closes.",
+    )
+    parser.add_argument(
+        "--shard",
+        help="Daily run for shard i of N of the equity universe, e.g. 0/4.",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=PIPELINE_WORKERS,
+        help="Processes that fetch, validate and store prices (default: %(default)s).",
     )
     args = parser.parse_args()
 
     if args.historical:
-        run_pipeline(start_date=START_DATE, end_date=str(date.today()))
+        run_backfill(START_DATE, str(date.today()), args.window_by, args.max_windows)
+    elif args.schedule:
+        run_schedule(run_market_close)
     else:
-        run_pipeline()
+        run_pipeline(shard=args.shard, workers=args.workers)
@@ -0,0 +1,107 @@
+"""Run each market's daily update shortly after its exchange closes.
+
+Close times come from the market's exchange calendar, so early closes are
+followed and holidays, which have no session, never trigger a run.
+"""
+import time
+from collections.abc import Callable
+from datetime import date, timedelta
+from functools import lru_cache
+
+import pandas as pd
+
+from data_pipeline.config.markets import MARKET_METADATA
+from data_pipeline.config.settings import MARKET_CLOSE_DELAY_MINUTES
+from data_pipeline.pipeline.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class Clock:
+    """The current time in UTC, and a way to wait; tests substitute a fake."""
+
+    def now(self) -> pd.Timestamp:
+        return pd.Timestamp.now(tz="UTC")
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+# First session of each market's calendar; markets not listed use the
+# library's default.
+_starts: dict[str, date] = {}
+
+
+@lru_cache(maxsize=None)
+def _closes(market: str) -> pd.Series:
+    # exchange_calendars is slow to import and only the scheduler needs closes.
+    import exchange_calendars as ec
+
+    return ec.get_calendar(MARKET_METADATA[market]["calendar"], start=_starts.get(market)).closes
+
+
+def next_close(market: str, after: pd.Timestamp) -> tuple[date, pd.Timestamp]:
+    """The first session of ``market`` that closes after ``after``, and its close in UTC."""
+    closes = _closes(market)
+    i = closes.searchsorted(after, side="right")
+    if i == len(closes):
+        # A calendar ends about a year after it is built, which a running
+        # schedule outlives: build it again from ``after``.
+        _starts[market] = after.date()
+        _closes.cache_clear()
+        closes = _closes(market)
+        i = closes.searchsorted(after, side="right")
+    if i == len(closes):
+        raise ValueError(f"No {market} session closes after {after}.")
+    return closes.index[i].date(), closes.iloc[i]
+
+
+def run_schedule(
+    run_market: Callable[[str, date], None],
+    markets: list[str] | None = None,
+    delay: timedelta = timedelta(minutes=MARKET_CLOSE_DELAY_MINUTES),
+    clock: Clock | None = None,
+    until: pd.Timestamp | None = None,
+) -> None:
+    """Call ``run_market(market, session)`` ``delay`` after every close of each market.
+
+    Sessions whose run time is still ahead when the schedule starts are
+    included, so a schedule started just after a close still runs it. A
+    failed run is logged and the schedule carries on; the market's next run
+    fetches the gap from its watermarks. A market whose next close cannot be
+    found is logged and dropped, and the others carry on. Runs until
+    ``until``, or forever.
+    """
+    clock = clock or Clock()
+    markets = markets or list(MARKET_METADATA)
+    due: dict[str, tuple[date, pd.Timestamp]] = {}
+
+    def plan(market: str, after: pd.Timestamp) -> None:
+        try:
+            due[market] = next_close(market, after)
+        except Exception:
+            logger.exception("No %s session found after %s; dropping it.", market, after)
+            due.pop(market, None)
+
+    started = clock.now()
+    for market in markets:
+        plan(market, started - delay)
+    while due:
+        market = min(due, key=lambda m: due[m][1])
+        session, close = due[market]
+        run_at = close + delay
+        if until is not None and run_at > until:
+            return
+        wait = (run_at - clock.now()).total_seconds()
+        if wait > 0:
+            local = close.tz_convert(MARKET_METADATA[market]["timezone"])
+            logger.info(
+                "Next: %s session %s, closing %s local time; running in %.0f minutes.",
+                market, session, local.strftime("%H:%M"), wait / 60,
+            )
+            clock.sleep(wait)
+        try:
+            run_market(market, session)
+        except Exception:
+            logger.exception("%s run for session %s failed.", market, session)
+        plan(market, close)
@@ -0,0 +1,101 @@
+"""Split the equity universe into shards that run in separate processes.
+
+A ticker's shard depends only on its symbol and the shard count, so it
+stays put as the universe file changes. Shards write through the tables'
+primary keys, so they can run in any order, on any machine, and be rerun.
+"""
+import multiprocessing
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from data_pipeline.ingestion.fetch_prices import PriceMisses, iter_equity_prices
+from data_pipeline.ingestion.windows import Window
+from data_pipeline.pipeline import metrics
+from data_pipeline.pipeline.logger import forward_from_workers, get_logger
+from data_pipeline.pipeline.stages import store_price_batches, stored_summary
+from data_pipeline.storage import database
+
+logger = get_logger(__name__)
+
+Shard = tuple[int, int]
+
+
+def parse_shard(value: str) -> Shard:
+    """``"i/N"`` as ``(i, N)``, with shards numbered from 0."""
+    index, _, count = value.partition("/")
+    shard = int(index), int(count)
+    if not 0 <= shard[0] < shard[1]:
+        raise ValueError(f"Shard {value!r} is not of the form i/N with 0 <= i < N.")
+    return shard
+
+
+def in_shard(ticker: str, shard: Shard) -> bool:
+    index, count = shard
+    return zlib.crc32(ticker.encode()) % count == index
+
+
+def shard_universe(universe: dict[str, list[str]], shard: Shard) -> dict[str, list[str]]:
+    return {
+        market: [t for t in tickers if in_shard(t, shard)]
+        for market, tickers in universe.items()
+    }
+
+
+def ingest_prices(
+    start_date: str,
+    end_date: str,
+    windows: dict[str, Window],
+) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Fetch, validate and store the prices of the tickers in ``windows``.
+
+    Runs in a worker process; returns the :func:`stored_summary` of the
+    stored rows and the worker's metrics for the parent to merge.
+    """
+    metrics.reset()
+    misses = PriceMisses()
+    batches = iter_equity_prices(start_date, end_date, windows=windows, misses=misses)
+    return store_price_batches(batches, misses), metrics.snapshot()
+
+
+def check_workers(workers: int) -> None:
+    """Raise unless the storage backend can take writes from ``workers`` processes."""
+    if workers > 1 and database.STORAGE_BACKEND == "duckdb":
+        raise ValueError(
+            "Price workers need STORAGE_BACKEND=postgres; DuckDB allows a single writer."
+        )
+
+
+def run_price_shards(
+    start_date: str,
+    end_date: str,
+    windows: dict[str, Window],
+    workers: int,
+) -> pd.DataFrame:
+    """Split ``windows`` over ``workers`` processes that each run :func:`ingest_prices`.
+
+    Each worker opens its own database connection, so this needs a backend
+    that accepts writes from several processes.
+    """
+    check_workers(workers)
+    # Spawned rather than forked: the parent runs threads (Prefect, fetch pools).
+    context = multiprocessing.get_context("spawn")
+    with forward_from_workers(context) as (initializer, initargs), ProcessPoolExecutor(
+        max_workers=workers, mp_context=context, initializer=initializer, initargs=initargs
+    ) as pool:
+        tickers = sorted(windows)
+        futures = [
+            pool.submit(
+                ingest_prices, start_date, end_date, {t: windows[t] for t in tickers[i::workers]}
+            )
+            for i in range(workers)
+        ]
+        frames = []
+        for future in futures:
+            stored, shard_metrics = future.result()
+            metrics.merge(shard_metrics)
+            frames.append(stored)
+    stored = stored_summary(frames)
+    logger.info("Price shards: %d workers stored %d rows.", workers, stored["rows"].sum())
+    return stored
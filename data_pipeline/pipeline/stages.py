@@ -0,0 +1,93 @@
+"""Validation and storage steps shared by the daily and backfill flows."""
+from collections.abc import Iterable
+from datetime import datetime
+
+import pandas as pd
+
+from data_pipeline.cleaning.align_calendars import filter_all_markets
+from data_pipeline.cleaning.validate import check_prices, validate_macro
+from data_pipeline.ingestion.fetch_prices import PriceMisses
+from data_pipeline.ingestion.frames import series_labels
+from data_pipeline.pipeline import metrics
+from data_pipeline.storage.database import insert_dataframe
+from data_pipeline.storage.macro_vintages import diff_macro, save_vintages
+from data_pipeline.storage.price_checks import (
+    load_price_state,
+    save_price_issues,
+    save_price_state,
+)
+from data_pipeline.storage.watermarks import mark_prices_checked
+
+PRICE_COLS = ["date", "ticker", "market", "open", "high", "low", "close", "volume"]
+MACRO_COLS = ["date", "market", "indicator", "source", "value"]
+STORED_COLS = ["ticker", "date", "rows"]
+
+
+def store_prices(df: pd.DataFrame) -> pd.DataFrame:
+    """Calendar-filter, validate and store prices; returns the stored rows.
+
+    Validation continues each ticker from its stored ``price_state``; rule
+    hits go to ``price_issues``.
+    """
+    if df.empty:
+        return df
+    state = load_price_state(df["ticker"].unique())
+    df, report, state = check_prices(filter_all_markets(df), state)
+    if set(df.columns) != set(PRICE_COLS):
+        df = df[PRICE_COLS]
+    insert_dataframe(df, "raw_prices")
+    save_price_state(state)
+    save_price_issues(report)
+    return df
+
+
+def stored_summary(frames: list[pd.DataFrame]) -> pd.DataFrame:
+    """Each ticker's first date and row count over ``frames`` (``STORED_COLS``).
+
+    ``frames`` are stored prices or earlier summaries. The summary is all the
+    adjusted-price and feature updates need, so a run keeps it instead of
+    every stored row.
+    """
+    parts = []
+    for df in frames:
+        if df.empty:
+            continue
+        if "rows" not in df.columns:
+            df = df.assign(ticker=df["ticker"].astype(str), rows=1)
+        parts.append(df[STORED_COLS])
+    if not parts:
+        return pd.DataFrame(columns=STORED_COLS)
+    return (
+        pd.concat(parts, ignore_index=True)
+        .groupby("ticker", as_index=False)
+        .agg(date=("date", "min"), rows=("rows", "sum"))
+    )
+
+
+def store_price_batches(batches: Iterable[pd.DataFrame], misses: PriceMisses) -> pd.DataFrame:
+    """Store each batch as it arrives; returns the :func:`stored_summary`.
+
+    ``misses`` is the one the batches were fetched with. Once every batch is
+    stored, the tickers it confirms empty are recorded in ``price_checked``
+    so that their watermark moves on.
+    """
+    stored = stored_summary([stored_summary([store_prices(batch)]) for batch in batches])
+    if misses.empty:
+        mark_prices_checked(misses.empty)
+    return stored
+
+
+def store_macro(df: pd.DataFrame, fetched_at: datetime | None = None) -> pd.DataFrame:
+    """Validate macro observations and store the new or revised ones; returns those.
+
+    ``macro_indicators`` keeps the latest value of each observation and
+    ``macro_vintages`` every value with the time it was fetched (default now).
+    """
+    if df.empty:
+        return df
+    df = validate_macro(df)[MACRO_COLS]
+    changed = diff_macro(df)
+    metrics.record_rows("diff_macro", series_labels(df), series_labels(changed))
+    save_vintages(changed, fetched_at or datetime.utcnow())
+    insert_dataframe(changed, "macro_indicators")
+    return changed
@@ -0,0 +1,47 @@
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline.ingestion.frames import normalize_dates
+from data_pipeline.storage.database import insert_dataframe, query
+
+
+def stored_action_hashes() -> dict[str, str]:
+    df = query("SELECT ticker, content_hash FROM corporate_action_state")
+    return dict(zip(df["ticker"], df["content_hash"]))
+
+
+def save_action_hashes(hashes: dict[str, str]) -> int:
+    if not hashes:
+        return 0
+    df = pd.DataFrame({
+        "ticker": list(hashes),
+        "content_hash": list(hashes.values()),
+        "updated_at": datetime.utcnow(),
+    })
+    return insert_dataframe(df, "corporate_action_state")
+
+
+def diff_actions(actions: pd.DataFrame) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """Split ``actions`` into rows not stored yet and rows stored with another value."""
+    if actions.empty:
+        return actions, actions
+    stored = query(
+        "SELECT date, ticker, action_type, value FROM corporate_actions "
+        "WHERE ticker = ANY(%(tickers)s)",
+        {"tickers": sorted(actions["ticker"].unique())},
+    )
+    keys = ["date", "ticker", "action_type"]
+    merged = actions.assign(date=normalize_dates(actions["date"])).merge(
+        stored.assign(date=normalize_dates(stored["date"])),
+        on=keys,
+        how="left",
+        suffixes=("", "_stored"),
+        indicator=True,
+    )
+    is_new = (merged["_merge"] == "left_only").to_numpy()
+    is_changed = ~is_new & ~np.isclose(
+        merged["value"].astype(float), merged["value_stored"].astype(float)
+    )
+    return actions.loc[is_new], actions.loc[is_changed]
@@ -0,0 +1,3 @@
+from data_pipeline.storage.backends.base import StorageBackend
+
+__all__ = ["StorageBackend"]
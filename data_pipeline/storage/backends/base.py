@@ -0,0 +1,132 @@
+import uuid
+from abc import ABC, abstractmethod
+from collections.abc import Iterator
+
+import pandas as pd
+import pyarrow as pa
+
+from data_pipeline.pipeline.logger import get_logger
+from data_pipeline.storage.schema import (
+    schema_sql,
+    schema_statements,
+    schema_version,
+    table_definitions,
+)
+
+logger = get_logger(__name__)
+
+# Parameters from version_params().
+BUMP_VERSION_SQL = (
+    "INSERT INTO table_versions (table_name, version, updated_at) "
+    "VALUES (%(table)s, %(version)s, now()) "
+    "ON CONFLICT (table_name) DO UPDATE SET version = EXCLUDED.version, "
+    "updated_at = EXCLUDED.updated_at"
+)
+
+
+class StorageBackend(ABC):
+    """Where the pipeline's tables live.
+
+    SQL passed to :meth:`query` and :meth:`iter_query` uses pyformat
+    ``%(name)s`` parameters; list parameters work with ``= ANY(...)``.
+    Backends translate both to their own dialect.
+    """
+
+    name = "base"
+
+    def __init__(self) -> None:
+        self._schema_version: str | None = None
+
+    def initialize_schema(self) -> None:
+        """Apply schema.sql unless the database already records its version.
+
+        The version is a hash of schema.sql, so editing the file is enough
+        to trigger a re-apply. Once current, this is one lookup per process.
+        """
+        sql = schema_sql()
+        version = schema_version(sql)
+        if self._schema_version == version:
+            return
+        if self._schema_is_current(version):
+            logger.info("Schema is current (version %s).", version)
+        else:
+            self._apply_schema(schema_statements(sql), version)
+            logger.info("Schema initialized (version %s).", version)
+        self._schema_version = version
+
+    @abstractmethod
+    def _schema_is_current(self, version: str) -> bool:
+        ...
+
+    @abstractmethod
+    def _apply_schema(self, statements: list[str], version: str) -> None:
+        ...
+
+    @abstractmethod
+    def insert_dataframe(self, df: pd.DataFrame, table: str) -> int:
+        """Upsert ``df`` into ``table`` on the table's primary key.
+
+        Writing rows also records a new write version for ``table`` in
+        ``table_versions``, which invalidates cached results that read it.
+        """
+
+    @abstractmethod
+    def query(self, sql: str, params: dict | None = None) -> pd.DataFrame:
+        ...
+
+    @abstractmethod
+    def iter_query(
+        self,
+        sql: str,
+        params: dict | None,
+        chunk_size: int,
+    ) -> Iterator[pd.DataFrame]:
+        """Stream a result in frames of at most ``chunk_size`` rows."""
+
+    def iter_query_arrow(
+        self,
+        sql: str,
+        params: dict | None,
+        chunk_size: int,
+    ) -> Iterator[pa.RecordBatch]:
+        for df in self.iter_query(sql, params, chunk_size):
+            yield pa.RecordBatch.from_pandas(df, preserve_index=False)
+
+
+def prepare_frame(df: pd.DataFrame, table: str) -> pd.DataFrame:
+    """Deduplicate on the primary key and coerce values every backend accepts.
+
+    Timezone-aware timestamps become naive local wall time (their trading
+    date), and float columns bound for integer columns become nullable Int64.
+    A frame with nothing to drop or coerce is returned as is, without a copy.
+    """
+    definition = table_definitions()[table]
+    duplicated = df.duplicated(subset=definition["primary_key"], keep="last").to_numpy()
+    if duplicated.any():
+        df = df[~duplicated]
+    coerced = {}
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.DatetimeTZDtype):
+            coerced[col] = values.dt.tz_localize(None)
+        elif definition["columns"].get(col) in ("BIGINT", "INTEGER") and values.dtype.kind == "f":
+            coerced[col] = values.round().astype("Int64")
+    return df.assign(**coerced) if coerced else df
+
+
+def version_params(table: str) -> dict:
+    return {"table": table, "version": uuid.uuid4().hex}
+
+
+def quote(identifier: str) -> str:
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def merge_clause(columns: list[str], keys: list[str]) -> str:
+    """``ON CONFLICT`` clause that overwrites every non-key column."""
+    updates = [c for c in columns if c not in keys]
+    conflict_keys = ", ".join(quote(k) for k in keys)
+    if not updates:
+        return f"ON CONFLICT ({conflict_keys}) DO NOTHING"
+    sets = ", ".join(f"{quote(c)} = EXCLUDED.{quote(c)}" for c in updates)
+    return f"ON CONFLICT ({conflict_keys}) DO UPDATE SET {sets}"
@@ -0,0 +1,135 @@
+import re
+import threading
+import uuid
+from collections.abc import Iterator
+from pathlib import Path
+
+import duckdb
+import pandas as pd
+import pyarrow as pa
+
+from data_pipeline.pipeline.logger import get_logger
+from data_pipeline.storage.backends.base import (
+    BUMP_VERSION_SQL,
+    StorageBackend,
+    merge_clause,
+    prepare_frame,
+    quote,
+    version_params,
+)
+from data_pipeline.storage.schema import table_definitions
+
+logger = get_logger(__name__)
+
+_PYFORMAT_PARAM = re.compile(r"%\((\w+)\)s")
+
+
+def _translate(sql: str) -> str:
+    """Rewrite pyformat ``%(name)s`` parameters as DuckDB ``$name``."""
+    return _PYFORMAT_PARAM.sub(r"$\1", sql)
+
+
+class DuckDBBackend(StorageBackend):
+    """Embedded DuckDB file; reads and writes run in process.
+
+    Each call works on its own cursor, closed once the call is done, so tasks
+    on different threads can read concurrently. Writes are serialised, since concurrent upserts into the
+    same table would conflict.
+    """
+
+    name = "duckdb"
+
+    def __init__(self, path: str | Path):
+        super().__init__()
+        self.path = Path(path)
+        self._conn: duckdb.DuckDBPyConnection | None = None
+        self._connect_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        with self._connect_lock:
+            if self._conn is None:
+                self.path.parent.mkdir(parents=True, exist_ok=True)
+                self._conn = duckdb.connect(str(self.path))
+        return self._conn.cursor()
+
+    def close(self) -> None:
+        with self._connect_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def _schema_is_current(self, version: str) -> bool:
+        with self._cursor() as cur:
+            exists = cur.execute(
+                "SELECT COUNT(*) FROM information_schema.tables WHERE table_name = 'schema_version'"
+            ).fetchone()[0]
+            if not exists:
+                return False
+            return cur.execute(
+                "SELECT 1 FROM schema_version WHERE version = ?", [version]
+            ).fetchone() is not None
+
+    def _apply_schema(self, statements: list[str], version: str) -> None:
+        with self._write_lock, self._cursor() as cur:
+            for statement in statements:
+                cur.execute(statement)
+            cur.execute(
+                "INSERT INTO schema_version (version, applied_at) VALUES (?, now()) "
+                "ON CONFLICT (version) DO NOTHING",
+                [version],
+            )
+
+    def insert_dataframe(self, df: pd.DataFrame, table: str) -> int:
+        """Upsert through a registered view of ``df``; DuckDB scans it via Arrow without copying."""
+        if df.empty:
+            return 0
+        definition = table_definitions()[table]
+        columns = list(df.columns)
+        df = prepare_frame(df, table)
+
+        view = f"_stage_{table}_{uuid.uuid4().hex[:8]}"
+        select = ", ".join(
+            f"CAST({quote(c)} AS {definition['columns'][c]}) AS {quote(c)}" for c in columns
+        )
+        sql = (
+            f"INSERT INTO {quote(table)} ({', '.join(quote(c) for c in columns)}) "
+            f"SELECT {select} FROM {quote(view)} "
+            + merge_clause(columns, definition["primary_key"])
+        )
+        with self._write_lock, self._cursor() as cur:
+            cur.register(view, df)
+            try:
+                cur.execute(sql)
+                cur.execute(_translate(BUMP_VERSION_SQL), version_params(table))
+            finally:
+                cur.unregister(view)
+        logger.info("Upserted %d rows into %s.", len(df), table)
+        return len(df)
+
+    def query(self, sql: str, params: dict | None = None) -> pd.DataFrame:
+        with self._cursor() as cur:
+            return cur.execute(_translate(sql), params or {}).df()
+
+    def iter_query_arrow(
+        self,
+        sql: str,
+        params: dict | None,
+        chunk_size: int,
+    ) -> Iterator[pa.RecordBatch]:
+        with self._cursor() as cur:
+            result = cur.execute(_translate(sql), params or {})
+            # to_arrow_reader replaces fetch_record_batch in newer DuckDB releases.
+            if hasattr(result, "to_arrow_reader"):
+                yield from result.to_arrow_reader(chunk_size)
+            else:
+                yield from result.fetch_record_batch(chunk_size)
+
+    def iter_query(
+        self,
+        sql: str,
+        params: dict | None,
+        chunk_size: int,
+    ) -> Iterator[pd.DataFrame]:
+        for batch in self.iter_query_arrow(sql, params, chunk_size):
+            yield batch.to_pandas()
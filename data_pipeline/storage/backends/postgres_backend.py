@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import io
+import uuid
+from collections.abc import Iterator
+from datetime import datetime
+from typing import TYPE_CHECKING
+
+import pandas as pd
+
+from data_pipeline.pipeline.logger import get_logger
+from data_pipeline.storage.backends.base import (
+    BUMP_VERSION_SQL,
+    StorageBackend,
+    merge_clause,
+    prepare_frame,
+    quote,
+    version_params,
+)
+from data_pipeline.storage.pool import get_pool
+from data_pipeline.storage.schema import table_definitions
+
+if TYPE_CHECKING:
+    from supabase import Client
+
+logger = get_logger(__name__)
+
+
+class PostgresBackend(StorageBackend):
+    """Remote Postgres (Supabase) reached through a pooled psycopg2 connection.
+
+    ``insert_method="copy"`` bulk-loads through COPY and an ON CONFLICT
+    merge; ``"rest"`` upserts through the Supabase REST API instead.
+    """
+
+    name = "postgres"
+
+    def __init__(
+        self,
+        dsn: str,
+        insert_method: str = "copy",
+        copy_chunk_size: int = 50_000,
+        supabase_url: str | None = None,
+        supabase_key: str | None = None,
+    ):
+        super().__init__()
+        self.dsn = dsn
+        self.insert_method = insert_method
+        self.copy_chunk_size = copy_chunk_size
+        self._supabase_url = supabase_url
+        self._supabase_key = supabase_key
+        self._client: Client | None = None
+
+    def connection(self):
+        return get_pool(self.dsn).connection()
+
+    def _schema_is_current(self, version: str) -> bool:
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT to_regclass('schema_version') IS NOT NULL")
+            if not cur.fetchone()[0]:
+                return False
+            cur.execute("SELECT 1 FROM schema_version WHERE version = %s", (version,))
+            return cur.fetchone() is not None
+
+    def _apply_schema(self, statements: list[str], version: str) -> None:
+        with self.connection() as conn, conn.cursor() as cur:
+            for statement in statements:
+                cur.execute(statement)
+            cur.execute(
+                "INSERT INTO schema_version (version, applied_at) VALUES (%s, now()) "
+                "ON CONFLICT (version) DO NOTHING",
+                (version,),
+            )
+
+    def insert_dataframe(self, df: pd.DataFrame, table: str) -> int:
+        if self.insert_method == "copy":
+            return self.copy_dataframe(df, table)
+        return self._upsert_rest(df, table)
+
+    def copy_dataframe(self, df: pd.DataFrame, table: str, chunk_size: int | None = None) -> int:
+        """Bulk upsert via COPY into a session temp table and an ON CONFLICT merge.
+
+        The merge is keyed on the table's primary key from schema.sql. Each
+        chunk is committed on its own, so a failure part way through leaves
+        the earlier chunks loaded and a rerun simply upserts them again.
+        """
+        if df.empty:
+            return 0
+        chunk_size = chunk_size or self.copy_chunk_size
+        keys = table_definitions()[table]["primary_key"]
+        columns = list(df.columns)
+        df = prepare_frame(df, table)
+
+        stage = quote(f"_stage_{table}")
+        cols = ", ".join(quote(c) for c in columns)
+        create_stage = (
+            f"CREATE TEMP TABLE IF NOT EXISTS {stage} (LIKE {quote(table)}) ON COMMIT DELETE ROWS"
+        )
+        copy = f"COPY {stage} ({cols}) FROM STDIN WITH (FORMAT csv)"
+        merge = (
+            f"INSERT INTO {quote(table)} ({cols}) SELECT {cols} FROM {stage} "
+            + merge_clause(columns, keys)
+        )
+
+        with self.connection() as conn, conn.cursor() as cur:
+            cur.execute(create_stage)
+            for start in range(0, len(df), chunk_size):
+                buf = io.StringIO()
+                df.iloc[start:start + chunk_size].to_csv(
+                    buf, index=False, header=False, date_format="%Y-%m-%d %H:%M:%S"
+                )
+                buf.seek(0)
+                cur.copy_expert(copy, buf)
+                cur.execute(merge)
+                conn.commit()
+            cur.execute(BUMP_VERSION_SQL, version_params(table))
+        logger.info("Copied %d rows into %s.", len(df), table)
+        return len(df)
+
+    def _get_client(self) -> Client:
+        if self._client is None:
+            # supabase pulls in a large HTTP stack; only the REST path needs it.
+            from supabase import create_client
+
+            self._client = create_client(self._supabase_url, self._supabase_key)
+        return self._client
+
+    def _upsert_rest(self, df: pd.DataFrame, table: str) -> int:
+        df = df.where(pd.notnull(df), None)
+        rows = []
+        for record in df.to_dict(orient="records"):
+            row = {}
+            for k, v in record.items():
+                if hasattr(v, "isoformat"):
+                    row[k] = v.isoformat()
+                else:
+                    row[k] = v
+            rows.append(row)
+        client = self._get_client()
+        client.table(table).upsert(rows).execute()
+        client.table("table_versions").upsert({
+            "table_name": table,
+            "version": version_params(table)["version"],
+            "updated_at": datetime.utcnow().isoformat(),
+        }).execute()
+        logger.info("Upserted %d rows into %s.", len(rows), table)
+        return len(rows)
+
+    def query(self, sql: str, params: dict | None = None) -> pd.DataFrame:
+        with self.connection() as conn:
+            return pd.read_sql(sql, conn, params=params)
+
+    def iter_query(
+        self,
+        sql: str,
+        params: dict | None,
+        chunk_size: int,
+    ) -> Iterator[pd.DataFrame]:
+        # A named cursor keeps the result set on the server; only chunk_size
+        # rows are held in memory at a time. The pooled connection stays
+        # checked out until the iterator is exhausted or closed.
+        with self.connection() as conn:
+            with conn.cursor(name=f"read_{uuid.uuid4().hex[:8]}") as cur:
+                cur.itersize = chunk_size
+                cur.execute(sql, params)
+                columns = None
+                while True:
+                    rows = cur.fetchmany(chunk_size)
+                    if columns is None:
+                        columns = [d[0] for d in cur.description]
+                    if not rows:
+                        break
+                    yield pd.DataFrame.from_records(rows, columns=columns)
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+import pandas as pd
+
+from data_pipeline.ingestion.windows import BackfillWindow
+from data_pipeline.storage.database import insert_dataframe, query
+
+
+def _iso(series: pd.Series) -> list[str]:
+    return pd.to_datetime(series).dt.strftime("%Y-%m-%d").tolist()
+
+
+def completed_windows() -> set[BackfillWindow]:
+    df = query("SELECT market, window_start, window_end FROM backfill_state")
+    return set(zip(df["market"], _iso(df["window_start"]), _iso(df["window_end"])))
+
+
+def mark_window_complete(window: BackfillWindow, price_rows: int, macro_rows: int) -> int:
+    market, start, end = window
+    df = pd.DataFrame([{
+        "market": market,
+        "window_start": start,
+        "window_end": end,
+        "price_rows": price_rows,
+        "macro_rows": macro_rows,
+        "completed_at": datetime.utcnow(),
+    }])
+    return insert_dataframe(df, "backfill_state")
@@ -1,66 +1,124 @@
-from contextlib import contextmanager
+import threading
+from collections.abc import Iterator
 from pathlib import Path
+
 import pandas as pd
-import psycopg2
-import psycopg2.extras
-from supabase import create_client, Client
+import pyarrow as pa
 
-from data_pipeline.config.settings import SUPABASE_URL, SUPABASE_KEY, DATABASE_URL
+from data_pipeline.config import settings
+from data_pipeline.config.settings import (
+    COPY_CHUNK_SIZE,
+    DB_PATH,
+    INSERT_METHOD,
+    QUERY_CACHE_DIR,
+    QUERY_CACHE_DISK_MB,
+    QUERY_CACHE_MB,
+    READ_CHUNK_SIZE,
+    STORAGE_BACKEND,
+)
+from data_pipeline.pipeline import metrics
 from data_pipeline.pipeline.logger import get_logger
+from data_pipeline.storage import query_cache
+from data_pipeline.storage.backends import StorageBackend
 
 logger = get_logger(__name__)
 
-_SCHEMA_PATH = Path(__file__).with_name("schema.sql")
+_backends: dict[tuple, StorageBackend] = {}
+_backends_lock = threading.Lock()
+
 
-_client: Client | None = None
+def _backend_key() -> tuple:
+    if STORAGE_BACKEND == "duckdb":
+        return ("duckdb", str(DB_PATH))
+    if STORAGE_BACKEND == "postgres":
+        return ("postgres", settings.DATABASE_URL, INSERT_METHOD)
+    raise ValueError(f"Unknown STORAGE_BACKEND: {STORAGE_BACKEND}")
 
 
-def _get_client() -> Client:
-    global _client
-    if _client is None:
-        _client = create_client(SUPABASE_URL, SUPABASE_KEY)
-    return _client
+def get_backend() -> StorageBackend:
+    """The configured storage backend, created once per location.
 
+    STORAGE_BACKEND selects ``"duckdb"`` (the local DB_PATH file) or
+    ``"postgres"`` (DATABASE_URL). STORAGE_BACKEND, DB_PATH and INSERT_METHOD
+    are this module's copies of the settings, taken at import; patch them
+    here to switch backends at runtime. Credentials are resolved on first use.
+    """
+    key = _backend_key()
+    with _backends_lock:
+        if key not in _backends:
+            if key[0] == "duckdb":
+                from data_pipeline.storage.backends.duckdb_backend import DuckDBBackend
+
+                _backends[key] = DuckDBBackend(DB_PATH)
+            else:
+                from data_pipeline.storage.backends.postgres_backend import PostgresBackend
 
-@contextmanager
-def _get_pg_connection():
-    conn = psycopg2.connect(DATABASE_URL)
-    try:
-        yield conn
-        conn.commit()
-    except Exception:
-        conn.rollback()
-        raise
-    finally:
-        conn.close()
+                _backends[key] = PostgresBackend(
+                    settings.DATABASE_URL,
+                    insert_method=INSERT_METHOD,
+                    copy_chunk_size=COPY_CHUNK_SIZE,
+                    supabase_url=settings.SUPABASE_URL if INSERT_METHOD == "rest" else None,
+                    supabase_key=settings.SUPABASE_KEY if INSERT_METHOD == "rest" else None,
+                )
+            logger.info("Using %s storage backend.", key[0])
+        return _backends[key]
 
 
 def initialize_schema() -> None:
-    sql = _SCHEMA_PATH.read_text()
-    statements = [s.strip() for s in sql.split(";") if s.strip()]
-    with _get_pg_connection() as conn:
-        with conn.cursor() as cur:
-            for statement in statements:
-                cur.execute(statement)
-    logger.info("Schema initialized.")
+    get_backend().initialize_schema()
 
 
 def insert_dataframe(df: pd.DataFrame, table: str) -> int:
-    df = df.where(pd.notnull(df), None)
-    rows = []
-    for record in df.to_dict(orient="records"):
-        row = {}
-        for k, v in record.items():
-            if hasattr(v, "isoformat"):
-                row[k] = v.isoformat()
-            else:
-                row[k] = v
-        rows.append(row)
-    _get_client().table(table).upsert(rows).execute()
-    logger.info("Upserted %d rows into %s.", len(rows), table)
-    return len(rows)
+    with metrics.timed("insert", table):
+        written = get_backend().insert_dataframe(df, table)
+    metrics.record("insert", table, rows_in=len(df), rows_out=written)
+    return written
+
+
+def _write_versions(backend: StorageBackend, tables: set[str]) -> dict[str, str]:
+    df = backend.query(
+        "SELECT table_name, version FROM table_versions WHERE table_name = ANY(%(tables)s)",
+        {"tables": sorted(tables)},
+    )
+    return dict(zip(df["table_name"], df["version"]))
+
+
+def query(sql: str, params: dict | None = None, cache: bool = False) -> pd.DataFrame:
+    """Run ``sql``; with ``cache``, reuse the cached result while the tables it
+    reads are unchanged.
+
+    Caching costs a read of ``table_versions`` per call, so it suits repeated
+    ad-hoc and dashboard reads, not the pipeline's own state reads, whose
+    tables are rewritten within the run. The returned frame is the caller's
+    to modify.
+    """
+    backend = get_backend()
+    tables = query_cache.tables_in(sql)
+    if not cache or QUERY_CACHE_MB <= 0 or not query_cache.cacheable(tables):
+        return backend.query(sql, params)
+
+    max_bytes = QUERY_CACHE_MB * 2**20
+    directory = Path(QUERY_CACHE_DIR) if QUERY_CACHE_DIR else None
+    versions = _write_versions(backend, tables)
+    key = query_cache.cache_key(_backend_key(), sql, params, versions)
+    df = query_cache.get(key, max_bytes, directory)
+    if df is None:
+        df = backend.query(sql, params)
+        query_cache.put(key, df, max_bytes, directory, QUERY_CACHE_DISK_MB * 2**20)
+    return df
+
+
+def iter_query(
+    sql: str,
+    params: dict | None = None,
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> Iterator[pd.DataFrame]:
+    return get_backend().iter_query(sql, params, chunk_size)
 
 
-def query(sql: str) -> pd.DataFrame:
-    with _get_pg_connection() as conn:
-        return pd.read_sql(sql, conn)
+def iter_query_arrow(
+    sql: str,
+    params: dict | None = None,
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> Iterator[pa.RecordBatch]:
+    return get_backend().iter_query_arrow(sql, params, chunk_size)
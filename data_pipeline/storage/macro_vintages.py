@@ -0,0 +1,81 @@
+from datetime import datetime
+
+import pandas as pd
+
+from data_pipeline.ingestion.frames import normalize_dates
+from data_pipeline.storage.database import insert_dataframe, query
+from data_pipeline.storage.readers import DateLike
+
+MACRO_KEYS = ["date", "market", "indicator"]
+
+
+def diff_macro(macro: pd.DataFrame) -> pd.DataFrame:
+    """Rows of ``macro`` not in ``macro_indicators`` yet or stored with another value.
+
+    Values are compared exactly, so any revision counts, however small.
+    Stored rows are read only for the fetched series and date range.
+    """
+    if macro.empty:
+        return macro
+    macro = macro.assign(date=normalize_dates(macro["date"]))
+    macro = macro.drop_duplicates(MACRO_KEYS, keep="last")
+    stored = query(
+        "SELECT date, market, indicator, value FROM macro_indicators "
+        "WHERE market = ANY(%(markets)s) AND indicator = ANY(%(indicators)s) "
+        "AND date >= %(start)s AND date <= %(end)s",
+        {
+            "markets": sorted(macro["market"].unique()),
+            "indicators": sorted(macro["indicator"].unique()),
+            "start": macro["date"].min().date(),
+            "end": macro["date"].max().date(),
+        },
+    )
+    stored["date"] = normalize_dates(stored["date"])
+    merged = macro.merge(stored, on=MACRO_KEYS, how="left", suffixes=("", "_stored"))
+    changed = (merged["value"] != merged["value_stored"]).to_numpy()
+    return macro.loc[changed]
+
+
+def save_vintages(changed: pd.DataFrame, fetched_at: datetime) -> int:
+    """Record ``changed`` observations as the vintage fetched at ``fetched_at``."""
+    if changed.empty:
+        return 0
+    columns = [*MACRO_KEYS, "source", "value"]
+    return insert_dataframe(changed[columns].assign(fetched_at=fetched_at), "macro_vintages")
+
+
+def macro_as_of(
+    vintage: DateLike | datetime,
+    markets: list[str] | None = None,
+    indicators: list[str] | None = None,
+    start: DateLike | None = None,
+    end: DateLike | None = None,
+) -> pd.DataFrame:
+    """Macro observations as they were known at ``vintage``.
+
+    Each ``(date, market, indicator)`` takes its latest value fetched at or
+    before ``vintage``; observations first fetched later are left out.
+    """
+    clauses = ["fetched_at <= %(vintage)s"]
+    params = {"vintage": pd.Timestamp(vintage).to_pydatetime()}
+    if markets is not None:
+        clauses.append("market = ANY(%(markets)s)")
+        params["markets"] = list(markets)
+    if indicators is not None:
+        clauses.append("indicator = ANY(%(indicators)s)")
+        params["indicators"] = list(indicators)
+    if start is not None:
+        clauses.append("date >= %(start)s")
+        params["start"] = pd.Timestamp(start).date()
+    if end is not None:
+        clauses.append("date <= %(end)s")
+        params["end"] = pd.Timestamp(end).date()
+    df = query(
+        "SELECT DISTINCT ON (date, market, indicator) date, market, indicator, value, fetched_at "
+        f"FROM macro_vintages WHERE {' AND '.join(clauses)} "
+        "ORDER BY date, market, indicator, fetched_at DESC",
+        params,
+        cache=True,
+    )
+    df["date"] = pd.to_datetime(df["date"])
+    return df
@@ -0,0 +1,97 @@
+import atexit
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
+
+from data_pipeline.config.settings import (
+    PG_POOL_HEALTHCHECK_SECONDS,
+    PG_POOL_MAX_SIZE,
+    PG_POOL_MIN_SIZE,
+)
+from data_pipeline.pipeline.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ConnectionPool:
+    """Blocking, health-checked wrapper around psycopg2's ThreadedConnectionPool.
+
+    Checkout blocks once ``max_size`` connections are in use instead of
+    raising. A connection idle for longer than ``healthcheck_seconds`` is
+    pinged before it is handed out and replaced if the ping fails.
+    """
+
+    def __init__(
+        self,
+        dsn: str,
+        min_size: int = PG_POOL_MIN_SIZE,
+        max_size: int = PG_POOL_MAX_SIZE,
+        healthcheck_seconds: float = PG_POOL_HEALTHCHECK_SECONDS,
+    ):
+        self._pool = ThreadedConnectionPool(min_size, max_size, dsn)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._healthcheck_seconds = healthcheck_seconds
+        self._last_used: dict[int, float] = {}
+
+    def _is_healthy(self, conn) -> bool:
+        if conn.closed:
+            return False
+        idle = time.monotonic() - self._last_used.get(id(conn), 0.0)
+        if idle < self._healthcheck_seconds:
+            return True
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _checkout(self):
+        conn = self._pool.getconn()
+        if not self._is_healthy(conn):
+            logger.warning("Discarding unhealthy pooled connection.")
+            self._pool.putconn(conn, close=True)
+            conn = self._pool.getconn()
+        return conn
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            conn = self._checkout()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn, close=bool(conn.closed))
+
+    def close(self) -> None:
+        self._pool.closeall()
+
+
+_pools: dict[str, ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(dsn: str) -> ConnectionPool:
+    """Process-wide pool for ``dsn``, shared by every task in the process."""
+    with _pools_lock:
+        if dsn not in _pools:
+            _pools[dsn] = ConnectionPool(dsn)
+        return _pools[dsn]
+
+
+@atexit.register
+def close_pools() -> None:
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
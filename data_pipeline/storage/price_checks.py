@@ -0,0 +1,49 @@
+import threading
+from datetime import datetime
+
+import pandas as pd
+
+from data_pipeline.cleaning.validate import STATE_COLUMNS, empty_state
+from data_pipeline.storage.database import insert_dataframe, query
+
+# Backfill windows of one market are stored from several threads.
+_state_lock = threading.Lock()
+
+
+def load_price_state(tickers) -> pd.DataFrame:
+    """Validation state of ``tickers`` from ``price_state``, indexed by ticker."""
+    tickers = sorted(map(str, tickers))
+    if not tickers:
+        return empty_state()
+    df = query(
+        f"SELECT ticker, {', '.join(STATE_COLUMNS)} FROM price_state "
+        "WHERE ticker = ANY(%(tickers)s)",
+        {"tickers": tickers},
+    )
+    df["last_date"] = pd.to_datetime(df["last_date"])
+    return df.set_index("ticker")
+
+
+def save_price_state(state: pd.DataFrame) -> int:
+    """Store ``state``, except for tickers whose stored state is already later."""
+    if state.empty:
+        return 0
+    with _state_lock:
+        stored = load_price_state(state.index)["last_date"].reindex(state.index)
+        state = state[~(state["last_date"] < stored)]
+        if state.empty:
+            return 0
+        df = state.reset_index().assign(
+            stale_run=state["stale_run"].astype(int).to_numpy(),
+            observations=state["observations"].astype(int).to_numpy(),
+            updated_at=datetime.utcnow(),
+        )
+        return insert_dataframe(df, "price_state")
+
+
+def save_price_issues(report: pd.DataFrame) -> int:
+    """Store the rule hits of a validation report in ``price_issues``."""
+    if report.empty:
+        return 0
+    df = report.drop_duplicates(["date", "ticker", "rule"], keep="last")
+    return insert_dataframe(df.assign(detected_at=datetime.utcnow()), "price_issues")
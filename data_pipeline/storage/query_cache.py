@@ -0,0 +1,152 @@
+"""Results of ``database.query`` kept for reuse until their tables change.
+
+A result is keyed by the backend, the SQL with whitespace normalised, the
+parameters and the write version of every table the SQL names. Writing a
+table gives it a new version, so results that read it are never found
+again and age out of the cache. Entries live in memory, least recently used
+first out once QUERY_CACHE_MB is exceeded, and with QUERY_CACHE_DIR also as
+Parquet files shared by every process on the machine.
+"""
+import hashlib
+import os
+import re
+import threading
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from data_pipeline.pipeline.logger import get_logger
+from data_pipeline.storage.schema import table_definitions
+
+logger = get_logger(__name__)
+
+# Whitespace runs outside single-quoted literals.
+_WHITESPACE = re.compile(r"('(?:[^']|'')*')|\s+")
+
+# Written without insert_dataframe, so never invalidated.
+_UNVERSIONED = {"table_versions", "schema_version"}
+
+_lock = threading.Lock()
+_entries: OrderedDict[str, tuple[pd.DataFrame, int]] = OrderedDict()
+_size = 0
+
+
+def normalize_sql(sql: str) -> str:
+    sql = _WHITESPACE.sub(lambda m: m.group(1) or " ", sql).strip()
+    return sql.rstrip(";").rstrip()
+
+
+@lru_cache(maxsize=1)
+def _table_pattern() -> re.Pattern:
+    names = sorted(table_definitions(), key=len, reverse=True)
+    return re.compile(r"\b(" + "|".join(map(re.escape, names)) + r")\b")
+
+
+def tables_in(sql: str) -> set[str]:
+    """Tables of schema.sql named in ``sql``; a name used otherwise counts too."""
+    return set(_table_pattern().findall(sql))
+
+
+def cacheable(tables: set[str]) -> bool:
+    """Whether a query reading ``tables`` can be cached.
+
+    Only tables written through ``insert_dataframe`` have write versions.
+    """
+    return bool(tables) and not tables & _UNVERSIONED
+
+
+def cache_key(backend: tuple, sql: str, params: dict | None, versions: dict[str, str]) -> str:
+    parts = (
+        backend, normalize_sql(sql), sorted((params or {}).items()), sorted(versions.items()),
+    )
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def get(key: str, max_bytes: float, directory: Path | None = None) -> pd.DataFrame | None:
+    """A copy of the cached result, or ``None``. Disk hits are moved into memory."""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            _entries.move_to_end(key)
+            return entry[0].copy()
+    if directory is None:
+        return None
+    path = directory / f"{key}.parquet"
+    try:
+        df = pq.read_table(path).to_pandas()
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    _remember(key, df, max_bytes)
+    return df
+
+
+def put(
+    key: str,
+    df: pd.DataFrame,
+    max_bytes: float,
+    directory: Path | None = None,
+    max_disk_bytes: float = 0,
+) -> None:
+    """Cache a copy of ``df`` in memory and, given ``directory``, on disk."""
+    _remember(key, df, max_bytes)
+    if directory is not None:
+        _write_file(directory, key, df, max_disk_bytes)
+
+
+def _remember(key: str, df: pd.DataFrame, max_bytes: float) -> None:
+    # Results over a quarter of the budget stay out of memory, so one large
+    # read cannot flush everything else.
+    global _size
+    size = int(df.memory_usage(index=True, deep=True).sum())
+    if size > max_bytes / 4:
+        return
+    with _lock:
+        if key not in _entries:
+            _entries[key] = (df.copy(), size)
+            _size += size
+        while _size > max_bytes:
+            _, (_, evicted) = _entries.popitem(last=False)
+            _size -= evicted
+
+
+def _write_file(directory: Path, key: str, df: pd.DataFrame, max_disk_bytes: float) -> None:
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / f"{key}.parquet"
+    tmp = directory / f".{key}.{uuid.uuid4().hex}.tmp"
+    try:
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), tmp)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        logger.debug("Query result not cached on disk: %s", e)
+        tmp.unlink(missing_ok=True)
+        return
+    os.replace(tmp, path)
+
+    # Other processes may be evicting the same files.
+    files = []
+    for p in directory.glob("*.parquet"):
+        try:
+            files.append((p, p.stat()))
+        except FileNotFoundError:
+            pass
+    total = sum(stat.st_size for _, stat in files)
+    for p, stat in sorted(files, key=lambda f: f[1].st_mtime):
+        if total <= max_disk_bytes:
+            break
+        total -= stat.st_size
+        p.unlink(missing_ok=True)
+
+
+def clear(directory: Path | None = None) -> None:
+    global _size
+    with _lock:
+        _entries.clear()
+        _size = 0
+    if directory is not None:
+        for path in directory.glob("*.parquet"):
+            path.unlink(missing_ok=True)
@@ -0,0 +1,174 @@
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from data_pipeline.config.settings import RAW_COMPACT_MIN_FILES, RAW_DATA_PATH
+from data_pipeline.ingestion.frames import normalize_dates
+from data_pipeline.pipeline import metrics
+from data_pipeline.pipeline.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Natural key of each raw source; later ingests of the same key win on read.
+RAW_KEYS: dict[str, list[str]] = {
+    "prices": ["date", "ticker"],
+    "macro": ["date", "market", "indicator"],
+}
+
+_PARTITIONING = ds.partitioning(
+    pa.schema([("market", pa.string()), ("year", pa.int32())]),
+    flavor="hive",
+)
+
+
+def _stamp() -> str:
+    return f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+
+def _root(source: str, base: Path | None = None) -> Path:
+    if source not in RAW_KEYS:
+        raise ValueError(f"Unknown raw source: {source}")
+    return Path(base or RAW_DATA_PATH) / source
+
+
+def write_raw(df: pd.DataFrame, source: str, base: Path | None = None) -> int:
+    """Append ``df`` to the ``source`` dataset, partitioned by market and year.
+
+    Every call writes new files, so reruns never overwrite earlier ingests;
+    each row carries an ``ingested_at`` stamp that readers use to resolve
+    duplicates.
+    """
+    if df.empty:
+        return 0
+    dates = normalize_dates(df["date"])
+    df = df.assign(
+        date=dates,
+        year=dates.dt.year.astype("int32"),
+        ingested_at=pd.Timestamp(datetime.utcnow()),
+    )
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    written: list[str] = []
+    with metrics.timed("write_raw", source):
+        ds.write_dataset(
+            table,
+            _root(source, base),
+            format="parquet",
+            partitioning=_PARTITIONING,
+            basename_template=f"part-{_stamp()}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_visitor=lambda f: written.append(f.path),
+        )
+    metrics.record(
+        "write_raw", source, rows_out=len(df), bytes_written=sum(map(os.path.getsize, written))
+    )
+    logger.info("Appended %d %s rows to the raw lake.", len(df), source)
+    return len(df)
+
+
+def _dataset(source: str, base: Path | None = None) -> ds.Dataset | None:
+    root = _root(source, base)
+    if not root.exists():
+        return None
+    return ds.dataset(root, format="parquet", partitioning=_PARTITIONING)
+
+
+def read_raw(
+    source: str,
+    columns: list[str] | None = None,
+    start: str | None = None,
+    end: str | None = None,
+    tickers: list[str] | None = None,
+    markets: list[str] | None = None,
+    latest_only: bool = True,
+    base: Path | None = None,
+) -> pd.DataFrame:
+    """Read raw data back with column projection and predicate pushdown.
+
+    Date bounds are inclusive and also prune ``year`` partitions; ``markets``
+    prunes ``market`` partitions. With ``latest_only`` each natural key
+    appears once, from its most recent ingest.
+    """
+    dataset = _dataset(source, base)
+    if dataset is None:
+        return pd.DataFrame(columns=columns)
+
+    date_type = dataset.schema.field("date").type
+    predicates = []
+    if start is not None:
+        start_ts = pd.Timestamp(start)
+        predicates += [
+            ds.field("year") >= start_ts.year,
+            ds.field("date") >= pa.scalar(start_ts, date_type),
+        ]
+    if end is not None:
+        end_ts = pd.Timestamp(end)
+        predicates += [
+            ds.field("year") <= end_ts.year,
+            ds.field("date") <= pa.scalar(end_ts, date_type),
+        ]
+    if markets is not None:
+        predicates.append(ds.field("market").isin(markets))
+    if tickers is not None:
+        predicates.append(ds.field("ticker").isin(tickers))
+    expression = None
+    for predicate in predicates:
+        expression = predicate if expression is None else expression & predicate
+
+    read_columns = None
+    if columns is not None:
+        extra = RAW_KEYS[source] + ["ingested_at"] if latest_only else []
+        read_columns = list(dict.fromkeys(columns + extra))
+    df = dataset.to_table(columns=read_columns, filter=expression).to_pandas()
+
+    if latest_only and not df.empty:
+        df = (
+            df.sort_values("ingested_at", kind="stable")
+            .drop_duplicates(RAW_KEYS[source], keep="last")
+            .sort_values(RAW_KEYS[source], ignore_index=True)
+        )
+    if columns is not None:
+        df = df[columns]
+    return df
+
+
+def compact_raw(
+    source: str,
+    min_files: int = RAW_COMPACT_MIN_FILES,
+    base: Path | None = None,
+) -> int:
+    """Merge partitions holding at least ``min_files`` files into one file each.
+
+    Only the latest ingest of each key is kept. The merged file is written
+    before the originals are removed. Returns the number of partitions
+    compacted.
+    """
+    root = _root(source, base)
+    if not root.exists():
+        return 0
+    # market and year live in the directory names, not inside the files.
+    keys = [k for k in RAW_KEYS[source] if k != "market"]
+    compacted = 0
+    for partition in sorted(p for p in root.glob("market=*/year=*") if p.is_dir()):
+        files = sorted(partition.glob("*.parquet"))
+        if len(files) < min_files:
+            continue
+        df = ds.dataset(files, format="parquet").to_table().to_pandas()
+        df = (
+            df.sort_values("ingested_at", kind="stable")
+            .drop_duplicates(keys, keep="last")
+            .sort_values(keys, ignore_index=True)
+        )
+        target = partition / f"part-{_stamp()}-compacted.parquet"
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), target)
+        for f in files:
+            f.unlink()
+        compacted += 1
+    if compacted:
+        logger.info("Compacted %d %s partitions.", compacted, source)
+    return compacted
@@ -0,0 +1,150 @@
+from collections.abc import Iterator
+from datetime import date
+
+import pandas as pd
+import pyarrow as pa
+
+from data_pipeline.config.settings import READ_CHUNK_SIZE
+from data_pipeline.storage.backends.base import quote
+from data_pipeline.storage.database import iter_query, iter_query_arrow
+from data_pipeline.storage.schema import table_definitions
+
+DateLike = str | date | pd.Timestamp
+
+
+def _select(
+    table: str,
+    columns: list[str] | None,
+    filters: dict[str, list[str] | None],
+    start: DateLike | None,
+    end: DateLike | None,
+) -> tuple[str, dict, list[str]]:
+    """Parameterised SELECT over ``table``, ordered by its primary key.
+
+    Columns are checked against schema.sql and quoted as identifiers; all
+    values are bound parameters. Ordering by the primary key, which leads
+    with ``date``, lets the database answer date-ranged reads from the index.
+    """
+    definition = table_definitions()[table]
+    columns = columns or list(definition["columns"])
+    unknown = set(columns) - set(definition["columns"])
+    if unknown:
+        raise ValueError(f"Unknown columns for {table}: {sorted(unknown)}")
+
+    clauses, params = [], {}
+    if start is not None:
+        clauses.append('"date" >= %(start)s')
+        params["start"] = pd.Timestamp(start).date()
+    if end is not None:
+        clauses.append('"date" <= %(end)s')
+        params["end"] = pd.Timestamp(end).date()
+    for column, values in filters.items():
+        if values is not None:
+            clauses.append(f"{quote(column)} = ANY(%({column})s)")
+            params[column] = list(values)
+
+    sql = f"SELECT {', '.join(quote(c) for c in columns)} FROM {quote(table)}"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY " + ", ".join(quote(c) for c in definition["primary_key"])
+    return sql, params, columns
+
+
+def _iter_frames(sql: str, params: dict, chunk_size: int) -> Iterator[pd.DataFrame]:
+    for df in iter_query(sql, params, chunk_size):
+        if "date" in df.columns:
+            df["date"] = pd.to_datetime(df["date"])
+        yield df
+
+
+def iter_prices(
+    markets: list[str] | None = None,
+    tickers: list[str] | None = None,
+    start: DateLike | None = None,
+    end: DateLike | None = None,
+    columns: list[str] | None = None,
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """Stream ``raw_prices`` in chunks of at most ``chunk_size`` rows."""
+    sql, params, _ = _select(
+        "raw_prices", columns, {"market": markets, "ticker": tickers}, start, end
+    )
+    yield from _iter_frames(sql, params, chunk_size)
+
+
+def iter_macro(
+    markets: list[str] | None = None,
+    indicators: list[str] | None = None,
+    start: DateLike | None = None,
+    end: DateLike | None = None,
+    columns: list[str] | None = None,
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """Stream ``macro_indicators`` in chunks of at most ``chunk_size`` rows."""
+    sql, params, _ = _select(
+        "macro_indicators", columns, {"market": markets, "indicator": indicators}, start, end
+    )
+    yield from _iter_frames(sql, params, chunk_size)
+
+
+def load_prices(
+    markets: list[str] | None = None,
+    tickers: list[str] | None = None,
+    start: DateLike | None = None,
+    end: DateLike | None = None,
+    columns: list[str] | None = None,
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> pd.DataFrame:
+    """Like :func:`iter_prices`, concatenated into one frame."""
+    frames = iter_prices(markets, tickers, start, end, columns, chunk_size)
+    return _concat(frames, columns or list(table_definitions()["raw_prices"]["columns"]))
+
+
+def load_macro(
+    markets: list[str] | None = None,
+    indicators: list[str] | None = None,
+    start: DateLike | None = None,
+    end: DateLike | None = None,
+    columns: list[str] | None = None,
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> pd.DataFrame:
+    """Like :func:`iter_macro`, concatenated into one frame."""
+    frames = iter_macro(markets, indicators, start, end, columns, chunk_size)
+    return _concat(frames, columns or list(table_definitions()["macro_indicators"]["columns"]))
+
+
+def iter_prices_arrow(
+    markets: list[str] | None = None,
+    tickers: list[str] | None = None,
+    start: DateLike | None = None,
+    end: DateLike | None = None,
+    columns: list[str] | None = None,
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> Iterator[pa.RecordBatch]:
+    """Like :func:`iter_prices`, yielding Arrow record batches."""
+    sql, params, _ = _select(
+        "raw_prices", columns, {"market": markets, "ticker": tickers}, start, end
+    )
+    return iter_query_arrow(sql, params, chunk_size)
+
+
+def iter_macro_arrow(
+    markets: list[str] | None = None,
+    indicators: list[str] | None = None,
+    start: DateLike | None = None,
+    end: DateLike | None = None,
+    columns: list[str] | None = None,
+    chunk_size: int = READ_CHUNK_SIZE,
+) -> Iterator[pa.RecordBatch]:
+    """Like :func:`iter_macro`, yielding Arrow record batches."""
+    sql, params, _ = _select(
+        "macro_indicators", columns, {"market": markets, "indicator": indicators}, start, end
+    )
+    return iter_query_arrow(sql, params, chunk_size)
+
+
+def _concat(frames: Iterator[pd.DataFrame], columns: list[str]) -> pd.DataFrame:
+    frames = list(frames)
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
@@ -0,0 +1,42 @@
+import hashlib
+import re
+from functools import lru_cache
+from pathlib import Path
+
+SCHEMA_PATH = Path(__file__).with_name("schema.sql")
+
+
+def schema_sql() -> str:
+    return SCHEMA_PATH.read_text()
+
+
+def schema_version(sql: str) -> str:
+    return hashlib.sha256(sql.encode()).hexdigest()[:16]
+
+
+def schema_statements(sql: str) -> list[str]:
+    return [s.strip() for s in sql.split(";") if s.strip()]
+
+
+@lru_cache(maxsize=1)
+def table_definitions() -> dict[str, dict]:
+    """Column types and primary key of every table in schema.sql."""
+    tables = {}
+    pattern = re.compile(r"CREATE TABLE IF NOT EXISTS (\w+)\s*\((.*?)\);", re.S | re.I)
+    for name, body in pattern.findall(schema_sql()):
+        columns: dict[str, str] = {}
+        primary_key: list[str] = []
+        for line in body.splitlines():
+            line = line.strip().rstrip(",")
+            if not line:
+                continue
+            table_pk = re.match(r"PRIMARY KEY\s*\((.*)\)", line, re.I)
+            if table_pk:
+                primary_key = [c.strip() for c in table_pk.group(1).split(",")]
+                continue
+            column, col_type = line.split()[:2]
+            columns[column] = col_type.upper()
+            if "PRIMARY KEY" in line.upper():
+                primary_key = [column]
+        tables[name] = {"columns": columns, "primary_key": primary_key}
+    return tables
@@ -10,6 +10,34 @@ CREATE TABLE IF NOT EXISTS raw_prices (
     PRIMARY KEY (date, ticker)
 );
 
+CREATE TABLE IF NOT EXISTS price_checked (
+    ticker          VARCHAR NOT NULL PRIMARY KEY,
+    checked_through DATE NOT NULL,
+    updated_at      TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS price_state (
+    ticker         VARCHAR NOT NULL PRIMARY KEY,
+    last_date      DATE NOT NULL,
+    last_close     DOUBLE PRECISION NOT NULL,
+    stale_run      INTEGER NOT NULL,
+    volume_mean    DOUBLE PRECISION,
+    volume_sq_mean DOUBLE PRECISION,
+    observations   INTEGER NOT NULL,
+    updated_at     TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS price_issues (
+    date        DATE NOT NULL,
+    ticker      VARCHAR NOT NULL,
+    market      VARCHAR NOT NULL,
+    rule        VARCHAR NOT NULL,
+    severity    VARCHAR NOT NULL,
+    value       DOUBLE PRECISION,
+    detected_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (date, ticker, rule)
+);
+
 CREATE TABLE IF NOT EXISTS adjusted_prices (
     date        DATE NOT NULL,
     ticker      VARCHAR NOT NULL,
@@ -31,6 +59,12 @@ CREATE TABLE IF NOT EXISTS corporate_actions (
     PRIMARY KEY (date, ticker, action_type)
 );
 
+CREATE TABLE IF NOT EXISTS corporate_action_state (
+    ticker       VARCHAR NOT NULL PRIMARY KEY,
+    content_hash VARCHAR NOT NULL,
+    updated_at   TIMESTAMP NOT NULL
+);
+
 CREATE TABLE IF NOT EXISTS macro_indicators (
     date        DATE NOT NULL,
     market      VARCHAR NOT NULL,
@@ -40,6 +74,45 @@ CREATE TABLE IF NOT EXISTS macro_indicators (
     PRIMARY KEY (date, market, indicator)
 );
 
+CREATE TABLE IF NOT EXISTS macro_vintages (
+    date        DATE NOT NULL,
+    market      VARCHAR NOT NULL,
+    indicator   VARCHAR NOT NULL,
+    source      VARCHAR NOT NULL,
+    value       DOUBLE PRECISION NOT NULL,
+    fetched_at  TIMESTAMP NOT NULL,
+    PRIMARY KEY (date, market, indicator, fetched_at)
+);
+
+CREATE TABLE IF NOT EXISTS macro_panel (
+    date           DATE NOT NULL,
+    market         VARCHAR NOT NULL,
+    fx_vs_usd      DOUBLE PRECISION,
+    policy_rate    DOUBLE PRECISION,
+    inflation_cpi  DOUBLE PRECISION,
+    bond_yield_10y DOUBLE PRECISION,
+    equity_index   DOUBLE PRECISION,
+    PRIMARY KEY (date, market)
+);
+
+CREATE TABLE IF NOT EXISTS features (
+    date        DATE NOT NULL,
+    ticker      VARCHAR NOT NULL,
+    market      VARCHAR NOT NULL,
+    log_return  DOUBLE PRECISION,
+    mean_return DOUBLE PRECISION,
+    volatility  DOUBLE PRECISION,
+    PRIMARY KEY (date, ticker)
+);
+
+CREATE TABLE IF NOT EXISTS market_correlations (
+    date        DATE NOT NULL,
+    market_a    VARCHAR NOT NULL,
+    market_b    VARCHAR NOT NULL,
+    correlation DOUBLE PRECISION,
+    PRIMARY KEY (date, market_a, market_b)
+);
+
 CREATE TABLE IF NOT EXISTS pipeline_log (
     run_id        VARCHAR NOT NULL PRIMARY KEY,
     run_date      TIMESTAMP NOT NULL,
@@ -47,3 +120,50 @@ CREATE TABLE IF NOT EXISTS pipeline_log (
     rows_inserted INTEGER,
     error_message VARCHAR
 );
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name  VARCHAR NOT NULL PRIMARY KEY,
+    version     VARCHAR NOT NULL,
+    updated_at  TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS schema_version (
+    version     VARCHAR NOT NULL PRIMARY KEY,
+    applied_at  TIMESTAMP NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS backfill_state (
+    market       VARCHAR NOT NULL,
+    window_start DATE NOT NULL,
+    window_end   DATE NOT NULL,
+    price_rows   INTEGER,
+    macro_rows   INTEGER,
+    completed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (market, window_start, window_end)
+);
+
+CREATE TABLE IF NOT EXISTS stage_metrics (
+    run_id        VARCHAR NOT NULL,
+    stage         VARCHAR NOT NULL,
+    source        VARCHAR NOT NULL,
+    seconds       DOUBLE PRECISION,
+    rows_in       BIGINT,
+    rows_out      BIGINT,
+    rows_dropped  BIGINT,
+    bytes_written BIGINT,
+    api_calls     INTEGER,
+    retries       INTEGER,
+    recorded_at   TIMESTAMP NOT NULL,
+    PRIMARY KEY (run_id, stage, source)
+);
+
+-- Macro points stored before vintages were recorded have none. Seed them
+-- with their stored value, as known from the first logged run.
+INSERT INTO macro_vintages (date, market, indicator, source, value, fetched_at)
+SELECT m.date, m.market, m.indicator, m.source, m.value,
+       COALESCE((SELECT MIN(run_date) FROM pipeline_log), TIMESTAMP '1970-01-01')
+FROM macro_indicators m
+WHERE NOT EXISTS (
+    SELECT 1 FROM macro_vintages v
+    WHERE v.date = m.date AND v.market = m.market AND v.indicator = m.indicator
+);
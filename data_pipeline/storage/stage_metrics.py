@@ -0,0 +1,20 @@
+from datetime import datetime
+
+import pandas as pd
+
+from data_pipeline.storage.database import insert_dataframe, query
+
+
+def save_stage_metrics(run_id: str, metrics: pd.DataFrame) -> int:
+    if metrics.empty:
+        return 0
+    df = metrics.assign(run_id=run_id, recorded_at=datetime.utcnow())
+    return insert_dataframe(df, "stage_metrics")
+
+
+def load_stage_metrics(run_id: str) -> pd.DataFrame:
+    return query(
+        "SELECT * FROM stage_metrics WHERE run_id = %(run_id)s ORDER BY stage, source",
+        {"run_id": run_id},
+        cache=True,
+    )
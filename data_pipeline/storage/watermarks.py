@@ -0,0 +1,52 @@
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+from data_pipeline.config.settings import START_DATE
+from data_pipeline.storage.database import insert_dataframe, query
+
+
+def _to_dates(series: pd.Series) -> list[date]:
+    return pd.to_datetime(series).dt.date.tolist()
+
+
+def price_watermarks() -> dict[str, date]:
+    """Last date per ticker known to be covered: its last stored trading
+    date in ``raw_prices``, or a later date recorded in ``price_checked``."""
+    df = query(
+        "SELECT ticker, MAX(last_date) AS last_date FROM ("
+        "SELECT ticker, MAX(date) AS last_date FROM raw_prices GROUP BY ticker "
+        "UNION ALL SELECT ticker, checked_through AS last_date FROM price_checked"
+        ") AS marks GROUP BY ticker"
+    )
+    return dict(zip(df["ticker"], _to_dates(df["last_date"])))
+
+
+def mark_prices_checked(windows: dict[str, tuple[str, str]]) -> int:
+    """Record that each ticker's ``(start, end)`` fetch window, end
+    exclusive, returned no prices.
+
+    A window only counts when it joins on to the ticker's watermark and
+    ends after it, so a ticker with nothing new is not refetched from the
+    same date on every run.
+    """
+    marks = price_watermarks()
+    rows = []
+    for ticker, (start, end) in windows.items():
+        covered = marks.get(ticker, date.fromisoformat(START_DATE) - timedelta(days=1))
+        through = date.fromisoformat(end) - timedelta(days=1)
+        if date.fromisoformat(start) <= covered + timedelta(days=1) and through > covered:
+            rows.append({"ticker": ticker, "checked_through": through})
+    if not rows:
+        return 0
+    df = pd.DataFrame(rows).assign(updated_at=datetime.utcnow())
+    return insert_dataframe(df, "price_checked")
+
+
+def macro_watermarks() -> dict[tuple[str, str], date]:
+    """Last stored observation date per ``(market, indicator)`` in ``macro_indicators``."""
+    df = query(
+        "SELECT market, indicator, MAX(date) AS last_date "
+        "FROM macro_indicators GROUP BY market, indicator"
+    )
+    return dict(zip(zip(df["market"], df["indicator"]), _to_dates(df["last_date"])))
@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+
+from data_pipeline.ingestion.frames import normalize_dates, to_days
+from data_pipeline.pipeline.logger import get_logger
+from data_pipeline.storage.database import insert_dataframe, iter_query, query
+
+logger = get_logger(__name__)
+
+ADJUSTED_COLS = [
+    "date", "ticker", "market", "open", "high", "low", "close", "volume", "adj_factor",
+]
+
+
+def adjustment_factors(prices: pd.DataFrame, actions: pd.DataFrame) -> np.ndarray:
+    """Backward-adjustment factor for every row of ``prices``.
+
+    ``prices`` must be sorted by ticker then date. Each action scales every
+    row dated before its ex-date: a split of ratio ``r`` by ``1 / r`` and a
+    dividend ``d`` by ``1 - d / close``, where ``close`` is the split-adjusted
+    close of the session before the ex-date (yfinance reports dividends
+    split-adjusted). Rows on or after the latest action keep a factor of 1.
+    """
+    n = len(prices)
+    if n == 0 or actions.empty:
+        return np.ones(n)
+
+    tickers = pd.Index(prices["ticker"].unique())
+    price_codes = tickers.get_indexer(prices["ticker"]).astype(np.int64)
+    price_days = to_days(prices["date"])
+    price_keys = (price_codes << 32) + price_days
+
+    actions = actions[actions["ticker"].isin(tickers)]
+    action_codes = tickers.get_indexer(actions["ticker"]).astype(np.int64)
+    # Position of the last row of the same ticker dated before the ex-date.
+    pos = np.searchsorted(price_keys, (action_codes << 32) + to_days(actions["date"])) - 1
+    valid = (pos >= 0) & (price_codes[np.clip(pos, 0, None)] == action_codes)
+    pos = pos[valid]
+    action_type = actions["action_type"].to_numpy()[valid]
+    value = actions["value"].to_numpy(dtype=float)[valid]
+
+    def cumulative(log_step: np.ndarray) -> np.ndarray:
+        # Reverse cumulative sum within each ticker: row i collects every
+        # action placed at row j >= i of the same ticker.
+        rev = np.cumsum(log_step[::-1])[::-1]
+        ends = np.r_[np.flatnonzero(np.diff(price_codes)), n - 1]
+        after_group = np.zeros(n)
+        after_group[:-1] = rev[1:]
+        return np.exp(rev - np.repeat(after_group[ends], np.diff(np.r_[-1, ends])))
+
+    is_split = (action_type == "split") & (value > 0)
+    split_step = np.zeros(n)
+    np.add.at(split_step, pos[is_split], -np.log(value[is_split]))
+    split_factor = cumulative(split_step)
+
+    is_div = action_type == "dividend"
+    close = prices["close"].to_numpy(dtype=float)
+    ratio = 1 - value[is_div] / (close[pos[is_div]] * split_factor[pos[is_div]])
+    usable = ratio > 0
+    div_step = np.zeros(n)
+    np.add.at(div_step, pos[is_div][usable], np.log(ratio[usable]))
+    return split_factor * cumulative(div_step)
+
+
+def adjust_prices(prices: pd.DataFrame, actions: pd.DataFrame) -> pd.DataFrame:
+    prices = prices.sort_values(["ticker", "date"], ignore_index=True)
+    factor = adjustment_factors(prices, actions)
+    return _apply_factor(prices, factor)
+
+
+def _apply_factor(prices: pd.DataFrame, factor) -> pd.DataFrame:
+    out = prices[["date", "ticker", "market", "volume"]].copy()
+    for col in ("open", "high", "low", "close"):
+        out[col] = prices[col].to_numpy() * factor
+    out["adj_factor"] = factor
+    return out[ADJUSTED_COLS]
+
+
+def update_adjusted_prices(stored: pd.DataFrame, changed_tickers: set[str]) -> int:
+    """Bring ``adjusted_prices`` up to date after a run.
+
+    ``stored`` has a ``ticker`` and ``date`` for the prices the run stored,
+    e.g. each ticker's first date. Tickers with new or revised corporate
+    actions, or with no adjusted history yet, are recomputed from their full
+    ``raw_prices`` history. Every other ticker's ``raw_prices`` rows from its
+    first stored date are streamed back. Rows re-stored over dates already
+    adjusted, as the daily overlap does, keep the factor stored for their
+    date; later rows take the ticker's latest stored factor.
+    """
+    if stored.empty and not changed_tickers:
+        return 0
+    run_tickers = [] if stored.empty else sorted(stored["ticker"].astype(str).unique())
+    latest = query(
+        "SELECT DISTINCT ON (ticker) ticker, adj_factor FROM adjusted_prices "
+        "WHERE ticker = ANY(%(tickers)s) ORDER BY ticker, date DESC",
+        {"tickers": run_tickers},
+    )
+    carried = dict(zip(latest["ticker"], latest["adj_factor"]))
+    recompute = sorted(set(changed_tickers) | (set(run_tickers) - set(carried)))
+
+    rows = 0
+    if recompute:
+        history = query(
+            "SELECT date, ticker, market, open, high, low, close, volume FROM raw_prices "
+            "WHERE ticker = ANY(%(tickers)s) ORDER BY ticker, date",
+            {"tickers": recompute},
+        )
+        actions = query(
+            "SELECT date, ticker, action_type, value FROM corporate_actions "
+            "WHERE ticker = ANY(%(tickers)s)",
+            {"tickers": recompute},
+        )
+        rows += insert_dataframe(adjust_prices(history, actions), "adjusted_prices")
+
+    appended = 0
+    append = [t for t in run_tickers if t not in recompute]
+    if append:
+        first = (
+            pd.Series(normalize_dates(stored["date"]).to_numpy(), index=stored["ticker"].astype(str))
+            .groupby(level=0).min()[append]
+        )
+        chunks = iter_query(
+            "SELECT r.date, r.ticker, r.market, r.open, r.high, r.low, r.close, r.volume, "
+            "a.adj_factor FROM raw_prices r "
+            "LEFT JOIN adjusted_prices a ON a.ticker = r.ticker AND a.date = r.date "
+            "WHERE r.ticker = ANY(%(tickers)s) AND r.date >= %(start)s",
+            {"tickers": append, "start": first.min().date()},
+        )
+        for chunk in chunks:
+            dates = normalize_dates(chunk["date"]).to_numpy()
+            chunk = chunk[dates >= first[chunk["ticker"]].to_numpy()]
+            factor = chunk["adj_factor"].fillna(chunk["ticker"].map(carried)).to_numpy(dtype=float)
+            rows += insert_dataframe(_apply_factor(chunk, factor), "adjusted_prices")
+            appended += len(chunk)
+
+    logger.info(
+        "Adjusted prices: %d tickers recomputed, %d rows appended.",
+        len(recompute),
+        appended,
+    )
+    return rows
@@ -0,0 +1,149 @@
+from datetime import date, timedelta
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline.config.settings import FEATURE_WINDOW
+from data_pipeline.pipeline.logger import get_logger
+from data_pipeline.storage.database import insert_dataframe, query
+
+logger = get_logger(__name__)
+
+FEATURE_COLS = ["date", "ticker", "market", "log_return", "mean_return", "volatility"]
+
+
+def ticker_features(prices: pd.DataFrame, window: int = FEATURE_WINDOW) -> pd.DataFrame:
+    """Log return, and rolling mean and volatility of it, for every row of ``prices``.
+
+    ``prices`` must be sorted by ticker then date. The first row of each
+    ticker has no return, and the rolling statistics need ``window``
+    returns, so they start on the ticker's ``window + 1``-th row.
+    """
+    tickers = prices["ticker"].to_numpy()
+    log_close = np.log(prices["close"].to_numpy(dtype=float))
+    returns = np.full(len(prices), np.nan)
+    returns[1:] = np.diff(log_close)
+    returns[1:][tickers[1:] != tickers[:-1]] = np.nan
+
+    # One rolling pass over all tickers: a window that reaches into the
+    # previous ticker contains that ticker's NaN first return, so it is NaN.
+    rolling = pd.Series(returns).rolling(window, min_periods=window)
+    out = prices[["date", "ticker", "market"]].copy()
+    out["log_return"] = returns
+    out["mean_return"] = rolling.mean().to_numpy()
+    out["volatility"] = rolling.std().to_numpy()
+    return out[FEATURE_COLS]
+
+
+def _window_tail(tickers: list[str], start: date, window: int) -> pd.DataFrame:
+    """Adjusted closes of ``tickers`` from ``start``, plus the ``window`` sessions before it."""
+    return query(
+        "SELECT date, ticker, market, close FROM ("
+        " SELECT date, ticker, market, close,"
+        " ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY date DESC) AS n"
+        " FROM adjusted_prices WHERE ticker = ANY(%(tickers)s) AND date < %(start)s"
+        ") tail WHERE n <= %(window)s "
+        "UNION ALL "
+        "SELECT date, ticker, market, close FROM adjusted_prices "
+        "WHERE ticker = ANY(%(tickers)s) AND date >= %(start)s "
+        "ORDER BY ticker, date",
+        {"tickers": tickers, "start": start, "window": window},
+    )
+
+
+def update_features(
+    stored: pd.DataFrame,
+    changed_tickers: set[str],
+    window: int = FEATURE_WINDOW,
+) -> int:
+    """Bring ``features`` and ``market_correlations`` up to date after a run.
+
+    Run after ``adjusted_prices`` is updated. Tickers with new or revised
+    corporate actions, or with no features yet, are recomputed from their
+    full history. Every other ticker is recomputed only from its first new
+    row, with the rolling windows seeded from the ``window`` sessions before
+    it, so each daily run touches just the newest rows. ``stored`` has a
+    ``ticker`` and ``date`` for the prices the run stored, e.g. each
+    ticker's first date.
+    """
+    if stored.empty and not changed_tickers:
+        return 0
+    run_tickers = [] if stored.empty else sorted(stored["ticker"].astype(str).unique())
+    latest = query(
+        "SELECT DISTINCT ON (ticker) ticker, date FROM features "
+        "WHERE ticker = ANY(%(tickers)s) ORDER BY ticker, date DESC",
+        {"tickers": run_tickers},
+    )
+    last = dict(zip(latest["ticker"], pd.to_datetime(latest["date"]).dt.date))
+    recompute = sorted(set(changed_tickers) | (set(run_tickers) - set(last)))
+
+    rows = 0
+    starts = []
+    if recompute:
+        history = query(
+            "SELECT date, ticker, market, close FROM adjusted_prices "
+            "WHERE ticker = ANY(%(tickers)s) ORDER BY ticker, date",
+            {"tickers": recompute},
+        )
+        if not history.empty:
+            rows += insert_dataframe(ticker_features(history, window), "features")
+            starts.append(pd.to_datetime(history["date"]).min().date())
+
+    append = [t for t in run_tickers if t not in recompute]
+    if append:
+        new_dates = pd.to_datetime(stored.loc[stored["ticker"].isin(append), "date"])
+        # Also covers days a failed run left without features.
+        start = min(new_dates.min().date(), min(last[t] for t in append) + timedelta(days=1))
+        features = ticker_features(_window_tail(append, start, window), window)
+        features = features[pd.to_datetime(features["date"]).dt.date >= start]
+        rows += insert_dataframe(features, "features")
+        starts.append(start)
+
+    logger.info(
+        "Features: %d tickers recomputed, %d tickers updated.", len(recompute), len(append)
+    )
+    if starts:
+        rows += update_market_correlations(min(starts), window)
+    return rows
+
+
+def update_market_correlations(since: date, window: int = FEATURE_WINDOW) -> int:
+    """Recompute rolling pairwise market correlations from ``since`` onward.
+
+    A market's return on a date is the mean log return of its tickers in
+    ``features``. Each pair is correlated over the last ``window`` sessions
+    both markets traded.
+    """
+    # Twice the window of earlier dates holds at least ``window`` sessions
+    # common to any two markets, which seeds the first recomputed date.
+    lookback = query(
+        "SELECT DISTINCT date FROM features WHERE date < %(since)s "
+        "ORDER BY date DESC LIMIT %(n)s",
+        {"since": since, "n": 2 * window},
+    )
+    start = pd.to_datetime(lookback["date"]).min().date() if not lookback.empty else since
+    returns = query(
+        "SELECT date, market, AVG(log_return) AS log_return FROM features "
+        "WHERE date >= %(start)s AND log_return IS NOT NULL GROUP BY date, market",
+        {"start": start},
+    )
+    if returns.empty:
+        return 0
+    returns["date"] = pd.to_datetime(returns["date"])
+    wide = returns.pivot(index="date", columns="market", values="log_return").sort_index()
+
+    frames = []
+    for a, b in combinations(sorted(wide.columns), 2):
+        pair = wide[[a, b]].dropna()
+        corr = pair[a].rolling(window, min_periods=window).corr(pair[b])
+        corr = corr[(corr.index >= pd.Timestamp(since)) & corr.notna()]
+        frames.append(pd.DataFrame({
+            "date": corr.index,
+            "market_a": a,
+            "market_b": b,
+            "correlation": corr.to_numpy(),
+        }))
+    if not frames:
+        return 0
+    return insert_dataframe(pd.concat(frames, ignore_index=True), "market_correlations")
@@ -0,0 +1,101 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+from data_pipeline.cleaning.align_calendars import get_valid_trading_days
+from data_pipeline.config.markets import INDICATOR_NAMES, MACRO_INDICATORS
+from data_pipeline.ingestion.frames import to_days
+from data_pipeline.pipeline.logger import get_logger
+from data_pipeline.storage.database import insert_dataframe, query
+
+logger = get_logger(__name__)
+
+# Wide column of each indicator in ``macro_panel``.
+PANEL_COLUMNS: dict[str, str] = {name: name.lower() for name in INDICATOR_NAMES}
+
+
+def asof_panel(observations: pd.DataFrame, market: str, start: str, end: str) -> pd.DataFrame:
+    """One row per ``market`` session in ``start``..``end`` with every indicator as of that day.
+
+    Each session takes the latest observation dated on or before it, so
+    monthly series carry forward until the next print. ``observations`` is
+    long-format (``date``, ``indicator``, ``value``) and must include the
+    last observation before ``start`` for values to carry into the range.
+    """
+    sessions = get_valid_trading_days(market, start, end)
+    session_days = to_days(sessions)
+    panel = {"date": sessions, "market": market}
+    for column in PANEL_COLUMNS.values():
+        panel[column] = np.full(len(sessions), np.nan)
+
+    for indicator, obs in observations.groupby("indicator", sort=False):
+        if indicator not in PANEL_COLUMNS:
+            continue
+        obs = obs.sort_values("date")
+        idx = np.searchsorted(to_days(obs["date"]), session_days, side="right") - 1
+        values = obs["value"].to_numpy(dtype=float)[np.maximum(idx, 0)]
+        panel[PANEL_COLUMNS[indicator]] = np.where(idx >= 0, values, np.nan)
+    return pd.DataFrame(panel)
+
+
+def _observations(market: str, start: date, end: date) -> pd.DataFrame:
+    """Observations of ``market`` in ``start``..``end`` plus each series' last one before."""
+    seeds = query(
+        "SELECT DISTINCT ON (indicator) date, indicator, value FROM macro_indicators "
+        "WHERE market = %(market)s AND date < %(start)s ORDER BY indicator, date DESC",
+        {"market": market, "start": start},
+    )
+    window = query(
+        "SELECT date, indicator, value FROM macro_indicators "
+        "WHERE market = %(market)s AND date >= %(start)s AND date <= %(end)s",
+        {"market": market, "start": start, "end": end},
+    )
+    return pd.concat([seeds, window], ignore_index=True)
+
+
+def _first_observations() -> dict[str, date]:
+    df = query("SELECT market, MIN(date) AS first_date FROM macro_indicators GROUP BY market")
+    return dict(zip(df["market"], pd.to_datetime(df["first_date"]).dt.date))
+
+
+def _panel_watermarks() -> dict[str, date]:
+    df = query("SELECT market, MAX(date) AS last_date FROM macro_panel GROUP BY market")
+    return dict(zip(df["market"], pd.to_datetime(df["last_date"]).dt.date))
+
+
+def update_macro_panel(
+    changed: pd.DataFrame,
+    end_date: str,
+    rebuild: bool = False,
+) -> int:
+    """Bring ``macro_panel`` up to ``end_date``.
+
+    Per market, sessions are recomputed from the earliest date in ``changed``
+    (the new or revised observations of this run) or the day after the
+    panel's last row, whichever is earlier. Everything before that is left
+    alone. ``rebuild`` recomputes each market from its first observation.
+    """
+    end = date.fromisoformat(end_date)
+    first = _first_observations()
+    last = {} if rebuild else _panel_watermarks()
+    changed_from = {}
+    if not changed.empty:
+        dates = pd.to_datetime(changed["date"]).groupby(changed["market"], observed=True).min()
+        changed_from = {m: d.date() for m, d in dates.items()}
+
+    rows = 0
+    for market in MACRO_INDICATORS:
+        if market not in first:
+            continue
+        starts = [changed_from.get(market, end + timedelta(days=1))]
+        starts.append(last[market] + timedelta(days=1) if market in last else first[market])
+        start = max(min(starts), first[market])
+        if start > end:
+            continue
+        observations = _observations(market, start, end)
+        panel = asof_panel(observations, market, str(start), str(end))
+        if not panel.empty:
+            rows += insert_dataframe(panel, "macro_panel")
+        logger.info("macro_panel[%s]: recomputed %d sessions from %s.", market, len(panel), start)
+    return rows
@@ -1,6 +1,8 @@
 """Smoke tests for the macro pipeline."""
 from __future__ import annotations
 
+import os
+import time
 from datetime import date, timedelta
 
 import pandas as pd
@@ -10,6 +12,7 @@ from data_pipeline.cleaning.align_calendars import filter_to_trading_days
 from data_pipeline.cleaning.validate import validate_prices
 from data_pipeline.ingestion.fetch_macro import fetch_macro_indicators
 from data_pipeline.ingestion.fetch_prices import fetch_equity_prices
+from data_pipeline.pipeline.schedule import Clock
 from data_pipeline.storage.database import initialize_schema, query
 
 _TODAY = str(date.today())
@@ -95,3 +98,988 @@ def test_calendar_alignment():
     result_dates = set(result["date"].dt.strftime("%Y-%m-%d").tolist())
     assert "2024-01-01" not in result_dates, "New Year's Day should be filtered out"
     assert "2024-01-08" not in result_dates, "Coming of Age Day should be filtered out"
+
+
+class FakePriceProvider:
+    """Returns one deterministic bar per business day for every requested ticker."""
+
+    def __init__(self):
+        self.calls: list[list[str]] = []
+
+    def download(self, tickers, start, end):
+        self.calls.append(list(tickers))
+        idx = pd.bdate_range(start, end, inclusive="left", name="Date")
+        frames = {
+            t: pd.DataFrame(
+                {"Open": 10.0, "High": 11.0, "Low": 9.0, "Close": 10.5, "Adj Close": 10.5, "Volume": 100},
+                index=idx,
+            )
+            for t in tickers
+        }
+        return pd.concat(frames, axis=1)
+
+
+def test_fetch_equity_prices_batched(tmp_path, monkeypatch):
+    import data_pipeline.storage.raw_lake as lake_module
+    from data_pipeline.config.settings import EQUITY_UNIVERSE
+
+    monkeypatch.setattr(lake_module, "RAW_DATA_PATH", tmp_path)
+    provider = FakePriceProvider()
+    df = fetch_equity_prices("2024-01-01", "2024-01-06", provider=provider, batch_size=4, max_workers=3)
+
+    n_tickers = sum(len(t) for t in EQUITY_UNIVERSE.values())
+    assert all(len(batch) <= 4 for batch in provider.calls)
+    assert sum(len(batch) for batch in provider.calls) == n_tickers
+    assert EXPECTED_PRICE_COLS.issubset(set(df.columns))
+    assert len(df) == n_tickers * 5
+    assert set(df.loc[df["ticker"] == "7203.T", "market"]) == {"JP"}
+
+
+def test_run_jobs_retries_per_key():
+    from data_pipeline.ingestion.engine import run_jobs
+
+    attempts = {"ok": 0, "flaky": 0, "broken": 0}
+
+    def job(key, fail_times):
+        def _call():
+            attempts[key] += 1
+            if attempts[key] <= fail_times:
+                raise RuntimeError(key)
+            return key
+        return _call
+
+    jobs = {"ok": job("ok", 0), "flaky": job("flaky", 2), "broken": job("broken", 99)}
+    results, failures = run_jobs(jobs, max_workers=3, retries=2, base_delay=0.0, sleep=lambda s: None)
+
+    assert results == {"ok": "ok", "flaky": "flaky"}
+    assert set(failures) == {"broken"}
+    assert attempts == {"ok": 1, "flaky": 3, "broken": 3}
+
+
+def test_token_bucket_throttles_after_burst():
+    from data_pipeline.ingestion.engine import TokenBucket
+
+    now = [0.0]
+    sleeps: list[float] = []
+
+    def fake_sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    bucket = TokenBucket(rate=2.0, capacity=2, clock=lambda: now[0], sleep=fake_sleep)
+    for _ in range(4):
+        bucket.acquire()
+    assert sleeps == [0.5, 0.5]
+
+
+def test_plan_window_from_watermark():
+    from data_pipeline.ingestion.windows import plan_window
+
+    assert plan_window(None, "2024-03-15")[0] == "2015-01-01"
+    assert plan_window(date(2024, 3, 10), "2024-03-15", overlap_days=2) == ("2024-03-09", "2024-03-15")
+    # Nothing missing: yfinance's exclusive end means the day is already covered.
+    assert plan_window(date(2024, 3, 14), "2024-03-15", end_exclusive=True) is None
+    # February CPI (dated 2024-02-01) is stored; March has not closed yet.
+    assert plan_window(date(2024, 2, 1), "2024-03-15", frequency="M") is None
+    assert plan_window(date(2024, 2, 1), "2024-04-02", frequency="M") == ("2024-02-02", "2024-04-02")
+
+
+def test_table_definitions_match_schema():
+    from data_pipeline.storage.schema import table_definitions
+
+    tables = table_definitions()
+    assert EXPECTED_TABLES.issubset(tables)
+    assert tables["raw_prices"]["primary_key"] == ["date", "ticker"]
+    assert tables["macro_indicators"]["primary_key"] == ["date", "market", "indicator"]
+    assert tables["pipeline_log"]["primary_key"] == ["run_id"]
+    assert tables["raw_prices"]["columns"]["volume"] == "BIGINT"
+
+
+needs_postgres = pytest.mark.skipif(
+    "TEST_DATABASE_URL" not in os.environ,
+    reason="needs a local Postgres in TEST_DATABASE_URL",
+)
+
+
+@pytest.fixture
+def postgres_backend(monkeypatch):
+    import data_pipeline.storage.database as db_module
+    from data_pipeline.config import settings
+
+    monkeypatch.setattr(db_module, "STORAGE_BACKEND", "postgres")
+    monkeypatch.setattr(settings, "DATABASE_URL", os.environ["TEST_DATABASE_URL"], raising=False)
+    backend = db_module.get_backend()
+    backend.initialize_schema()
+    return backend
+
+
+@pytest.fixture
+def duckdb_backend(tmp_path, monkeypatch):
+    import data_pipeline.storage.database as db_module
+
+    monkeypatch.setattr(db_module, "STORAGE_BACKEND", "duckdb")
+    monkeypatch.setattr(db_module, "DB_PATH", tmp_path / "test.duckdb")
+    backend = db_module.get_backend()
+    backend.initialize_schema()
+    yield backend
+    backend.close()
+
+
+@needs_postgres
+def test_copy_dataframe_upserts_on_primary_key(postgres_backend):
+
+    rows = pd.DataFrame({
+        "date": pd.to_datetime(["2024-01-02", "2024-01-03"]),
+        "ticker": "COPYTEST",
+        "market": "JP",
+        "open": 1.0,
+        "high": 2.0,
+        "low": 0.5,
+        "close": [1.5, 1.6],
+        "volume": [100.0, None],
+    })
+    assert postgres_backend.copy_dataframe(rows, "raw_prices", chunk_size=1) == 2
+    rows["close"] = [1.7, 1.8]
+    postgres_backend.copy_dataframe(rows, "raw_prices")
+
+    stored = query("SELECT close, volume FROM raw_prices WHERE ticker = 'COPYTEST' ORDER BY date")
+    assert stored["close"].tolist() == [1.7, 1.8]
+    assert stored["volume"].iloc[0] == 100
+
+
+@needs_postgres
+def test_pool_reuses_sessions_and_schema_is_version_gated(postgres_backend):
+    from data_pipeline.storage.schema import schema_sql, schema_version
+
+    stored = query("SELECT version FROM schema_version")
+    assert schema_version(schema_sql()) in stored["version"].tolist()
+
+    pids = set()
+    for _ in range(3):
+        with postgres_backend.connection() as conn, conn.cursor() as cur:
+            cur.execute("SELECT pg_backend_pid()")
+            pids.add(cur.fetchone()[0])
+    assert len(pids) == 1
+
+
+def test_filter_all_markets_and_session_lookups():
+    from data_pipeline.cleaning.align_calendars import (
+        filter_all_markets,
+        next_session,
+        previous_session,
+    )
+
+    # 2024-01-01 is closed everywhere; 2024-01-08 only in Japan.
+    dates = pd.to_datetime(["2024-01-01", "2024-01-02", "2024-01-08", "2024-01-08"])
+    df = pd.DataFrame({"date": dates, "market": ["HK", "HK", "JP", "KR"], "close": 1.0})
+    result = filter_all_markets(df)
+    assert list(zip(result["market"], result["date"].dt.strftime("%Y-%m-%d"))) == [
+        ("HK", "2024-01-02"),
+        ("KR", "2024-01-08"),
+    ]
+
+    assert next_session("JP", "2024-01-05")[0] == pd.Timestamp("2024-01-09")
+    assert previous_session("JP", "2024-01-09")[0] == pd.Timestamp("2024-01-05")
+
+
+def test_adjustment_factors_for_split_and_dividend():
+    from data_pipeline.transform.adjust_prices import adjust_prices
+
+    prices = pd.DataFrame({
+        "date": pd.to_datetime(["2024-01-02", "2024-01-03", "2024-01-04", "2024-01-05"] * 2),
+        "ticker": ["AAA"] * 4 + ["BBB"] * 4,
+        "market": "JP",
+        "open": 1.0, "high": 1.0, "low": 1.0,
+        "close": [200.0, 200.0, 100.0, 100.0, 50.0, 50.0, 50.0, 50.0],
+        "volume": 10,
+    })
+    actions = pd.DataFrame({
+        "date": pd.to_datetime(["2024-01-04", "2024-01-05", "2024-01-03"]).tz_localize("Asia/Tokyo"),
+        "ticker": ["AAA", "AAA", "BBB"],
+        "action_type": ["split", "dividend", "dividend"],
+        "value": [2.0, 1.0, 5.0],
+    })
+    result = adjust_prices(prices, actions).set_index(["ticker", "date"])["adj_factor"]
+
+    aaa = result["AAA"].tolist()
+    assert aaa[:2] == pytest.approx([0.5 * 0.99] * 2)
+    assert aaa[2:] == pytest.approx([0.99, 1.0])
+    assert result["BBB"].tolist() == pytest.approx([0.9, 1.0, 1.0, 1.0])
+
+
+def test_fetch_corporate_actions_skips_unchanged_tickers(monkeypatch):
+    import data_pipeline.ingestion.fetch_macro as fm_module
+
+    monkeypatch.setattr(fm_module, "EQUITY_UNIVERSE", {"JP": ["AAA", "BBB"]})
+
+    def fake_actions(ticker):
+        return pd.DataFrame({
+            "date": pd.to_datetime(["2024-03-28"]).tz_localize("Asia/Tokyo"),
+            "ticker": ticker,
+            "action_type": "dividend",
+            "value": [1.0 if ticker == "AAA" else 2.0],
+        })
+
+    monkeypatch.setattr(fm_module, "_ticker_actions", fake_actions)
+    known = fm_module.action_hashes(fake_actions("AAA"))
+
+    result = fm_module.fetch_corporate_actions(known)
+    assert result["ticker"].tolist() == ["BBB"]
+
+
+def test_raw_lake_append_read_and_compact(tmp_path):
+    from data_pipeline.storage.raw_lake import compact_raw, read_raw, write_raw
+
+    day1 = pd.DataFrame({
+        "date": pd.to_datetime(["2023-12-29", "2024-01-02", "2024-01-02"]),
+        "ticker": ["7203.T", "7203.T", "0700.HK"],
+        "market": ["JP", "JP", "HK"],
+        "close": [100.0, 101.0, 300.0],
+    })
+    write_raw(day1, "prices", base=tmp_path)
+    # A rerun revises one row; both ingests are kept on disk.
+    write_raw(day1.iloc[[1]].assign(close=102.0), "prices", base=tmp_path)
+
+    jp_2024 = read_raw("prices", columns=["date", "close"], start="2024-01-01", markets=["JP"], base=tmp_path)
+    assert jp_2024["close"].tolist() == [102.0]
+    assert list(jp_2024.columns) == ["date", "close"]
+    assert len(read_raw("prices", latest_only=False, base=tmp_path)) == 4
+
+    assert compact_raw("prices", min_files=2, base=tmp_path) == 1
+    assert len(list((tmp_path / "prices" / "market=JP" / "year=2024").glob("*.parquet"))) == 1
+    assert read_raw("prices", tickers=["7203.T"], base=tmp_path)["close"].tolist() == [100.0, 102.0]
+
+
+def test_reader_sql_is_parameterised_and_validated():
+    from data_pipeline.storage.readers import _select
+
+    sql, params, columns = _select(
+        "raw_prices", ["date", "close"], {"market": ["JP"], "ticker": None}, "2024-01-01", None
+    )
+    assert params == {"start": date(2024, 1, 1), "market": ["JP"]}
+    assert columns == ["date", "close"]
+    with pytest.raises(ValueError):
+        _select("raw_prices", ["close; DROP TABLE raw_prices"], {}, None, None)
+
+
+@pytest.mark.parametrize("backend_fixture", [
+    "duckdb_backend",
+    pytest.param("postgres_backend", marks=needs_postgres),
+])
+def test_iter_prices_streams_in_chunks(backend_fixture, request):
+    from data_pipeline.storage.readers import iter_prices, load_prices
+
+    backend = request.getfixturevalue(backend_fixture)
+    rows = pd.DataFrame({
+        "date": pd.bdate_range("2024-01-01", periods=5),
+        "ticker": "READTEST",
+        "market": "JP",
+        "open": 1.0, "high": 1.0, "low": 1.0, "close": 1.0, "volume": 1,
+    })
+    backend.insert_dataframe(rows, "raw_prices")
+
+    chunks = list(iter_prices(tickers=["READTEST"], columns=["date", "close"], chunk_size=2))
+    assert [len(c) for c in chunks] == [2, 2, 1]
+    assert load_prices(tickers=["READTEST"], start="2024-01-03")["date"].min() == pd.Timestamp("2024-01-03")
+
+
+def test_duckdb_backend_upserts_and_answers_parameterised_queries(duckdb_backend):
+    rows = pd.DataFrame({
+        "date": pd.to_datetime(["2024-01-02", "2024-01-02"]),
+        "market": "JP",
+        "indicator": ["FX_VS_USD", "POLICY_RATE"],
+        "source": "fred",
+        "value": [141.0, -0.1],
+    })
+    insert_dataframe = duckdb_backend.insert_dataframe
+    insert_dataframe(rows, "macro_indicators")
+    insert_dataframe(rows.assign(value=[142.0, -0.1]), "macro_indicators")
+
+    df = query(
+        "SELECT indicator, value FROM macro_indicators WHERE indicator = ANY(%(names)s)",
+        {"names": ["FX_VS_USD"]},
+    )
+    assert df.to_dict("records") == [{"indicator": "FX_VS_USD", "value": 142.0}]
+
+    from data_pipeline.storage.backends.base import prepare_frame
+
+    assert prepare_frame(rows, "macro_indicators") is rows
+    assert len(prepare_frame(pd.concat([rows, rows]), "macro_indicators")) == 2
+
+
+def test_duckdb_cursors_are_closed_and_backends_must_be_complete(duckdb_backend, monkeypatch):
+    import duckdb
+
+    from data_pipeline.storage.backends.base import StorageBackend
+
+    opened = []
+    cursor = duckdb_backend._cursor
+    monkeypatch.setattr(duckdb_backend, "_cursor", lambda: opened.append(cursor()) or opened[-1])
+    duckdb_backend.query("SELECT 1")
+    list(duckdb_backend.iter_query("SELECT * FROM range(5)", None, 2))
+    duckdb_backend.insert_dataframe(pd.DataFrame([{"ticker": "A.T", "content_hash": "x",
+                                                   "updated_at": pd.Timestamp("2024-01-02")}]),
+                                    "corporate_action_state")
+    assert len(opened) == 3
+    for cur in opened:
+        with pytest.raises(duckdb.ConnectionException):
+            cur.execute("SELECT 1")
+
+    class QueryOnly(StorageBackend):
+        def query(self, sql, params=None):
+            return pd.DataFrame()
+
+    with pytest.raises(TypeError):
+        QueryOnly()
+
+
+def test_backfill_checkpoints_windows_and_resumes(duckdb_backend, monkeypatch):
+    import data_pipeline.ingestion.windows as windows_module
+    import data_pipeline.pipeline.backfill as backfill_module
+
+    universe = {"JP": ["AAA"]}
+    indicators = {"JP": {"FX_VS_USD": {"ticker": "DEXJPUS", "frequency": "D", "source": "fred"}}}
+    for module in (windows_module, backfill_module):
+        monkeypatch.setattr(module, "EQUITY_UNIVERSE", universe)
+        monkeypatch.setattr(module, "MACRO_INDICATORS", indicators)
+
+    calls = []
+
+    def fake_prices(start, end, windows=None, misses=None):
+        calls.append(start)
+        if start == "2023-01-01" and calls.count(start) == 1:
+            raise ConnectionError("interrupted")
+        if start == "2024-01-01" and calls.count(start) == 1:
+            # An empty download, as yfinance reports a rate limit.
+            misses.failed.append("AAA")
+            return
+        dates = pd.bdate_range(start, end, inclusive="left")
+        yield pd.DataFrame({
+            "date": dates, "ticker": "AAA", "market": "JP",
+            "open": 10.0, "high": 11.0, "low": 9.0, "close": 10.0, "volume": 100,
+        })
+
+    def fake_macro(start, end, series=None, windows=None):
+        dates = pd.bdate_range(start, end)
+        return pd.DataFrame({
+            "date": dates, "market": "JP", "indicator": "FX_VS_USD",
+            "source": "fred", "value": 140.0,
+        }), []
+
+    monkeypatch.setattr(backfill_module, "iter_equity_prices", fake_prices)
+    monkeypatch.setattr(backfill_module, "fetch_macro_series", fake_macro)
+
+    completed, failed = backfill_module.backfill("2022-06-01", "2024-03-31", "year", 2)
+    assert failed == [("JP", "2023-01-01", "2023-12-31"), ("JP", "2024-01-01", "2024-03-31")]
+    assert list(completed) == [("JP", "2022-06-01", "2022-12-31")]
+
+    completed, failed = backfill_module.backfill("2022-06-01", "2024-03-31", "year", 2)
+    assert not failed
+    assert sorted(completed) == [("JP", "2023-01-01", "2023-12-31"), ("JP", "2024-01-01", "2024-03-31")]
+    assert sorted(set(calls)) == ["2022-06-01", "2023-01-01", "2024-01-01"]
+    assert calls.count("2022-06-01") == 1
+    stored = query("SELECT MIN(date) AS lo, MAX(date) AS hi FROM raw_prices WHERE ticker = 'AAA'")
+    assert str(stored["lo"][0])[:10] == "2022-06-01"
+    assert str(stored["hi"][0])[:10] == "2024-03-29"
+
+
+def test_stream_jobs_applies_backpressure():
+    import threading
+    from data_pipeline.ingestion.engine import stream_jobs
+
+    started = []
+    lock = threading.Lock()
+
+    def job(i):
+        def _call():
+            with lock:
+                started.append(i)
+            return i
+        return _call
+
+    stream = stream_jobs({i: job(i) for i in range(20)}, max_workers=2, queue_size=2)
+    first = next(stream)
+    time.sleep(0.3)
+    # Two queued results plus one blocked result per worker, at most.
+    assert len(started) <= 1 + 2 + 2
+    rest = list(stream)
+    assert sorted([first[1]] + [r for _, r, _ in rest]) == list(range(20))
+    assert all(err is None for _, _, err in rest)
+
+
+def test_iter_equity_prices_yields_batches_as_fetched(tmp_path, monkeypatch):
+    import data_pipeline.storage.raw_lake as lake_module
+    from data_pipeline.ingestion.fetch_prices import iter_equity_prices
+
+    monkeypatch.setattr(lake_module, "RAW_DATA_PATH", tmp_path)
+    provider = FakePriceProvider()
+    stream = iter_equity_prices("2024-01-01", "2024-01-06", provider=provider, batch_size=5, queue_size=1)
+    batch = next(stream)
+    assert batch["ticker"].nunique() == 5 and batch["market"].nunique() == 1
+    assert sum(1 for _ in stream) + 1 == len(provider.calls)
+
+
+def test_empty_fetches_move_the_price_watermark(duckdb_backend, tmp_path, monkeypatch):
+    import data_pipeline.storage.raw_lake as lake_module
+    from data_pipeline.config.settings import EQUITY_UNIVERSE, START_DATE
+    from data_pipeline.ingestion.fetch_prices import PriceMisses, iter_equity_prices
+    from data_pipeline.ingestion.windows import plan_price_windows
+    from data_pipeline.pipeline.stages import store_price_batches
+    from data_pipeline.storage.watermarks import mark_prices_checked, price_watermarks
+
+    class GapProvider(FakePriceProvider):
+        def download(self, tickers, start, end):
+            raw = super().download(tickers, start, end)
+            return raw.drop(columns=quiet, level=0, errors="ignore")
+
+    class DownProvider:
+        def download(self, tickers, start, end):
+            return pd.DataFrame()
+
+    def ingest(provider, start, end):
+        misses = PriceMisses()
+        batches = iter_equity_prices(
+            start, end, provider=provider, windows={t: (start, end) for t in (listed, quiet)},
+            misses=misses,
+        )
+        store_price_batches(batches, misses)
+        return misses
+
+    monkeypatch.setattr(lake_module, "RAW_DATA_PATH", tmp_path)
+    listed, quiet = EQUITY_UNIVERSE["JP"][:2]
+    misses = ingest(GapProvider(), START_DATE, "2024-01-06")
+    assert misses.empty == {quiet: (START_DATE, "2024-01-06")} and not misses.failed
+    assert price_watermarks() == {listed: date(2024, 1, 5), quiet: date(2024, 1, 5)}
+    assert not {listed, quiet} & set(plan_price_windows(price_watermarks(), "2024-01-06"))
+
+    # A batch that comes back wholly empty may be an outage: nothing moves.
+    misses = ingest(DownProvider(), "2024-01-06", "2024-01-20")
+    assert sorted(misses.failed) == sorted([listed, quiet]) and not misses.empty
+    assert price_watermarks() == {listed: date(2024, 1, 5), quiet: date(2024, 1, 5)}
+
+    # Windows that leave a gap, or end before the watermark, are not recorded.
+    assert mark_prices_checked({quiet: ("2024-01-10", "2024-01-20")}) == 0
+    assert mark_prices_checked({quiet: (START_DATE, "2023-01-01")}) == 0
+    assert price_watermarks()[quiet] == date(2024, 1, 5)
+
+
+def test_synthetic_data_is_deterministic_and_provider_shaped():
+    from benchmarks.providers import StubPriceProvider
+    from benchmarks.synthetic import synthetic_prices, synthetic_universe
+    from data_pipeline.ingestion.fetch_prices import _split_batch
+
+    small, large = synthetic_universe(8), synthetic_universe(400)
+    assert sum(map(len, large.values())) == 400
+    assert small["JP"] == large["JP"][:2]
+
+    a = synthetic_prices(small, "2024-01-01", "2024-03-31")
+    b = synthetic_prices(large, "2024-02-01", "2024-03-31")
+    overlap = a[a["date"] >= "2024-02-01"].reset_index(drop=True)
+    pd.testing.assert_frame_equal(overlap, b[b["ticker"].isin(a["ticker"])].reset_index(drop=True))
+
+    raw = StubPriceProvider().download(small["JP"], "2024-02-01", "2024-04-01")
+    fetched = pd.concat(_split_batch(raw, small["JP"], "JP"), ignore_index=True)
+    expected = b[b["ticker"].isin(small["JP"])].reset_index(drop=True)
+    assert fetched["close"].equals(expected["close"])
+    assert EXPECTED_PRICE_COLS.issubset(fetched.columns)
+
+
+def test_stage_metrics_recorded_per_source_and_persisted(duckdb_backend, tmp_path):
+    from data_pipeline.pipeline import metrics
+    from data_pipeline.storage.stage_metrics import load_stage_metrics, save_stage_metrics
+
+    metrics.reset()
+    df = pd.DataFrame({
+        "date": pd.to_datetime(["2024-01-08", "2024-01-09", "2024-01-09", "2024-01-10"]),
+        "ticker": ["A.T", "A.T", "B.HK", "B.HK"],
+        "market": ["JP", "JP", "HK", "HK"],
+        "open": 1.0, "high": 1.0, "low": 1.0,
+        "close": [1.0, 1.0, None, 1.0],
+        "volume": 1,
+    })
+    from data_pipeline.cleaning.align_calendars import filter_all_markets
+
+    filter_all_markets(validate_prices(df))
+    calls = iter([ConnectionError("flaky"), 42])
+
+    def flaky():
+        result = next(calls)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    call = metrics.metered(flaky, "fetch_macro", "JP/FX_VS_USD")
+    with pytest.raises(ConnectionError):
+        call()
+    assert call() == 42
+
+    snap = metrics.snapshot().set_index(["stage", "source"])
+    assert snap.loc[("validate_prices", "HK"), "rows_dropped"] == 1
+    # 2024-01-08 is a Tokyo holiday.
+    assert snap.loc[("filter_to_trading_days", "JP"), ["rows_in", "rows_out"]].tolist() == [2, 1]
+    assert snap.loc[("fetch_macro", "JP/FX_VS_USD"), ["api_calls", "retries"]].tolist() == [2, 1]
+
+    save_stage_metrics("run1", metrics.snapshot())
+    stored = load_stage_metrics("run1")
+    assert len(stored) == len(snap)
+
+    path = tmp_path / "pipeline.prom"
+    metrics.write_prometheus(metrics.snapshot(), path, "run1")
+    text = path.read_text()
+    assert 'pipeline_stage_retries{stage="fetch_macro",source="JP/FX_VS_USD"} 1' in text
+
+
+def test_macro_panel_as_of_sessions_and_recomputes_only_the_tail(duckdb_backend):
+    from data_pipeline.storage.database import insert_dataframe
+    from data_pipeline.transform.macro_panel import update_macro_panel
+
+    obs = pd.DataFrame({
+        "date": pd.to_datetime(["2023-12-01", "2024-01-01", "2024-01-09", "2024-01-12"]),
+        "market": "JP",
+        "indicator": ["INFLATION_CPI", "INFLATION_CPI", "FX_VS_USD", "FX_VS_USD"],
+        "source": "fred",
+        "value": [1.0, 2.0, 145.0, 146.0],
+    })
+    insert_dataframe(obs, "macro_indicators")
+    update_macro_panel(obs, "2024-01-12")
+
+    panel = query("SELECT * FROM macro_panel WHERE date >= '2024-01-08' ORDER BY date")
+    # 2024-01-08 is a Tokyo holiday, so the first session is the 9th.
+    assert pd.to_datetime(panel["date"]).dt.day.tolist() == [9, 10, 11, 12]
+    assert panel["inflation_cpi"].tolist() == [2.0] * 4
+    assert panel["fx_vs_usd"].tolist() == [145.0, 145.0, 145.0, 146.0]
+    assert panel["policy_rate"].isna().all()
+
+    # A revision on the 10th rewrites the panel from then on, seeded by the
+    # observation before it; earlier sessions are not recomputed.
+    duckdb_backend.insert_dataframe(
+        pd.DataFrame({"date": [date(2024, 1, 9)], "market": "JP", "fx_vs_usd": -1.0}),
+        "macro_panel",
+    )
+    revised = pd.DataFrame({
+        "date": pd.to_datetime(["2024-01-10"]), "market": "JP", "indicator": "FX_VS_USD",
+        "source": "fred", "value": [150.0],
+    })
+    insert_dataframe(revised, "macro_indicators")
+    assert update_macro_panel(revised, "2024-01-12") == 3
+
+    panel = query("SELECT * FROM macro_panel WHERE date >= '2024-01-09' ORDER BY date")
+    assert panel["fx_vs_usd"].tolist() == [-1.0, 150.0, 150.0, 146.0]
+    assert panel["inflation_cpi"].tolist()[1:] == [2.0] * 3
+
+
+def test_features_update_incrementally_from_window_state(duckdb_backend):
+    import numpy as np
+    from data_pipeline.storage.database import insert_dataframe
+    from data_pipeline.transform.features import update_features
+
+    dates = pd.bdate_range("2024-01-01", periods=60)
+    rng = np.random.default_rng(0)
+    prices = pd.concat([
+        pd.DataFrame({"date": dates, "ticker": ticker, "market": market,
+                      "close": 100 * np.exp(rng.normal(0, 0.01, len(dates)).cumsum())})
+        for ticker, market in [("A.T", "JP"), ("B.HK", "HK"), ("C.HK", "HK")]
+    ], ignore_index=True)
+    prices = prices.drop(index=45)  # an A.T holiday
+    old, new = prices[prices["date"] < dates[40]], prices[prices["date"] >= dates[40]]
+
+    def tables():
+        features = query("SELECT * FROM features ORDER BY ticker, date")
+        corr = query("SELECT * FROM market_correlations ORDER BY date, market_a, market_b")
+        return features, corr
+
+    insert_dataframe(old, "adjusted_prices")
+    update_features(old, set(), window=5)
+    insert_dataframe(new, "adjusted_prices")
+    update_features(new, set(), window=5)
+    incremental = tables()
+
+    update_features(pd.DataFrame(), {"A.T", "B.HK", "C.HK"}, window=5)
+    full = tables()
+    pd.testing.assert_frame_equal(incremental[0], full[0])
+    pd.testing.assert_frame_equal(incremental[1], full[1])
+
+    features = full[0].set_index(["ticker", "date"])
+    assert features.loc["A.T", "volatility"].isna().sum() == 5
+    assert set(full[1]["market_a"] + full[1]["market_b"]) == {"HKJP"}
+    assert full[1]["correlation"].between(-1, 1).all()
+
+
+def test_adjusted_prices_append_from_a_stored_summary(duckdb_backend):
+    from data_pipeline.pipeline.stages import stored_summary
+    from data_pipeline.storage.database import insert_dataframe
+    from data_pipeline.transform.adjust_prices import update_adjusted_prices
+
+    dates = pd.bdate_range("2024-01-01", periods=10)
+    prices = pd.DataFrame({
+        "date": dates.repeat(2), "ticker": ["A.T", "B.T"] * 10, "market": "JP",
+        "open": 10.0, "high": 11.0, "low": 9.0, "close": 10.0, "volume": 100,
+    })
+    old, new = prices.iloc[:10], prices.iloc[10:]
+    insert_dataframe(old, "raw_prices")
+    update_adjusted_prices(stored_summary([old]), set())
+    # Without B.T among the changed tickers its split is not applied yet, and
+    # the appended rows carry the stored factor.
+    insert_dataframe(pd.DataFrame([{"date": dates[8], "ticker": "B.T", "action_type": "split",
+                                    "value": 2.0}]), "corporate_actions")
+    insert_dataframe(new, "raw_prices")
+    summary = stored_summary([new.iloc[:4], new.iloc[4:]])
+    assert summary["ticker"].tolist() == ["A.T", "B.T"]
+    assert summary["date"].tolist() == [dates[5], dates[5]]
+    assert summary["rows"].tolist() == [5, 5]
+    update_adjusted_prices(summary, set())
+
+    adjusted = query("SELECT date, ticker, close FROM adjusted_prices ORDER BY ticker, date")
+    assert len(adjusted) == 20 and (adjusted["close"] == 10.0).all()
+
+
+def test_adjusted_prices_overlap_keeps_factors_before_an_ex_date(duckdb_backend):
+    from data_pipeline.pipeline.stages import stored_summary
+    from data_pipeline.storage.database import insert_dataframe
+    from data_pipeline.transform.adjust_prices import update_adjusted_prices
+
+    dates = pd.bdate_range("2024-01-01", "2024-01-11")
+    prices = pd.DataFrame({
+        "date": dates, "ticker": "A.T", "market": "JP",
+        "open": 100.0, "high": 100.0, "low": 100.0, "close": 100.0, "volume": 100,
+    })
+    insert_dataframe(prices.iloc[:-1], "raw_prices")
+    insert_dataframe(pd.DataFrame([{"date": pd.Timestamp("2024-01-08"), "ticker": "A.T",
+                                    "action_type": "dividend", "value": 10.0}]), "corporate_actions")
+    update_adjusted_prices(stored_summary([prices.iloc[:-1]]), {"A.T"})
+
+    # The next run re-stores the overlap 01-05..01-10 and appends 01-11.
+    overlap = prices[prices["date"] >= "2024-01-05"]
+    insert_dataframe(overlap, "raw_prices")
+    update_adjusted_prices(stored_summary([overlap]), set())
+
+    adjusted = query("SELECT date, adj_factor FROM adjusted_prices ORDER BY date")
+    factors = dict(zip(adjusted["date"].dt.strftime("%Y-%m-%d"), adjusted["adj_factor"].round(6)))
+    assert factors["2024-01-04"] == factors["2024-01-05"] == 0.9
+    assert factors["2024-01-08"] == factors["2024-01-11"] == 1.0
+
+
+def test_store_macro_writes_only_revisions_as_vintages(duckdb_backend):
+    from datetime import datetime
+
+    from data_pipeline.pipeline.stages import store_macro
+    from data_pipeline.storage.macro_vintages import macro_as_of
+
+    first = pd.DataFrame({
+        "date": pd.to_datetime(["2023-12-01", "2024-01-01"]),
+        "market": "KR", "indicator": "INFLATION_CPI", "source": "fred",
+        "value": [112.0, 113.0],
+    })
+    assert len(store_macro(first, datetime(2024, 2, 1, 12))) == 2
+
+    # January is revised and February is new; December is unchanged.
+    second = pd.DataFrame({
+        "date": pd.to_datetime(["2023-12-01", "2024-01-01", "2024-02-01"]),
+        "market": "KR", "indicator": "INFLATION_CPI", "source": "fred",
+        "value": [112.0, 113.5, 114.0],
+    })
+    changed = store_macro(second, datetime(2024, 3, 1, 12))
+    assert changed["date"].dt.month.tolist() == [1, 2]
+    assert len(query("SELECT * FROM macro_vintages")) == 4
+
+    before = macro_as_of("2024-02-15", markets=["KR"])
+    assert before["value"].tolist() == [112.0, 113.0]
+    latest = macro_as_of("2024-03-15", indicators=["INFLATION_CPI"], start="2024-01-01")
+    assert latest["value"].tolist() == [113.5, 114.0]
+    assert query("SELECT value FROM macro_indicators ORDER BY date")["value"].tolist() == [
+        112.0, 113.5, 114.0,
+    ]
+
+
+def test_macro_stored_before_vintages_is_seeded_as_a_vintage(duckdb_backend):
+    from datetime import datetime
+
+    from data_pipeline.storage.database import insert_dataframe
+    from data_pipeline.storage.macro_vintages import macro_as_of
+    from data_pipeline.storage.schema import schema_sql, schema_statements
+
+    # A database from before vintages: macro history and a logged run.
+    insert_dataframe(pd.DataFrame({
+        "date": pd.to_datetime(["2023-11-01", "2023-12-01"]),
+        "market": "KR", "indicator": "INFLATION_CPI", "source": "fred",
+        "value": [111.0, 112.0],
+    }), "macro_indicators")
+    insert_dataframe(pd.DataFrame([{
+        "run_id": "old", "run_date": datetime(2023, 12, 20), "status": "SUCCESS",
+    }]), "pipeline_log")
+    duckdb_backend._apply_schema(schema_statements(schema_sql()), "upgrade")
+    duckdb_backend._apply_schema(schema_statements(schema_sql()), "upgrade")
+
+    assert len(query("SELECT * FROM macro_vintages")) == 2
+    assert macro_as_of("2024-01-15", markets=["KR"])["value"].tolist() == [111.0, 112.0]
+    assert macro_as_of("2023-12-01", markets=["KR"]).empty
+
+
+def test_compact_frames_keep_dtypes_through_cleaning():
+    import numpy as np
+    from data_pipeline.cleaning.align_calendars import filter_all_markets
+    from data_pipeline.ingestion.frames import compact, concat
+
+    def batch(ticker, market):
+        return compact(pd.DataFrame({
+            "date": pd.to_datetime(["2024-01-09 15:00", "2024-01-10 15:00"]).tz_localize("Asia/Tokyo"),
+            "open": 1.0, "high": 2.0, "low": 0.5, "close": [1.0, 1.5], "volume": 10,
+            "ticker": ticker, "market": market,
+        }), float32_prices=True)
+
+    df = concat([batch("A.T", "JP"), batch("B.HK", "HK")])
+    assert isinstance(df["ticker"].dtype, pd.CategoricalDtype)
+    assert list(df["market"].cat.categories) == ["HK", "JP"]
+    assert df["close"].dtype == np.float32
+    assert df["date"].dt.tz is None and (df["date"] == df["date"].dt.normalize()).all()
+
+    clean = filter_all_markets(validate_prices(df))
+    assert len(clean) == 4
+    assert clean.dtypes.equals(df.dtypes)
+    assert clean.index.equals(pd.RangeIndex(4))
+
+
+def test_universe_file_and_stable_shards(tmp_path):
+    from data_pipeline.config.universe import load_universe
+    from data_pipeline.pipeline import metrics
+    from data_pipeline.pipeline.sharding import parse_shard, shard_universe
+
+    path = tmp_path / "universe.csv"
+    path.write_text("market,ticker,name\nHK,0700.HK,Tencent\nJP,7203.T,Toyota\nJP,7203.T,dup\n")
+    assert load_universe(path) == {"JP": ["7203.T"], "HK": ["0700.HK"]}
+    path.write_text("market,ticker\nUS,AAPL\n")
+    with pytest.raises(ValueError, match="unknown market"):
+        load_universe(path)
+
+    universe = {"JP": [f"{i:04d}.T" for i in range(200)], "HK": [f"{i:04d}.HK" for i in range(200)]}
+    shards = [shard_universe(universe, (i, 4)) for i in range(4)]
+    for market, tickers in universe.items():
+        assigned = sorted(t for shard in shards for t in shard[market])
+        assert assigned == sorted(tickers)
+        assert min(len(shard[market]) for shard in shards) > 20
+    # A ticker keeps its shard when the universe grows.
+    grown = shard_universe({"JP": universe["JP"] + ["9999.T"]}, (1, 4))
+    assert set(shards[1]["JP"]) <= set(grown["JP"])
+    with pytest.raises(ValueError):
+        parse_shard("4/4")
+
+    metrics.reset()
+    metrics.record("insert", "raw_prices", rows_in=3)
+    worker = metrics.snapshot()
+    metrics.merge(worker)
+    assert metrics.snapshot().loc[0, "rows_in"] == 6
+
+
+def test_workers_on_duckdb_are_rejected_before_the_run_starts(duckdb_backend, monkeypatch):
+    import data_pipeline.pipeline.run_daily as run_daily
+
+    started = []
+    monkeypatch.setattr(run_daily, "_start_run", lambda: started.append(1))
+    with pytest.raises(ValueError, match="postgres"):
+        run_daily.run_pipeline(end_date="2024-01-20", workers=2)
+    assert not started
+
+
+def test_daily_validation_continues_from_stored_state(duckdb_backend):
+    from data_pipeline.cleaning.validate import check_prices
+    from data_pipeline.pipeline.stages import store_prices
+    from data_pipeline.storage.price_checks import load_price_state
+
+    dates = pd.bdate_range("2024-02-01", periods=40)
+    close = [10.0 + 0.1 * i for i in range(34)] + [30.0] + [13.5] * 5
+    volume = [1000.0 + 10 * (i % 3) for i in range(40)]
+    volume[30] = 1e6
+    history = pd.DataFrame({
+        "date": dates, "ticker": "0700.HK", "market": "HK",
+        "open": 1.0, "high": 40.0, "low": 0.5, "close": close, "volume": volume,
+    })
+    expected = check_prices(history)[1]
+
+    # One session per run, each re-fetching the session before it.
+    store_prices(history.iloc[:25])
+    for day in range(25, 40):
+        store_prices(history.iloc[day - 1:day + 1])
+
+    issues = query("SELECT date, rule FROM price_issues ORDER BY date, rule")
+    assert issues["rule"].tolist() == [
+        "volume_spike", "extreme_return", "extreme_return", "stale_price",
+    ]
+    assert issues["rule"].tolist() == expected.sort_values(["date", "rule"])["rule"].tolist()
+    state = load_price_state(["0700.HK"])
+    assert state.loc["0700.HK", "last_date"] == dates[-1]
+    assert state.loc["0700.HK", "stale_run"] == 5
+
+    bad = history.iloc[[0]].assign(date=dates[-1] + pd.Timedelta(days=3), high=0.1)
+    valid, report, _ = check_prices(bad, state)
+    assert valid.empty and report["severity"].tolist() == ["reject"]
+
+
+def test_query_cache_invalidated_by_table_writes(duckdb_backend, tmp_path, monkeypatch):
+    import data_pipeline.storage.database as db_module
+    from data_pipeline.storage import query_cache
+    from data_pipeline.storage.database import insert_dataframe
+
+    monkeypatch.setattr(db_module, "QUERY_CACHE_DIR", str(tmp_path / "cache"))
+    query_cache.clear()
+    row = {"date": pd.Timestamp("2024-01-02"), "market": "JP", "indicator": "POLICY_RATE",
+           "source": "fred", "value": 0.1}
+    insert_dataframe(pd.DataFrame([row]), "macro_indicators")
+    sql = "SELECT value FROM macro_indicators WHERE market = %(m)s"
+    assert query(sql, {"m": "JP"}, cache=True)["value"].tolist() == [0.1]
+
+    # A write that bypasses insert_dataframe leaves the version, and the
+    # cached result, as they were; whitespace does not change the key.
+    duckdb_backend._cursor().execute("UPDATE macro_indicators SET value = 0.2")
+    cached = query(
+        "SELECT value\n  FROM macro_indicators WHERE market = %(m)s;", {"m": "JP"}, cache=True
+    )
+    assert cached["value"].tolist() == [0.1]
+    cached["value"] = 9.0
+    assert query(sql, {"m": "JP"}, cache=True)["value"].tolist() == [0.1]
+    assert query(sql, {"m": "JP"})["value"].tolist() == [0.2]
+
+    insert_dataframe(pd.DataFrame([{**row, "value": 0.3}]), "macro_indicators")
+    assert query(sql, {"m": "JP"}, cache=True)["value"].tolist() == [0.3]
+    # The disk tier answers once memory is cleared.
+    query_cache.clear()
+    duckdb_backend._cursor().execute("UPDATE macro_indicators SET value = 0.4")
+    assert query(sql, {"m": "JP"}, cache=True)["value"].tolist() == [0.3]
+    assert len(list((tmp_path / "cache").glob("*.parquet"))) == 2
+
+
+def test_pipeline_state_reads_skip_the_query_cache(duckdb_backend, tmp_path, monkeypatch):
+    import data_pipeline.storage.raw_lake as lake_module
+    from benchmarks.providers import offline
+    from benchmarks.synthetic import synthetic_universe
+    from data_pipeline.pipeline.run_daily import run_pipeline
+
+    monkeypatch.setattr(lake_module, "RAW_DATA_PATH", tmp_path / "raw")
+    reads = []
+    backend_query = duckdb_backend.query
+    monkeypatch.setattr(duckdb_backend, "query", lambda sql, params=None: (
+        reads.append(sql), backend_query(sql, params))[1])
+    with offline(synthetic_universe(4)):
+        run_pipeline(end_date="2024-01-20")
+        run_pipeline(end_date="2024-01-27")
+    assert reads
+    assert not [sql for sql in reads if "table_versions" in sql]
+
+
+class FakeClock(Clock):
+    def __init__(self, now):
+        self.time = pd.Timestamp(now, tz="UTC")
+
+    def now(self):
+        return self.time
+
+    def sleep(self, seconds):
+        self.time += pd.Timedelta(seconds=seconds)
+
+
+def test_schedule_runs_each_market_after_its_close_and_skips_holidays():
+    from data_pipeline.pipeline.schedule import run_schedule
+
+    clock = FakeClock("2024-01-05 00:00")
+    runs = []
+
+    def run_market(market, session):
+        runs.append((market, str(session), clock.now().strftime("%m-%d %H:%M")))
+        if market == "TW":
+            raise RuntimeError("provider down")
+
+    # Tokyo closes at 06:00 UTC and Taipei at 05:30; 2024-01-08 is a
+    # Japanese holiday.
+    run_schedule(
+        run_market, ["JP", "TW"], timedelta(minutes=30), clock,
+        until=pd.Timestamp("2024-01-09 12:00", tz="UTC"),
+    )
+    assert runs == [
+        ("TW", "2024-01-05", "01-05 06:00"),
+        ("JP", "2024-01-05", "01-05 06:30"),
+        ("TW", "2024-01-08", "01-08 06:00"),
+        ("TW", "2024-01-09", "01-09 06:00"),
+        ("JP", "2024-01-09", "01-09 06:30"),
+    ]
+
+
+def test_schedule_rebuilds_an_exhausted_calendar_and_drops_a_broken_market(monkeypatch):
+    import exchange_calendars as ec
+
+    import data_pipeline.pipeline.schedule as schedule_module
+
+    closes = ec.get_calendar("XTKS").closes
+    built = []
+
+    class FakeCalendar:
+        def __init__(self, name, start):
+            if name != "XTKS":
+                raise ValueError(f"{name} is unavailable")
+            built.append(start)
+            # The first build ends on 2024-01-05, as a calendar built a year earlier would.
+            self.closes = closes[closes.index >= pd.Timestamp(start)] if start else closes[:"2024-01-05"]
+
+    monkeypatch.setattr(ec, "get_calendar", lambda name, start=None: FakeCalendar(name, start))
+    monkeypatch.setattr(schedule_module, "_starts", {})
+    schedule_module._closes.cache_clear()
+    runs = []
+    try:
+        schedule_module.run_schedule(
+            lambda market, session: runs.append((market, str(session))), ["JP", "TW"],
+            timedelta(0), FakeClock("2024-01-04 07:00"),
+            until=pd.Timestamp("2024-01-10 12:00", tz="UTC"),
+        )
+    finally:
+        schedule_module._closes.cache_clear()
+    assert runs == [("JP", "2024-01-05"), ("JP", "2024-01-09"), ("JP", "2024-01-10")]
+    assert built == [None, date(2024, 1, 5)]
+
+
+def test_logs_are_json_lines_tagged_with_run_and_stage(tmp_path):
+    import json
+
+    from data_pipeline.config.settings import LOG_FILE
+    from data_pipeline.pipeline import logger as logging_module
+    from data_pipeline.pipeline import metrics
+
+    log = logging_module.get_logger("tests.logging")
+    assert log.name == "data_pipeline.tests.logging"
+    logging_module.set_log_file(tmp_path / "pipeline.log")
+    logging_module.set_run_id("testrun1")
+    logging_module.set_level("DEBUG", stage="test_stage")
+    try:
+        with metrics.timed("test_stage", "all"):
+            log.debug("inside %d", 1)
+        log.debug("outside")
+        log.info("after")
+    finally:
+        logging_module.set_level(None, stage="test_stage")
+        logging_module.set_run_id(None)
+        # Switching back writes out everything logged to the test file.
+        logging_module.set_log_file(LOG_FILE)
+
+    lines = [json.loads(line) for line in (tmp_path / "pipeline.log").read_text().splitlines()]
+    assert [(e["message"], e["run_id"], e["stage"]) for e in lines] == [
+        ("inside 1", "testrun1", "test_stage"), ("after", "testrun1", None),
+    ]
+    assert not log.isEnabledFor(10)
+
+def test_modules_import_without_credentials_or_heavy_dependencies():
+    import subprocess
+    import sys
+
+    code = (
+        "import sys\n"
+        "import data_pipeline.pipeline.backfill, data_pipeline.storage.readers\n"
+        "from data_pipeline.config import settings\n"
+        "heavy = {'yfinance', 'fredapi', 'supabase', 'exchange_calendars'} & set(sys.modules)\n"
+        "assert not heavy, heavy\n"
+        "try:\n"
+        "    settings.FRED_API_KEY\n"
+        "except RuntimeError:\n"
+        "    pass\n"
+        "else:\n"
+        "    raise AssertionError('FRED_API_KEY resolved without being set')\n"
+    )
+    env = {k: v for k, v in os.environ.items() if k not in ("FRED_API_KEY", "DATABASE_URL")}
+    proc = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr